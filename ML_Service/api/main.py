@@ -1,12 +1,36 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from api.routes.nutrition import router as nutrition_router
+from api.routes.recipes import router as recipes_router
 from api.routes.workout import router as workout_router
+from api.services.plan_executor import plan_executor
+from api.services.warmup import startup_warmup
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model, catalog and indexes (and run a synthetic plan) without
+    # blocking startup; /ready reports when it's done
+    warmup = asyncio.create_task(startup_warmup.run())
+    yield
+    if not warmup.done():
+        warmup.cancel()
+    plan_executor.shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(nutrition_router)
+app.include_router(recipes_router)
 app.include_router(workout_router)
 
 @app.get("/health")
 def health():
-    return {"OK": True}
\ No newline at end of file
+    return {"OK": True}
+
+@app.get("/ready")
+def ready():
+    # 503 until startup warmup finishes; per-component status and load times either way
+    status = startup_warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
@@ -1,16 +1,25 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List
+import asyncio
 import sys
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parents[2]))
 
-from api.services.nutrition_service import nutrition_service
+from api.services.nutrition_service import compute_meal_plan, generate_meal_plans, nutrition_service, stream_meal_plan
+from api.services.plan_executor import QueueFullError, plan_executor
+from api.serialization import PlanJSONResponse, dumps
+from api.services.ml_models.model_registry import model_registry
+from src.models.catalog import meal_catalog
 
 router = APIRouter(prefix="/nutrition", tags=["nutrition"])
 
+# Upper bound on users per /generate/batch request
+MAX_BATCH_SIZE = 100
+
 class UserData(BaseModel):
     # User data required for nutrition calculations
     Height_in: float
@@ -36,17 +45,28 @@ class UserData(BaseModel):
             }
         }
 
-@router.post("/generate")
+def _queue_full(e: QueueFullError) -> HTTPException:
+    # Overloaded: tell the client (and load balancer) when to come back
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+@router.post("/generate", response_class=PlanJSONResponse)
 async def generate(user: UserData):
     try:
         # Convert Pydantic model to dict for the service
         user_dict = user.dict()
+        nutrition_service.validate_user_data(user_dict)
+        key = await asyncio.to_thread(nutrition_service.plan_cache_key, user_dict)
         
-        # Generate complete meal plan using the service
-        result = nutrition_service.generate_complete_meal_plan(user_dict)
+        # Generate complete meal plan on the worker pool so the event loop stays free;
+        # identical concurrent requests await the first one's plan without taking a slot
+        result = await nutrition_service.plan_cache.get_or_compute_async(
+            key, lambda: plan_executor.run(compute_meal_plan, user_dict))
         
-        return result
+        # Serialized once by orjson (NumPy scalars and NaN handled natively)
+        return PlanJSONResponse(result)
     
+    except QueueFullError as e:
+        raise _queue_full(e)
     except ValueError as e:
         # Client errors (bad input data)
         raise HTTPException(status_code=400, detail=f"Invalid user data: {str(e)}")
@@ -59,3 +79,84 @@ async def generate(user: UserData):
     except Exception as e:
         # Catch-all for unexpected errors
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+
+def _ndjson_line(event: dict) -> bytes:
+    return dumps(event) + b"\n"
+
+def _sse_message(event: dict) -> bytes:
+    return b"event: " + event["event"].encode() + b"\ndata: " + dumps(event) + b"\n\n"
+
+STREAM_FORMATS = {
+    "ndjson": (_ndjson_line, "application/x-ndjson"),
+    "sse": (_sse_message, "text/event-stream"),
+}
+
+@router.post("/generate/stream")
+async def generate_stream(user: UserData, fmt: str = Query("ndjson", alias="format")):
+    # Targets first, then each day as soon as it is planned (NDJSON lines or Server-Sent Events)
+    if fmt not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown stream format: {fmt}")
+    encode, media_type = STREAM_FORMATS[fmt]
+    
+    user_dict = user.dict()
+    try:
+        # Fail fast with a 400 before any bytes are sent
+        nutrition_service.validate_user_data(user_dict)
+        events = plan_executor.stream(stream_meal_plan, user_dict)
+    except QueueFullError as e:
+        raise _queue_full(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid user data: {str(e)}")
+    
+    async def body():
+        try:
+            async for event in events:
+                yield encode(event)
+        except Exception as e:
+            # Headers are already sent; report the failure in-band
+            yield encode({"event": "error", "detail": str(e)})
+    
+    return StreamingResponse(body(), media_type=media_type)
+
+@router.post("/generate/batch", response_class=PlanJSONResponse)
+async def generate_batch(users: List[UserData]):
+    if not users:
+        raise HTTPException(status_code=400, detail="Invalid user data: empty batch")
+    if len(users) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Invalid user data: batch size exceeds {MAX_BATCH_SIZE}")
+    try:
+        # Per-user results in request order; users failing validation get success=False
+        # entries before any shared work, so errors raised past that point are server errors
+        results = await plan_executor.run(generate_meal_plans, [user.dict() for user in users])
+        
+        return PlanJSONResponse({"results": results})
+    
+    except QueueFullError as e:
+        raise _queue_full(e)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=f"Data file not found: {str(e)}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+@router.get("/model")
+def model_info():
+    # Active calorie model version and load timings
+    return model_registry.info()
+
+@router.get("/catalog")
+def catalog_info():
+    # Active meal catalog version and per-recipe memory footprint
+    return meal_catalog.info()
+
+@router.get("/queue")
+def queue_info():
+    # Plan generation queue depth and wait times
+    return plan_executor.stats()
+
+@router.get("/cache")
+def cache_info():
+    # Plan cache size and hit/miss/coalesced counters
+    return nutrition_service.plan_cache.stats()
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parents[2]))
+
+from api.serialization import PlanJSONResponse
+from src.models.catalog import meal_catalog
+
+router = APIRouter(prefix="/recipes", tags=["recipes"])
+
+# Upper bounds on neighbours / probed clusters per request
+MAX_SIMILAR = 100
+MAX_PROBES = 64
+
+def _recipe_summary(partition, position: int, similarity: float) -> dict:
+    def macro(values: np.ndarray) -> Optional[float]:
+        value = float(values[position])
+        return None if np.isnan(value) else round(value, 2)
+
+    return {
+        "recipe_id": partition.recipe_ids[position],
+        "name": partition.names[position] if partition.names is not None else None,
+        "meal_type": partition.meal_type,
+        "similarity": round(similarity, 4),
+        "calories": macro(partition.kcal),
+        "protein_g": macro(partition.protein_g),
+        "carbs_g": macro(partition.carbs_g),
+        "fat_g": macro(partition.fat_g),
+        "cluster_id": int(partition.cluster_ids[position]),
+    }
+
+@router.get("/{recipe_id}/similar", response_class=PlanJSONResponse)
+def similar_recipes(recipe_id: str,
+                    k: int = Query(10, ge=1, le=MAX_SIMILAR),
+                    n_probe: int = Query(4, ge=1, le=MAX_PROBES),
+                    meal_type: Optional[str] = None):
+    # Nearest recipes by embedding, searched over the n_probe closest clusters of the IVF index
+    try:
+        snapshot = meal_catalog.get()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=f"Data file not found: {str(e)}")
+
+    index = snapshot.ivf
+    if index is None:
+        raise HTTPException(status_code=503, detail="Similarity index not available for this catalog")
+    if meal_type is not None and meal_type not in snapshot.partitions:
+        raise HTTPException(status_code=400, detail=f"Unknown meal_type: {meal_type}")
+
+    results = index.similar(recipe_id, k=k, n_probe=n_probe,
+                            meal_types=[meal_type] if meal_type is not None else None)
+    if results is None:
+        raise HTTPException(status_code=404, detail=f"Recipe not found: {recipe_id}")
+
+    return PlanJSONResponse({
+        "recipe_id": recipe_id,
+        "catalog_version": snapshot.version,
+        "n_probe": min(n_probe, index.n_clusters),
+        "results": [_recipe_summary(snapshot.partitions[r.meal_type], r.position, r.score) for r in results],
+    })
@@ -0,0 +1,39 @@
+"""
+JSON serialization for meal plan responses.
+
+Plans are built from pandas rows, so they contain NumPy scalars and NaN
+values. orjson serializes those natively (NaN/inf become null), which lets
+routes hand the plan straight to the encoder instead of walking it first.
+"""
+
+from typing import Any
+
+import orjson
+import pandas as pd
+from fastapi.responses import Response
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    # Only reached for types orjson doesn't handle itself (pandas scalars, NA, Series...)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "item"):
+        return obj.item()
+    if pd.isna(obj):
+        return None
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize a plan structure to JSON bytes."""
+    return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+
+class PlanJSONResponse(Response):
+    """JSON response rendered with orjson; return it directly to skip FastAPI's jsonable_encoder."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,89 @@
+"""
+Process-wide registry for the calorie prediction model.
+
+Loads `artifacts/models/model.joblib` once per process and hot-swaps a new
+version when the file on disk changes, so callers never unpickle the
+sklearn Pipeline per request.
+"""
+
+import time
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Union
+
+from joblib import load
+
+from src.utils.watched_files import Digests, WatchedFiles
+
+DEFAULT_MODEL_PATH = Path(__file__).parents[3] / "artifacts" / "models" / "model.joblib"
+
+
+class LoadedModel(NamedTuple):
+    """Immutable view of one loaded model version."""
+    model: Any
+    version: str        # short sha256 of the artifact bytes
+    loaded_at: float    # unix timestamp
+    load_seconds: float
+
+
+class ModelRegistry:
+    """
+    Caches the calorie model for the lifetime of the process.
+
+    Handles:
+    - Loading the joblib artifact once
+    - Watching the artifact's mtime/size and re-hashing it on change
+    - Atomically swapping in a new version without a restart
+    - Reporting the active version and load timings
+    """
+
+    def __init__(self, model_path: Union[str, Path] = DEFAULT_MODEL_PATH,
+                 check_interval: float = 2.0):
+        """
+        Args:
+            model_path: Path to the joblib artifact
+            check_interval: Minimum seconds between stat() checks of the artifact
+        """
+        self.model_path = Path(model_path)
+        self.check_interval = check_interval
+        self._artifact: WatchedFiles[LoadedModel] = WatchedFiles(
+            [self.model_path], self._load, "model artifact", check_interval)
+
+    def _load(self, digests: Digests, force: bool = False) -> LoadedModel:
+        start = time.perf_counter()
+        model = load(self.model_path)
+        loaded = LoadedModel(
+            model=model,
+            version=digests[0],
+            loaded_at=time.time(),
+            load_seconds=time.perf_counter() - start,
+        )
+        print(f"Loaded calorie model version {loaded.version} in {loaded.load_seconds:.3f}s")
+        return loaded
+
+    def get(self) -> LoadedModel:
+        """Return the active model, reloading it first if the artifact changed."""
+        return self._artifact.get()
+
+    def get_model(self) -> Any:
+        return self.get().model
+
+    def reload(self) -> LoadedModel:
+        """Force a reload of the artifact regardless of its mtime."""
+        return self._artifact.reload()
+
+    def info(self) -> Dict[str, Any]:
+        active = self._artifact.active
+        if active is None:
+            return {"loaded": False, "path": str(self.model_path)}
+        return {
+            "loaded": True,
+            "path": str(self.model_path),
+            "version": active.version,
+            "loaded_at": active.loaded_at,
+            "load_seconds": round(active.load_seconds, 4),
+            "reload_count": self._artifact.reload_count,
+        }
+
+
+# Shared instance used by getUserTarget
+model_registry = ModelRegistry()
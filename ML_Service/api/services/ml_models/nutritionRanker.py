@@ -1,6 +1,7 @@
-from joblib import load
 import pandas as pd
-from pathlib import Path
+from typing import Dict, List
+
+from api.services.ml_models.model_registry import model_registry
 
 # Activity level mapping (category → Harris-Benedict multiplier)
 ACTIVITY_MULTIPLIERS = {
@@ -11,17 +12,13 @@ ACTIVITY_MULTIPLIERS = {
     4: 1.9     # Extremely active (athlete)
 }
 
-def getUserTarget(user) -> tuple[int, float, float, float]:
+def _feature_row(user) -> Dict[str, float]:
     # Required fields for the model
     required_fields = ['Height_in', 'Weight_lb', 'Age', 'Gender', 'Activity_Level', 'Goal']
     missing_fields = [f for f in required_fields if f not in user]
     if missing_fields:
         raise ValueError(f"Missing required fields: {missing_fields}")
 
-    # Load trained model
-    model_path = Path(__file__).parents[3] / "artifacts" / "models" / "model.joblib"
-    model = load(model_path)
-
     # Convert Activity_Level category to multiplier
     activity_level = user["Activity_Level"]
     if activity_level in ACTIVITY_MULTIPLIERS:
@@ -32,20 +29,17 @@ def getUserTarget(user) -> tuple[int, float, float, float]:
         if not (1.2 <= activity_multiplier <= 1.9):
             raise ValueError(f"Invalid activity multiplier: {activity_multiplier}. Must be between 1.2 and 1.9.")
 
-    # Create user data with mapped activity level
-    user_data = pd.DataFrame([{
+    # User data with mapped activity level
+    return {
         'Height_in': user['Height_in'],
         'Weight_lb': user['Weight_lb'],
         'Age': user['Age'],
         'Gender': user['Gender'],
         'Activity_Level': activity_multiplier,
         'Goal': user['Goal']
-    }])
-    
-    # Predict target calories
-    target_calories = int(round(model.predict(user_data)[0]))
+    }
 
-    # Macro Split Logic
+def _macro_split(user, target_calories: int) -> tuple[int, float, float, float]:
     weight_lb = user["Weight_lb"]
     goal = int(user["Goal"])   # -1=lose, 0=maintain, 1=gain
 
@@ -57,7 +51,7 @@ def getUserTarget(user) -> tuple[int, float, float, float]:
     fat_frac = 0.25 if goal == 1 else 0.30
     fat_cals = target_calories * fat_frac
     fat_g = fat_cals / 9
-    
+
     # Minimum fat: 0.25g per lb for hormonal health
     min_fat_g = 0.25 * weight_lb
     fat_g = max(fat_g, min_fat_g)
@@ -72,4 +66,22 @@ def getUserTarget(user) -> tuple[int, float, float, float]:
         round(protein_g),
         round(fat_g),
         round(carb_g)
-    )
\ No newline at end of file
+    )
+
+def getUserTargets(users: List[dict]) -> List[tuple[int, float, float, float]]:
+    # One model.predict call for the whole batch
+    if not users:
+        return []
+    user_data = pd.DataFrame([_feature_row(user) for user in users])
+
+    # Trained model is loaded once per process and hot-swapped on change
+    model = model_registry.get_model()
+    predictions = model.predict(user_data)
+
+    return [
+        _macro_split(user, int(round(prediction)))
+        for user, prediction in zip(users, predictions)
+    ]
+
+def getUserTarget(user) -> tuple[int, float, float, float]:
+    return getUserTargets([user])[0]
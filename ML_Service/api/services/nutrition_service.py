@@ -3,46 +3,26 @@ Nutrition service for handling meal planning business logic.
 Separates API concerns from business logic.
 """
 
-from typing import Dict, List, Tuple, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+import os
 import sys
 import json
-import numpy as np
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parents[2]))
 
-from api.services.ml_models.nutritionRanker import getUserTarget
+from api.services.ml_models.model_registry import model_registry
+from api.services.ml_models.nutritionRanker import getUserTarget, getUserTargets
+from api.services.plan_cache import PlanCache
 from src.models.create_candidates import CandidatePoolBuilder
 from src.models.meal_planning import WeeklyMealPlanner
 
-
-def sanitize_for_json(obj):
-    """Recursively sanitize data structure for JSON serialization"""
-    if isinstance(obj, dict):
-        return {k: sanitize_for_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [sanitize_for_json(item) for item in obj]
-    elif isinstance(obj, tuple):
-        return [sanitize_for_json(item) for item in obj]
-    elif isinstance(obj, (np.integer, np.int64, np.int32, np.int16, np.int8)):
-        return int(obj)
-    elif isinstance(obj, (np.floating, np.float64, np.float32, np.float16)):
-        if np.isnan(obj) or np.isinf(obj):
-            return None
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return sanitize_for_json(obj.tolist())
-    elif isinstance(obj, (int, float)):
-        if isinstance(obj, float) and (np.isnan(obj) or np.isinf(obj)):
-            return None
-        return obj
-    elif hasattr(obj, 'item'):  # Handle pandas scalars
-        return sanitize_for_json(obj.item())
-    elif hasattr(obj, 'tolist'):  # Handle pandas Series/DataFrame
-        return sanitize_for_json(obj.tolist())
-    else:
-        return obj
+# Synthetic profile planned at startup; the allergy exercises the exclusion index
+WARMUP_USER = {
+    "Height_in": 70, "Weight_lb": 180, "Age": 30, "Gender": 1,
+    "Activity_Level": 2, "Goal": 0, "allergies": ["peanut"], "preferences": [],
+}
 
 
 class NutritionService:
@@ -59,16 +39,31 @@ class NutritionService:
     def __init__(self, 
                  candidate_pool_size: int = 40,
                  ingredient_limit: int = 4,
-                 candidate_recall_size: int = 200):
+                 candidate_recall_size: int = 200,
+                 plan_cache_size: int = 256,
+                 plan_cache_ttl: float = 3600.0,
+                 planner_solver: str = "greedy",
+                 solver_time_limit: float = 2.0,
+                 candidate_ivf_probes: Optional[int] = None,
+                 embedding_precision: str = "float32",
+                 candidate_macro_recall_size: Optional[int] = None):
 
         self.candidate_builder = CandidatePoolBuilder(
             pool_size=candidate_pool_size,
-            recall_size=candidate_recall_size
+            recall_size=candidate_recall_size,
+            ivf_probes=candidate_ivf_probes,
+            embedding_precision=embedding_precision,
+            macro_recall_size=candidate_macro_recall_size
         )
         
         self.meal_planner = WeeklyMealPlanner(
-            ingredient_limit=ingredient_limit
+            ingredient_limit=ingredient_limit,
+            solver=planner_solver,
+            solver_time_limit=solver_time_limit
         )
+        
+        # Finished plans keyed on profile + catalog/model versions
+        self.plan_cache = PlanCache(maxsize=plan_cache_size, ttl=plan_cache_ttl)
     
     def validate_user_data(self, user_data: Dict[str, Any]) -> None:
         required_fields = ['Height_in', 'Weight_lb', 'Age', 'Gender', 'Activity_Level', 'Goal']
@@ -98,6 +93,9 @@ class NutritionService:
         nutrition_targets_tuple = getUserTarget(user_data)
         
         # Convert tuple to dict for easier handling
+        return self._targets_dict(nutrition_targets_tuple)
+    
+    def _targets_dict(self, nutrition_targets_tuple: Tuple) -> Dict[str, float]:
         return {
             'calories': nutrition_targets_tuple[0],
             'protein_g': nutrition_targets_tuple[1],
@@ -105,6 +103,10 @@ class NutritionService:
             'carb_g': nutrition_targets_tuple[3]
         }
     
+    def calculate_nutrition_targets_batch(self, users: List[Dict[str, Any]]) -> List[Dict[str, float]]:
+        # Callers validate each user first; one model.predict call for the batch
+        return [self._targets_dict(t) for t in getUserTargets(users)]
+    
     def generate_candidate_pools(self, nutrition_targets: Dict[str, float], user_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
             candidates = self.candidate_builder.build_pools(
@@ -123,13 +125,12 @@ class NutritionService:
             raise ValueError(f"Failed to generate candidate pools: {str(e)}")
     
     def plan_weekly_meals(self, user_data: Dict[str, Any],
-                         candidate_pools: Dict[str, Any]) -> Tuple[Dict[str, Dict], Dict[str, int]]:
+                         candidate_pools: Dict[str, Any],
+                         nutrition_targets: Optional[Dict[str, float]] = None) -> Tuple[Dict[str, Dict], Dict[str, int]]:
         try:
-            # Reset planner state for fresh planning
-            self.meal_planner.reset_state()
-            
+            # Planner state is per call, so concurrent requests don't share it
             week_plan, ingredient_counts = self.meal_planner.plan_weekly_meals(
-                user_data, candidate_pools
+                user_data, candidate_pools, nutrition_targets=nutrition_targets
             )
             
             # Validate that we have plans for each day
@@ -145,7 +146,33 @@ class NutritionService:
         except Exception as e:
             raise ValueError(f"Failed to plan weekly meals: {str(e)}")
     
+    def plan_cache_key(self, user_data: Dict[str, Any]) -> Tuple:
+        """Normalized profile plus the catalog and model versions the plan depends on."""
+        profile = tuple(float(user_data[f]) for f in
+                        ['Height_in', 'Weight_lb', 'Age', 'Gender', 'Activity_Level', 'Goal'])
+        # Exclusion terms are matched case-insensitively as an OR, so order and case don't matter
+        allergies = tuple(sorted({str(t).lower() for t in user_data.get('allergies') or []}))
+        preferences = tuple(sorted({str(t).lower() for t in user_data.get('preferences') or []}))
+        return (
+            profile,
+            allergies,
+            preferences,
+            self.candidate_builder.catalog.get().version,
+            model_registry.get().version,
+        )
+    
     def generate_complete_meal_plan(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Generate (or reuse) the week plan; identical concurrent requests share one computation.
+
+        The plan holds NumPy scalars and NaN straight from the catalog rows;
+        serialize it with api.serialization.dumps.
+        """
+        self.validate_user_data(user_data)
+        key = self.plan_cache_key(user_data)
+        return self.plan_cache.get_or_compute(key, lambda: self._generate_complete_meal_plan(user_data))
+    
+    def _generate_complete_meal_plan(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
             # Calculate nutrition targets
             nutrition_targets = self.calculate_nutrition_targets(user_data)
@@ -156,15 +183,15 @@ class NutritionService:
             print(f"Generated candidate pools for {len(candidate_pools)} meal types")
             
             # Plan weekly meals
-            week_plan, ingredient_counts = self.plan_weekly_meals(user_data, candidate_pools)
+            week_plan, ingredient_counts = self.plan_weekly_meals(user_data, candidate_pools, nutrition_targets)
             print(f"Planned meals for {len(week_plan)} days")
             
-            return sanitize_for_json({
+            return {
                 "success": True,
                 "nutrition_targets": nutrition_targets,
                 "week_plan": week_plan,
                 "ingredient_counts": ingredient_counts
-            })
+            }
             
         except ValueError as ve:
             # Re-raise validation errors
@@ -172,5 +199,149 @@ class NutritionService:
         except Exception as e:
             raise RuntimeError(f"Unexpected error in meal plan generation: {str(e)}")
 
+    def compute_complete_meal_plan(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate the week plan without consulting or filling the plan cache."""
+        self.validate_user_data(user_data)
+        return self._generate_complete_meal_plan(user_data)
+
+    def warm_up(self, user_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Plan a week for a synthetic user, bypassing the plan cache.
+
+        Pays for lazy imports, first-touch page faults on the catalog arrays
+        and the planner's first solve before real traffic arrives.
+        """
+        return self.compute_complete_meal_plan(user_data or WARMUP_USER)
+
+    def stream_complete_meal_plan(self, user_data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the plan as events: targets first, then each day as soon as it is planned.
+
+        Events are {"event": "targets", ...}, {"event": "day", "day", "plan"} and
+        {"event": "done", "ingredient_counts"}. The assembled plan is cached like
+        generate_complete_meal_plan's, and a cached plan is replayed directly.
+        """
+        self.validate_user_data(user_data)
+        key = self.plan_cache_key(user_data)
+        
+        cached = self.plan_cache.get(key)
+        if cached is not None:
+            yield {"event": "targets", "nutrition_targets": cached["nutrition_targets"]}
+            for day, daily_plan in cached["week_plan"].items():
+                yield {"event": "day", "day": day, "plan": daily_plan}
+            yield {"event": "done", "ingredient_counts": cached["ingredient_counts"]}
+            return
+        
+        nutrition_targets = self.calculate_nutrition_targets(user_data)
+        yield {"event": "targets", "nutrition_targets": nutrition_targets}
+        
+        candidate_pools = self.generate_candidate_pools(nutrition_targets, user_data)
+        
+        context = self.meal_planner.new_context()
+        week_plan = {}
+        try:
+            for day, daily_plan in self.meal_planner.iter_weekly_meals(
+                    user_data, candidate_pools, nutrition_targets=nutrition_targets, ctx=context):
+                week_plan[day] = daily_plan
+                yield {"event": "day", "day": day, "plan": daily_plan}
+        except Exception as e:
+            raise ValueError(f"Failed to plan weekly meals: {str(e)}")
+        ingredient_counts = context.ingredient_counts
+        
+        self.plan_cache.put(key, {
+            "success": True,
+            "nutrition_targets": nutrition_targets,
+            "week_plan": week_plan,
+            "ingredient_counts": ingredient_counts
+        })
+        yield {"event": "done", "ingredient_counts": ingredient_counts}
+
+    def generate_batch_meal_plans(self, users: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Generate meal plans for many users, sharing the model call and candidate scoring.
+
+        Each entry matches what generate_complete_meal_plan returns for that user;
+        users that fail validation or planning get {"success": False, "error": ...}.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(users)
+        valid = []
+        for i, user_data in enumerate(users):
+            try:
+                self.validate_user_data(user_data)
+                valid.append(i)
+            except ValueError as e:
+                results[i] = {"success": False, "error": f"Invalid user data: {str(e)}"}
+
+        # Serve repeat profiles from the plan cache
+        keys = {i: self.plan_cache_key(users[i]) for i in valid}
+        for i in list(valid):
+            cached = self.plan_cache.get(keys[i])
+            if cached is not None:
+                results[i] = cached
+                valid.remove(i)
+
+        if valid:
+            valid_users = [users[i] for i in valid]
+            try:
+                targets_list = self.calculate_nutrition_targets_batch(valid_users)
+                pools_list = self.candidate_builder.build_pools_batch(targets_list, valid_users)
+            except Exception as e:
+                # Every user here passed validation, so a failure is ours, not the client's
+                raise RuntimeError(f"Unexpected error in batch meal plan generation: {str(e)}")
+
+            for i, user_data, nutrition_targets, candidate_pools in zip(valid, valid_users, targets_list, pools_list):
+                try:
+                    week_plan, ingredient_counts = self.plan_weekly_meals(
+                        user_data, candidate_pools, nutrition_targets
+                    )
+                    results[i] = {
+                        "success": True,
+                        "nutrition_targets": nutrition_targets,
+                        "week_plan": week_plan,
+                        "ingredient_counts": ingredient_counts
+                    }
+                    self.plan_cache.put(keys[i], results[i])
+                except ValueError as e:
+                    results[i] = {"success": False, "error": str(e)}
+
+        print(f"Planned meals for {len(valid)} of {len(users)} users (rest cached or invalid)")
+        return results
+
 # Service instance for dependency injection
-nutrition_service = NutritionService()
\ No newline at end of file
+# PLAN_SOLVER=combined picks each day's meals together by exhaustive combination search;
+# PLAN_SOLVER=ilp plans the whole week as one integer program (greedy fallback on timeout)
+# CANDIDATE_IVF_PROBES=n scores only the recipes in the n nearest clusters (unset = every recipe)
+# CANDIDATE_EMBEDDING_PRECISION=float16|int8 scores preference on quantized embeddings, rescoring the best in float32 (needs the embedding store)
+# CANDIDATE_MACRO_RECALL=n scores only the n recipes nearest each meal's calorie target (macro index lookup);
+#   scores match the exact scan, but recipes beyond the n nearest are never considered, so pools drift where
+#   the window is much larger than n (dinner: about 14 of 40 pool recipes match at n=1600, 33 of 40 at
+#   n=4000), and it can't be combined with CANDIDATE_IVF_PROBES or a quantized precision
+nutrition_service = NutritionService(
+    planner_solver=os.environ.get("PLAN_SOLVER", "greedy"),
+    solver_time_limit=float(os.environ.get("PLAN_SOLVER_TIME_LIMIT", "2.0")),
+    candidate_ivf_probes=int(os.environ["CANDIDATE_IVF_PROBES"]) if os.environ.get("CANDIDATE_IVF_PROBES") else None,
+    embedding_precision=os.environ.get("CANDIDATE_EMBEDDING_PRECISION", "float32"),
+    candidate_macro_recall_size=int(os.environ["CANDIDATE_MACRO_RECALL"]) if os.environ.get("CANDIDATE_MACRO_RECALL") else None,
+)
+
+
+def generate_meal_plan(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    # Module-level entry points so plan_executor can ship work to a process pool
+    return nutrition_service.generate_complete_meal_plan(user_data)
+
+
+def compute_meal_plan(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    # Uncached; the async route coalesces and caches around it
+    return nutrition_service.compute_complete_meal_plan(user_data)
+
+
+def generate_meal_plans(users: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return nutrition_service.generate_batch_meal_plans(users)
+
+
+def stream_meal_plan(user_data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    return nutrition_service.stream_complete_meal_plan(user_data)
+
+
+def warm_up_plan() -> bool:
+    return nutrition_service.warm_up()["success"]
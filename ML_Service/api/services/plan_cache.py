@@ -0,0 +1,162 @@
+"""
+Bounded LRU + TTL cache for generated meal plans, with single-flight.
+
+Plan generation is deterministic for a given profile, catalog version and
+model version, so repeated requests can reuse the first result. Concurrent
+requests for the same key wait on the one computation already running
+instead of starting their own. Async routes coalesce on the event loop
+(get_or_compute_async), so waiting requests don't hold a worker.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class PlanCache:
+    """
+    Thread-safe LRU cache with per-entry expiry and request coalescing.
+
+    Handles:
+    - Least-recently-used eviction once `maxsize` entries are stored
+    - Expiring entries `ttl` seconds after they were computed
+    - Single-flight: one computation per key, shared by concurrent callers
+      (threads, or coroutines on the event loop)
+    - Hit / miss / coalesced counters
+
+    Cached values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 3600.0):
+        """
+        Args:
+            maxsize: Maximum cached plans (0 disables caching, coalescing still applies)
+            ttl: Seconds a cached plan stays valid
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._in_flight_async: Dict[Hashable, "asyncio.Task"] = {}
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self._hits += 1
+                return value
+            self._misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for `key`, computing it at most once across concurrent callers."""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self._hits += 1
+                return value
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                self._misses += 1
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            # Errors from the leader propagate to every waiter
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    async def get_or_compute_async(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Event-loop version of get_or_compute.
+
+        The first caller starts `compute()` as a task; later callers for the
+        same key await that task instead of dispatching their own work. The
+        task is shielded, so a caller that disconnects doesn't cancel the
+        computation the others are waiting on.
+        """
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self._hits += 1
+                return value
+            task = self._in_flight_async.get(key)
+            if task is None:
+                self._misses += 1
+                task = asyncio.get_running_loop().create_task(self._fill(key, compute))
+                # Retrieve the error even if every caller has gone away
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                self._in_flight_async[key] = task
+            else:
+                self._coalesced += 1
+        # Errors from the computation propagate to every waiter
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await compute()
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._in_flight_async.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "in_flight": len(self._in_flight) + len(self._in_flight_async),
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+            }
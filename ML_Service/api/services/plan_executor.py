@@ -0,0 +1,233 @@
+"""
+Bounded executor for CPU-bound meal plan generation.
+
+Routes await plan generation through this executor so the event loop stays
+free for other requests (including /health). Admission is bounded: once the
+workers are busy and the wait queue is full, new work is rejected with
+QueueFullError instead of piling up.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+
+class QueueFullError(Exception):
+    """Raised when the executor has no worker or queue slot left."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Plan generation queue is full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _timed_call(fn: Callable, args: Tuple) -> Tuple[float, Any]:
+    # Runs in the worker; returns the wall-clock start so the caller can compute queue wait
+    started_at = time.time()
+    return started_at, fn(*args)
+
+
+def _started_at(future: Future) -> Optional[float]:
+    if future.cancelled() or future.exception() is not None:
+        return None
+    return future.result()[0]
+
+
+class PlanExecutor:
+    """
+    Runs plan generation on a thread or process pool with admission control.
+
+    Handles:
+    - Dispatching synchronous work off the event loop
+    - Relaying generator output (streamed plans) back to the event loop
+    - Rejecting work once workers + queue slots are exhausted
+    - Tracking queue depth and wait / run times
+    """
+
+    def __init__(self, mode: str = "thread", max_workers: int = 2,
+                 max_queue: int = 8, retry_after: int = 5):
+        """
+        Args:
+            mode: "thread" or "process"
+            max_workers: Concurrent plan generations
+            max_queue: Requests allowed to wait for a worker before rejecting
+            retry_after: Seconds suggested to rejected clients
+        """
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown executor mode: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+
+        self._executor: Optional[Executor] = None
+        self._stream_executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._waits: Deque[float] = deque(maxlen=500)
+        self._runs: Deque[float] = deque(maxlen=500)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.mode == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                            thread_name_prefix="plan")
+        return self._executor
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise QueueFullError(self.retry_after)
+            self._in_flight += 1
+
+    def _release(self, submitted_at: float, started_at: Optional[float], finished_at: float) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            if started_at is not None:
+                self._waits.append(max(0.0, started_at - submitted_at))
+                self._runs.append(max(0.0, finished_at - started_at))
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """
+        Run `fn(*args)` on the pool and await its result.
+
+        In process mode `fn` and `args` must be picklable (use module-level functions).
+        Raises QueueFullError when no slot is available.
+        """
+        self._admit()
+        submitted_at = time.time()
+        try:
+            future = self._get_executor().submit(_timed_call, fn, args)
+        except BaseException:
+            self._release(submitted_at, None, time.time())
+            raise
+        # The slot is held until the worker actually stops, even if the client disconnects
+        # (a cancelled request only cancels work that hasn't started yet)
+        future.add_done_callback(
+            lambda f: self._release(submitted_at, _started_at(f), time.time())
+        )
+        started_at, result = await asyncio.wrap_future(future)
+        return result
+
+    def stream(self, gen_fn: Callable[..., Iterator[Any]], *args: Any) -> AsyncIterator[Any]:
+        """
+        Run the generator `gen_fn(*args)` off the event loop and relay its items.
+
+        Admission happens here, before anything is sent, so QueueFullError can
+        still become a 503. Generators can't cross process boundaries, so in
+        process mode streams run on a thread pool of the same size.
+        """
+        self._admit()
+        return self._relay(gen_fn, args, time.time())
+
+    def _get_stream_executor(self) -> Executor:
+        if self.mode == "thread":
+            return self._get_executor()
+        if self._stream_executor is None:
+            with self._lock:
+                if self._stream_executor is None:
+                    self._stream_executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                               thread_name_prefix="plan-stream")
+        return self._stream_executor
+
+    async def _relay(self, gen_fn: Callable[..., Iterator[Any]], args: Tuple,
+                     submitted_at: float) -> AsyncIterator[Any]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        timing: Dict[str, float] = {}
+        done = object()
+
+        def push(item: Any, error: Optional[BaseException] = None) -> None:
+            if not cancelled.is_set():
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+                except RuntimeError:
+                    # Event loop already closed (client went away during shutdown)
+                    cancelled.set()
+
+        def produce() -> None:
+            timing["started_at"] = time.time()
+            try:
+                for item in gen_fn(*args):
+                    if cancelled.is_set():
+                        return
+                    push(item)
+            except BaseException as e:
+                push(done, e)
+            else:
+                push(done)
+
+        try:
+            future = loop.run_in_executor(self._get_stream_executor(), produce)
+        except BaseException:
+            self._release(submitted_at, None, time.time())
+            raise
+        # The slot is held until the worker actually stops, even if the client disconnects early
+        future.add_done_callback(
+            lambda _: self._release(submitted_at, timing.get("started_at"), time.time())
+        )
+
+        try:
+            while True:
+                item, error = await queue.get()
+                if item is done:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            cancelled.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            runs = list(self._runs)
+            in_flight = self._in_flight
+            completed = self._completed
+            rejected = self._rejected
+
+        def pct(values, q):
+            return round(values[min(len(values) - 1, int(q * len(values)))], 4) if values else 0.0
+
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": in_flight,
+            "queue_depth": max(0, in_flight - self.max_workers),
+            "completed": completed,
+            "rejected": rejected,
+            "wait_seconds_p50": pct(waits, 0.50),
+            "wait_seconds_p95": pct(waits, 0.95),
+            "wait_seconds_max": round(waits[-1], 4) if waits else 0.0,
+            "run_seconds_avg": round(sum(runs) / len(runs), 4) if runs else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executors = [self._executor, self._stream_executor]
+            self._executor = self._stream_executor = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Shared executor for the nutrition routes, configured from the environment
+plan_executor = PlanExecutor(
+    mode=os.environ.get("PLAN_EXECUTOR_MODE", "thread"),
+    max_workers=int(os.environ.get("PLAN_EXECUTOR_WORKERS", "2")),
+    max_queue=int(os.environ.get("PLAN_EXECUTOR_QUEUE", "8")),
+    retry_after=int(os.environ.get("PLAN_EXECUTOR_RETRY_AFTER", "5")),
+)
@@ -0,0 +1,167 @@
+"""
+Startup warmup and readiness tracking.
+
+The first request after a deploy used to pay for importing sklearn,
+unpickling the calorie model and reading the Parquet catalog. The app's
+lifespan hook now starts a warmup in the background instead: the model and
+the catalog (with its partitions, macro index, IVF index and ingredient
+matrix) load in parallel, configured quantized embeddings are built, and one
+synthetic plan runs end to end. `/ready` answers 503 until every step has
+finished, so a load balancer only routes traffic to a warm worker. Failed
+steps are retried with exponential backoff until they succeed or the app
+shuts down; a step whose prerequisites failed is marked skipped until then.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parents[2]))
+
+from api.services.ml_models.model_registry import model_registry
+from api.services.nutrition_service import nutrition_service, warm_up_plan
+from api.services.plan_executor import PlanExecutor, plan_executor
+from src.models.catalog import meal_catalog
+
+COMPONENTS = ("model", "catalog", "indexes", "warmup_plan")
+
+# Components each step needs to be ready first
+PREREQUISITES = {
+    "model": (),
+    "catalog": (),
+    "indexes": ("catalog",),
+    "warmup_plan": ("model", "catalog", "indexes"),
+}
+
+
+class StartupWarmup:
+    """
+    Loads everything a plan needs before the worker reports ready.
+
+    Handles:
+    - Loading the model and the catalog concurrently off the event loop
+    - Building catalog-derived indexes that are otherwise built lazily
+    - Running a synthetic plan (one per pool worker in process mode)
+    - Retrying failed steps with exponential backoff
+    - Per-component status, timings and errors for /ready
+    """
+
+    def __init__(self, executor: PlanExecutor = plan_executor, run_plan: bool = True,
+                 retry_delay: float = 1.0, max_retry_delay: float = 60.0):
+        """
+        Args:
+            executor: Plan executor whose workers should be warmed
+            run_plan: Whether to finish with a synthetic plan
+            retry_delay: Seconds before the first retry of failed steps
+            max_retry_delay: Cap on the doubling delay between retries
+        """
+        self.executor = executor
+        self.run_plan = run_plan
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.components: Dict[str, Dict[str, Any]] = {
+            name: {"status": "pending", "seconds": None} for name in COMPONENTS
+        }
+        if not run_plan:
+            self.components["warmup_plan"].update(status="skipped", reason="disabled")
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.attempts = 0
+        self.next_retry_at: Optional[float] = None
+
+    def _due(self, name: str) -> bool:
+        """Whether a component still has to (re)run."""
+        if name == "warmup_plan" and not self.run_plan:
+            return False
+        return self.components[name]["status"] != "ready"
+
+    @property
+    def ready(self) -> bool:
+        return self.started_at is not None and not any(self._due(name) for name in COMPONENTS)
+
+    async def _step(self, name: str, fn: Callable[[], Any], in_thread: bool = True) -> bool:
+        component = self.components[name]
+        waiting = [p for p in PREREQUISITES[name] if self.components[p]["status"] != "ready"]
+        if waiting:
+            component.update(status="skipped", reason=f"{', '.join(waiting)} not ready")
+            return False
+        component.pop("reason", None)
+        component["status"] = "loading"
+        start = time.perf_counter()
+        try:
+            await (asyncio.to_thread(fn) if in_thread else fn())
+        except Exception as e:
+            component.update(status="failed", error=f"{type(e).__name__}: {e}")
+            print(f"Warning: warmup step {name} failed: {e}")
+            return False
+        finally:
+            component["seconds"] = round(time.perf_counter() - start, 4)
+        component.pop("error", None)
+        component["status"] = "ready"
+        return True
+
+    def _build_indexes(self) -> None:
+        snapshot = meal_catalog.get()
+        # Quantized copies are otherwise built by the first request that scores with them
+        precision = nutrition_service.candidate_builder.embedding_precision
+        if precision != "float32":
+            for partition in snapshot.partitions.values():
+                partition.quantized(precision)
+
+    async def _warm_plan(self) -> None:
+        if self.executor.mode == "process":
+            # Each pool process loads its own model and catalog; give every one a plan
+            await asyncio.gather(*(self.executor.run(warm_up_plan) for _ in range(self.executor.max_workers)))
+        else:
+            await asyncio.to_thread(warm_up_plan)
+
+    async def _attempt(self) -> None:
+        """Run every component that isn't ready yet, in dependency order."""
+        loaders = {"model": model_registry.get, "catalog": meal_catalog.get}
+        await asyncio.gather(*(self._step(name, fn) for name, fn in loaders.items() if self._due(name)))
+        if self._due("indexes"):
+            await self._step("indexes", self._build_indexes)
+        if self._due("warmup_plan"):
+            await self._step("warmup_plan", self._warm_plan, in_thread=False)
+
+    async def run(self) -> bool:
+        """Warm every component, retrying failed steps until the worker is ready (or the task is cancelled)."""
+        self.started_at = time.time()
+        start = time.perf_counter()
+        delay = self.retry_delay
+        while True:
+            self.attempts += 1
+            await self._attempt()
+            if self.ready:
+                break
+            failed = [name for name in COMPONENTS if self.components[name]["status"] == "failed"]
+            print(f"Warning: startup warmup not ready ({', '.join(failed)} failed); retrying in {delay:.1f}s")
+            self.next_retry_at = time.time() + delay
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+        self.next_retry_at = None
+        self.finished_at = time.time()
+        print(f"Startup warmup finished in {time.perf_counter() - start:.3f}s after {self.attempts} attempt(s)")
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 4)
+        return {
+            "ready": self.ready,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "seconds": elapsed,
+            "attempts": self.attempts,
+            "next_retry_at": self.next_retry_at,
+            "components": self.components,
+        }
+
+
+# Shared instance started by the app's lifespan; STARTUP_WARMUP_PLAN=0 skips the synthetic plan
+startup_warmup = StartupWarmup(run_plan=os.environ.get("STARTUP_WARMUP_PLAN", "1") != "0")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Latency and target error of greedy vs combined daily meal selection.
+
+Builds candidate pools for a few profiles once, then plans full weeks with
+WeeklyMealPlanner(solver="greedy") and WeeklyMealPlanner(solver="combined")
+and reports time per week plus the mean relative error of the daily totals.
+
+Usage (from the ML_Service root):
+    python scripts/benchmark_day_selection.py [--repeats 10]
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from api.services.nutrition_service import nutrition_service
+from src.models.day_combinations import DailyCombinationSearch
+from src.models.meal_planning import WeeklyMealPlanner
+
+PROFILES = [
+    {'Height_in': 70, 'Weight_lb': 180, 'Age': 25, 'Gender': 1, 'Activity_Level': 2, 'Goal': 0,
+     'allergies': ['peanut', 'shrimp'], 'preferences': ['liver']},
+    {'Height_in': 64, 'Weight_lb': 140, 'Age': 41, 'Gender': 0, 'Activity_Level': 1, 'Goal': -1,
+     'allergies': [], 'preferences': []},
+    {'Height_in': 74, 'Weight_lb': 230, 'Age': 30, 'Gender': 1, 'Activity_Level': 4, 'Goal': 1,
+     'allergies': ['milk'], 'preferences': ['pork']},
+]
+
+# Daily target key -> total_nutrition key
+ERROR_KEYS = {'calories': 'calories', 'protein_g': 'protein_g', 'carb_g': 'carbs_g', 'fat_g': 'fat_g'}
+
+
+def daily_errors(week_plan, targets):
+    errors = {key: [] for key in ERROR_KEYS}
+    for plan in week_plan.values():
+        for target_key, total_key in ERROR_KEYS.items():
+            target = float(targets[target_key])
+            errors[target_key].append(abs(float(plan['total_nutrition'][total_key]) - target) / target)
+    return errors
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=10, help="Weeks planned per profile and mode")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        cases = []
+        for user in PROFILES:
+            targets = nutrition_service.calculate_nutrition_targets(user)
+            cases.append((user, targets, nutrition_service.generate_candidate_pools(targets, user)))
+
+    for mode in ("greedy", "combined"):
+        planner = WeeklyMealPlanner(solver=mode)
+        seconds = []
+        errors = {key: [] for key in ERROR_KEYS}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for user, targets, pools in cases:
+                # Warm-up run (pool cursors, ingredient interning)
+                planner.plan_weekly_meals(user, pools, nutrition_targets=targets)
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    week_plan, _ = planner.plan_weekly_meals(user, pools, nutrition_targets=targets)
+                    seconds.append(time.perf_counter() - start)
+                for key, values in daily_errors(week_plan, targets).items():
+                    errors[key].extend(values)
+        error_report = ", ".join(f"{key} {statistics.mean(values):.1%}" for key, values in errors.items())
+        print(f"{mode:>8}: {statistics.median(seconds) * 1000:7.1f} ms/week (median) | "
+              f"mean daily error: {error_report}")
+
+    # Raw search cost for one day on full pools
+    search = DailyCombinationSearch()
+    for user, targets, pools in cases:
+        sizes = "x".join(str(len(pools[slot])) for slot in ('breakfast', 'lunch', 'dinner', 'snack'))
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            search.best(pools, targets)
+        print(f"combination search over {sizes} pools: "
+              f"{(time.perf_counter() - start) / args.repeats * 1000:.2f} ms/day")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Cost of calorie-window recall: full mask vs macro index, as the catalog grows.
+
+Tiles the dinner partition's macros up to `--max-scale` times its size and
+times the recall window lookup three ways: a mask over every row, the whole
+window from the index, and the `--limit` rows nearest the calorie target.
+Then compares candidate pool builds with and without macro_recall_size on
+the real catalog.
+
+Usage (from the ML_Service root):
+    python scripts/benchmark_macro_recall.py [--max-scale 64] [--limit 1600] [--repeats 20]
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.models.catalog import meal_catalog
+from src.models.create_candidates import CandidatePoolBuilder
+from src.models.macro_index import MacroIndex
+
+TARGETS = {'calories': 2400, 'protein_g': 150, 'fat_g': 80, 'carb_g': 250}
+
+
+def median_ms(fn, repeats: int) -> float:
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-scale", type=int, default=64, help="Largest multiple of the dinner partition")
+    parser.add_argument("--limit", type=int, default=1600, help="Nearest rows kept per window")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed calls per measurement")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        partition = meal_catalog.get().partitions['dinner']
+    rng = np.random.default_rng(0)
+    low, high = 560.0, 1120.0  # a typical dinner recall window
+
+    scale = 1
+    while scale <= args.max_scale:
+        # Jitter the tiled copies so the sorted order isn't trivially repeated
+        kcal = (np.tile(partition.kcal, scale) * rng.uniform(0.95, 1.05, len(partition) * scale)).astype(np.float32)
+        other = [np.tile(arr, scale) for arr in (partition.protein_g, partition.carbs_g, partition.fat_g)]
+        index = MacroIndex(kcal, *other)
+        mask_ms = median_ms(lambda: np.flatnonzero((kcal >= low) & (kcal <= high)), args.repeats)
+        index_ms = median_ms(lambda: np.sort(index.kcal_range(low, high)), args.repeats)
+        nearest_ms = median_ms(lambda: index.box((low, high), target={"kcal": 840.0}, limit=args.limit),
+                               args.repeats)
+        print(f"{len(kcal):>9} recipes: mask {mask_ms:7.3f} ms | index window {index_ms:7.3f} ms | "
+              f"nearest {args.limit} {nearest_ms:7.3f} ms")
+        scale *= 4
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for size in (None, args.limit):
+            builder = CandidatePoolBuilder(macro_recall_size=size)
+            builder.build_pools(TARGETS)
+            ms = median_ms(lambda: builder.build_pools(TARGETS), args.repeats)
+            print(f"build_pools macro_recall_size={size}: {ms:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
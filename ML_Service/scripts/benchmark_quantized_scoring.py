@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Memory, latency and rank agreement of quantized vs float32 preference scoring.
+
+For each meal-type partition and precision, scores query vectors (the
+cold-start vector and recipes sampled from the catalog) against the float32
+matrix and against the quantized copy with exact rescoring, then reports
+the heap bytes each precision adds to every worker process, median
+latency, top-k overlap with the float32 ranking and the largest
+preference-score error. Quantized scoring needs the memory-mapped embedding
+store, so the float32 matrix itself takes no heap. Finally builds candidate
+pools for a few profiles in each precision and reports how many pool
+recipes match the float32 pools.
+
+Usage (from the ML_Service root):
+    python scripts/benchmark_quantized_scoring.py [--queries 50] [--top 200] [--rescore 800]
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.models.catalog import meal_catalog
+from src.models.create_candidates import CandidatePoolBuilder
+from src.models.scoring import cold_start_user_vector, preference_scores, rescored_preference_scores
+
+TARGETS = [
+    {'calories': 2400, 'protein_g': 150, 'fat_g': 80, 'carb_g': 250},
+    {'calories': 1700, 'protein_g': 110, 'fat_g': 55, 'carb_g': 180},
+]
+USERS = [{'allergies': [], 'preferences': []}, {'allergies': ['milk'], 'preferences': ['pork']}]
+
+
+def timed(fn, repeats: int = 3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def top_k(scores: np.ndarray, k: int) -> set:
+    return set(np.argsort(-scores, kind="stable")[:k].tolist())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=50, help="Sampled recipe vectors per meal type")
+    parser.add_argument("--top", type=int, default=200, help="k for the top-k overlap")
+    parser.add_argument("--rescore", type=int, default=800, help="Rows rescored in float32")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        snapshot = meal_catalog.get()
+    if not snapshot.memory["embeddings_memory_mapped"]:
+        print("Catalog has no embedding store; run scripts/build_embedding_store.py first")
+        return 1
+    rng = np.random.default_rng(0)
+
+    print(f"{'meal type':>10} {'precision':>9} {'heap MB':>7} {'ms':>7} {'top-k overlap':>14} {'max pref err':>13}")
+    for meal_type, partition in snapshot.partitions.items():
+        emb = np.asarray(partition.embeddings)
+        queries = [cold_start_user_vector(emb)]
+        queries += [emb[i] for i in rng.choice(len(emb), size=min(args.queries, len(emb)), replace=False)]
+        exact = [timed(lambda q=q: preference_scores(emb, q)) for q in queries]
+        print(f"{meal_type:>10} {'float32':>9} {0:7.2f} "
+              f"{statistics.median(t for _, t in exact) * 1000:7.3f} {'1.000':>14} {'0':>13}")
+
+        for precision in ("float16", "int8"):
+            quantized = partition.quantized(precision)
+            overlap, error, seconds = [], [], []
+            for q, (pref, _) in zip(queries, exact):
+                approx, elapsed = timed(lambda q=q: rescored_preference_scores(quantized, emb, q, None, args.rescore))
+                seconds.append(elapsed)
+                k = min(args.top, len(pref))
+                overlap.append(len(top_k(pref, k) & top_k(approx, k)) / k)
+                error.append(float(np.max(np.abs(pref - approx))))
+            print(f"{meal_type:>10} {precision:>9} {quantized.nbytes() / 1e6:7.2f} "
+                  f"{statistics.median(seconds) * 1000:7.3f} {statistics.mean(overlap):14.3f} {max(error):13.5f}")
+
+    # End-to-end: how much of each candidate pool changes
+    builders = {p: CandidatePoolBuilder(embedding_precision=p, rescore_size=args.rescore)
+                for p in ("float32", "float16", "int8")}
+    for precision in ("float16", "int8"):
+        same = total = 0
+        for targets in TARGETS:
+            for user in USERS:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    base = builders["float32"].build_pools(targets, user)
+                    pools = builders[precision].build_pools(targets, user)
+                for meal_type, pool in base.items():
+                    same += len(set(pool['recipe_id']) & set(pools[meal_type]['recipe_id']))
+                    total += len(pool)
+        print(f"{precision}: {same}/{total} candidate pool recipes identical to float32")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Latency and fit of the multi-item snack filler over the full snack tables.
+
+Fills a grid of calorie / protein gaps and reports per-call latency
+(median and p99), how often 1, 2 or 3 items were used, and the mean
+calorie error and protein shortfall of the chosen snacks.
+
+Usage (from the ML_Service root):
+    python scripts/benchmark_snack_filler.py [--repeats 20]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.models.snack_tables import snack_tables
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=20, help="Timed calls per gap")
+    args = parser.parse_args()
+
+    tables = snack_tables.get()
+    if tables.filler is None:
+        print("Snack tables not found")
+        return 1
+    filler = tables.filler
+    print(f"{len(filler)} snack items ({len(tables.recipes or [])} recipes, {len(tables.staples or [])} staples)")
+
+    seconds, items, calorie_error, shortfall = [], {}, [], []
+    for calories in np.arange(60, 1501, 40):
+        for protein in (0, 5, 15, 30, 60):
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                rows = filler.fill(float(calories), float(protein))
+                seconds.append(time.perf_counter() - start)
+            items[len(rows)] = items.get(len(rows), 0) + 1
+            if rows:
+                total_kcal = sum(float(row['calories']) for row in rows)
+                total_protein = sum(float(row['protein_g']) for row in rows)
+                calorie_error.append(abs(total_kcal - calories) / calories)
+                if protein:
+                    shortfall.append(max(protein - total_protein, 0) / protein)
+
+    seconds.sort()
+    print(f"latency: median {statistics.median(seconds) * 1000:.3f} ms, "
+          f"p99 {seconds[int(len(seconds) * 0.99)] * 1000:.3f} ms")
+    print(f"items per snack: {dict(sorted(items.items()))}")
+    print(f"mean calorie error {statistics.mean(calorie_error):.2%}, "
+          f"mean protein shortfall {statistics.mean(shortfall):.2%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Write the memory-mapped embedding store for an existing catalog.
+
+buildEmbeddings and build_clusters write the store themselves; this covers
+catalogs built before that, and stores the service ignores because they were
+written for an older version of the catalog file. Also compares catalog load time and process
+memory with and without the store.
+
+Usage (from the ML_Service root):
+    python scripts/build_embedding_store.py [--catalog PATH]
+"""
+
+import argparse
+import contextlib
+import io
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.models.catalog import DEFAULT_CATALOG_PATH, MealCatalog, standardize_columns
+from src.models.meal_partitions import embedding_columns
+
+
+def measure_load(catalog_path: str) -> None:
+    # Runs in a fresh process so peak RSS belongs to this load alone
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        snapshot = MealCatalog(catalog_path).get()
+        seconds = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    mapped = snapshot.memory["embeddings_memory_mapped"]
+    print(f"{'store' if mapped else 'parquet columns':>16}: load {seconds:.2f}s, peak RSS {peak_mb:.0f} MB")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--catalog", default=str(DEFAULT_CATALOG_PATH), help="Catalog Parquet file")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure_load(args.measure)
+        return 0
+
+    from src.models.embedding_store import embedding_store_paths, write_embedding_store
+
+    def run_measure():
+        subprocess.run([sys.executable, __file__, "--measure", args.catalog], check=True)
+
+    for path in embedding_store_paths(args.catalog):
+        path.unlink(missing_ok=True)
+    run_measure()
+
+    df = standardize_columns(pd.read_parquet(args.catalog))
+    emb_cols = embedding_columns(df.columns)
+    if not emb_cols:
+        print("Catalog has no embedding columns")
+        return 1
+    path = write_embedding_store(args.catalog, df[emb_cols].to_numpy(dtype=np.float32),
+                                 df["recipe_id"], df["meal_type"])
+    print(f"Saved {len(df)} x {len(emb_cols)} embeddings ({path.stat().st_size / 1e6:.1f} MB) to {path}")
+    run_measure()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
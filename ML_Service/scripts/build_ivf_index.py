@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Rebuild the IVF index for an existing clustered catalog.
+
+build_clusters writes the index alongside the catalog; this script covers
+catalogs clustered before that, using the normalized mean embedding of each
+cluster as its centroid. Also reports recall@k of probed search against an
+exact scan for a sample of recipes.
+
+Usage (from the ML_Service root):
+    python scripts/build_ivf_index.py [--catalog PATH] [--probes 1 2 4 8] [--samples 200]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.models.catalog import DEFAULT_CATALOG_PATH, standardize_columns
+from src.models.ivf_index import RecipeIVFIndex, ivf_path_for
+from src.models.meal_partitions import build_partitions
+
+
+def exact_top(index: RecipeIVFIndex, query: np.ndarray, k: int) -> set:
+    found = []
+    for mt, part in index.partitions.items():
+        scores = part.embeddings @ query
+        top = np.argsort(-scores, kind="stable")[:k + 1]
+        found.extend((float(scores[i]), mt, int(i)) for i in top)
+    found.sort(key=lambda r: -r[0])
+    return {(mt, i) for _, mt, i in found[:k + 1]}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--catalog", default=str(DEFAULT_CATALOG_PATH), help="Clustered catalog Parquet file")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8], help="n_probe values to evaluate")
+    parser.add_argument("--samples", type=int, default=200, help="Recipes used as recall queries")
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query")
+    args = parser.parse_args()
+
+    partitions = build_partitions(standardize_columns(pd.read_parquet(args.catalog)))
+    index = RecipeIVFIndex.build(partitions)
+    if index is None:
+        print("Catalog has no embeddings")
+        return 1
+    path = ivf_path_for(args.catalog)
+    index.save(path)
+    print(f"Saved {index.n_clusters}-cluster index ({index.nbytes() / 1e6:.2f} MB) to {path}")
+
+    rng = np.random.default_rng(0)
+    ids = rng.choice(np.asarray(index._id_index), size=min(args.samples, len(index._id_index)), replace=False)
+    for n_probe in args.probes:
+        recall, seconds = [], []
+        for recipe_id in ids:
+            source = index.locate(recipe_id)
+            query = index.partitions[source.meal_type].embeddings[source.position]
+            truth = exact_top(index, query, args.k) - {(source.meal_type, source.position)}
+            start = time.perf_counter()
+            found = index.similar(recipe_id, k=args.k, n_probe=n_probe)
+            seconds.append(time.perf_counter() - start)
+            recall.append(len({(r.meal_type, r.position) for r in found} & truth) / max(len(truth), 1))
+        print(f"n_probe={n_probe:>3}: recall@{args.k} {np.mean(recall):.3f}, "
+              f"median {np.median(seconds) * 1000:.2f} ms/query")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
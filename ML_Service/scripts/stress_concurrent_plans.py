@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress check for the meal planning engine.
+
+Plans a few profiles serially, then plans them again from many threads at
+once through one shared NutritionService (plan cache bypassed, streaming and
+non-streaming paths mixed) and checks every concurrent result is
+byte-identical to its serial result.
+
+Usage (from the ML_Service root):
+    python scripts/stress_concurrent_plans.py [--threads 16] [--rounds 4] [--solver greedy]
+
+Exits non-zero on any mismatch or error. This is a manual check: it needs the
+built catalog and the raw snack recipes, which are not checked in, so CI
+cannot run it.
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from api.serialization import dumps
+from api.services.nutrition_service import NutritionService
+
+PROFILES = [
+    {'Height_in': 70, 'Weight_lb': 180, 'Age': 25, 'Gender': 1, 'Activity_Level': 2, 'Goal': 0,
+     'allergies': ['peanut', 'shrimp'], 'preferences': ['liver']},
+    {'Height_in': 64, 'Weight_lb': 140, 'Age': 41, 'Gender': 0, 'Activity_Level': 1, 'Goal': -1,
+     'allergies': [], 'preferences': []},
+    {'Height_in': 74, 'Weight_lb': 230, 'Age': 30, 'Gender': 1, 'Activity_Level': 4, 'Goal': 1,
+     'allergies': ['milk'], 'preferences': ['pork']},
+    {'Height_in': 66, 'Weight_lb': 155, 'Age': 52, 'Gender': 0, 'Activity_Level': 3, 'Goal': 0,
+     'allergies': ['egg', 'wheat'], 'preferences': ['chicken']},
+]
+
+
+def plan(service: NutritionService, profile_index: int, stream: bool) -> bytes:
+    user_data = dict(PROFILES[profile_index])
+    if not stream:
+        # Skip the plan cache so every call runs the planner
+        return dumps(service.compute_complete_meal_plan(user_data))
+
+    # Rebuild the non-streaming result shape from the events (the service caches nothing)
+    result = {"success": True, "week_plan": {}}
+    for event in service.stream_complete_meal_plan(user_data):
+        if event["event"] == "targets":
+            result["nutrition_targets"] = event["nutrition_targets"]
+        elif event["event"] == "day":
+            result["week_plan"][event["day"]] = event["plan"]
+        else:
+            result["ingredient_counts"] = event["ingredient_counts"]
+    return dumps({k: result[k] for k in ("success", "nutrition_targets", "week_plan", "ingredient_counts")})
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=4, help="Concurrent plans per profile and path")
+    parser.add_argument("--solver", default="greedy", choices=["greedy", "combined", "ilp"])
+    args = parser.parse_args()
+
+    service = NutritionService(planner_solver=args.solver, plan_cache_size=0)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        expected = [plan(service, i, stream=False) for i in range(len(PROFILES))]
+        serial_seconds = time.perf_counter() - start
+
+        jobs = [(i, stream) for _ in range(args.rounds)
+                for i in range(len(PROFILES)) for stream in (False, True)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            futures = [pool.submit(plan, service, i, stream) for i, stream in jobs]
+        concurrent_seconds = time.perf_counter() - start
+
+    failures = 0
+    for (i, stream), future in zip(jobs, futures):
+        try:
+            output = future.result()
+        except Exception as e:
+            failures += 1
+            print(f"profile {i} ({'stream' if stream else 'plan'}): error: {e}")
+            continue
+        if output != expected[i]:
+            failures += 1
+            print(f"profile {i} ({'stream' if stream else 'plan'}): output differs from serial run")
+
+    print(f"serial: {len(PROFILES)} plans in {serial_seconds:.2f}s; "
+          f"concurrent: {len(jobs)} plans on {args.threads} threads in {concurrent_seconds:.2f}s")
+    print(f"{len(jobs) - failures}/{len(jobs)} concurrent plans identical to serial output")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
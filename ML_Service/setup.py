@@ -11,6 +11,7 @@ setup(
         "pandas>=1.3.0",
         "numpy>=1.21.0",
         "scikit-learn>=1.0.0",
+        "scipy>=1.7.0",  # Sparse ingredient matrices
         "joblib>=1.0.0",
         "fastapi>=0.68.0",
         "pydantic>=1.8.0",
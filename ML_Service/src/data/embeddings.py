@@ -1,9 +1,15 @@
+import sys
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.decomposition import TruncatedSVD
 from sklearn.preprocessing import Normalizer
 
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.models.embedding_store import write_embedding_store
+
 def buildEmbeddings( inputPath: str = "ML_Service/data/processed/all_meals_clean.parquet", 
                      outputPath: str = "ML_Service/data/processed/all_meals_embeddings.parquet"):
     
@@ -57,6 +63,10 @@ def buildEmbeddings( inputPath: str = "ML_Service/data/processed/all_meals_clean
     out_df.to_parquet(outputPath, index=False)
     print(f"Saved embeddings to {outputPath}")
 
+    # same vectors as one contiguous float32 matrix the service can memory-map
+    store_path = write_embedding_store(outputPath, emb_df.to_numpy(), out_df["recipe_id"], out_df["meal_type"])
+    print(f"Saved embedding store to {store_path}")
+
 if __name__ == "__main__":
     buildEmbeddings()
 
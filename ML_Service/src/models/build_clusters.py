@@ -1,8 +1,17 @@
+import sys
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 
 from sklearn.cluster import MiniBatchKMeans
 
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.models.catalog import standardize_columns
+from src.models.embedding_store import EmbeddingStore, write_embedding_store
+from src.models.ivf_index import RecipeIVFIndex, ivf_path_for
+from src.models.meal_partitions import build_partitions
+
 
 def build_clusters(
     inputPath: str = "ML_Service/data/processed/all_meals_embeddings.parquet",
@@ -11,9 +20,13 @@ def build_clusters(
     
     df = pd.read_parquet(inputPath)
 
-    # grab the embedding columns and load it into a numpy array
-    emb_cols = [col for col in df.columns if col.startswith("emb")]
-    X = df[emb_cols].values.astype(np.float32)
+    # grab the embeddings from the store written by buildEmbeddings, else from the emb columns
+    store = EmbeddingStore.open(inputPath)
+    X = store.embeddings_for(df["recipe_id"]) if store is not None else None
+    if X is None:
+        emb_cols = [col for col in df.columns if col.startswith("emb")]
+        X = df[emb_cols].values.astype(np.float32)
+    X = np.asarray(X)
 
 
     kmeans = MiniBatchKMeans(
@@ -33,5 +46,18 @@ def build_clusters(
 
     df.to_parquet(outputPath, index=False)
 
+    # memory-mapped copy of the embeddings the service reads instead of the emb columns
+    store_path = write_embedding_store(outputPath, X, df["recipe_id"], df["meal_type"])
+    print(f"Saved embedding store to {store_path}")
+
+    # keep the centroids as the IVF coarse quantizer for similarity search
+    # (an all-zero centroid stays zero rather than turning into NaNs)
+    norms = np.linalg.norm(kmeans.cluster_centers_, axis=1, keepdims=True)
+    centroids = kmeans.cluster_centers_ / np.maximum(norms, 1e-12)
+    index = RecipeIVFIndex.build(build_partitions(standardize_columns(df)), centroids=centroids)
+    if index is not None:
+        index.save(ivf_path_for(outputPath))
+        print(f"Saved IVF index to {ivf_path_for(outputPath)}")
+
 if __name__ == "__main__":
     build_clusters()
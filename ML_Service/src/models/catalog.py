@@ -0,0 +1,244 @@
+"""
+Resident meal catalog.
+
+Loads and standardizes `all_meals_with_clusters.parquet` once per process and
+hands out immutable snapshots. When a new Parquet file lands the next
+snapshot is built off to the side and swapped in with a single assignment,
+so requests that already hold a snapshot keep using it.
+
+With a shared catalog directory (CATALOG_SHARED=1) each version is built by
+one worker process and memory-mapped by the rest; see shared_catalog.
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy import sparse
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.models.embedding_store import EmbeddingStore, embedding_store_paths
+from src.models.ingredients import build_ingredient_matrix
+from src.models.ivf_index import RecipeIVFIndex, ivf_path_for, load_or_build_ivf
+from src.models.meal_partitions import MealTypePartition, build_partitions, embedding_columns, memory_report
+from src.models.shared_catalog import AttachedCatalog, SharedCatalog, shared_root_for
+from src.utils.watched_files import Digests, WatchedFiles
+
+DEFAULT_CATALOG_PATH = Path(__file__).parent.parent.parent / "data" / "processed" / "all_meals_with_clusters.parquet"
+
+
+def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalize calorie/id column names so both scorer and GetMeals can read them."""
+    df = df.copy()
+
+    # Calorie column standardization
+    if 'calories' in df.columns and 'per_serving_kcal' not in df.columns:
+        df['per_serving_kcal'] = df['calories']
+    elif 'per_serving_kcal' not in df.columns:
+        raise ValueError("Neither 'calories' nor 'per_serving_kcal' column found")
+
+    # ID column standardization
+    if 'id' in df.columns and 'recipe_id' not in df.columns:
+        df['recipe_id'] = df['id']
+    elif 'recipe_id' not in df.columns:
+        df['recipe_id'] = range(len(df))
+
+    # Ensure both formats exist for GetMeals compatibility
+    if 'per_serving_kcal' in df.columns:
+        df['calories'] = df['per_serving_kcal']
+    if 'recipe_id' in df.columns:
+        df['id'] = df['recipe_id']
+
+    return df
+
+
+class CatalogSnapshot(NamedTuple):
+    """
+    One loaded version of the catalog.
+
+    `df` is shared by every request holding this snapshot and must be
+    treated as read-only; callers filter/copy before adding columns.
+    """
+    df: pd.DataFrame
+    partitions: Dict[str, MealTypePartition]
+    ingredients: Optional[sparse.csr_matrix]
+    ivf: Optional[RecipeIVFIndex]
+    memory: Dict[str, Any]
+    version: str
+    path: str
+    loaded_at: float
+    load_seconds: float
+
+
+class MealCatalog:
+    """
+    Keeps the standardized meal catalog resident in memory.
+
+    Handles:
+    - Loading and standardizing the Parquet catalog once
+    - Building compact per-meal-type partitions for scoring
+    - Mapping the embedding store instead of reading embedding columns, when present
+    - Building the recipe x ingredient matrix for overuse tracking
+    - Loading (or rebuilding) the IVF index over the cluster centroids
+    - Optionally publishing each version to / attaching it from a shared directory
+    - Detecting a replaced file (mtime/size, then content hash)
+    - Atomic snapshot swaps that leave in-flight snapshots untouched
+    - Reporting the active catalog version
+    """
+
+    def __init__(self, data_path: Union[str, Path] = DEFAULT_CATALOG_PATH,
+                 check_interval: float = 5.0, shared_dir: Optional[Union[str, Path]] = None):
+        """
+        Args:
+            data_path: Path to the clustered meal catalog Parquet file
+            check_interval: Minimum seconds between stat() checks of the file
+            shared_dir: Directory to publish / attach memory-mapped catalog
+                versions in, so worker processes share one copy (None: private copy)
+        """
+        self.data_path = Path(data_path)
+        self.check_interval = check_interval
+        self.shared = SharedCatalog(shared_dir) if shared_dir is not None else None
+        # Replacing only the embedding store also swaps in a new snapshot
+        self._files: WatchedFiles[CatalogSnapshot] = WatchedFiles(
+            [self.data_path], self._load, "meal catalog", check_interval,
+            optional_paths=embedding_store_paths(self.data_path))
+
+    def _build_snapshot(self, df: pd.DataFrame, version: str, start: float,
+                        store: Optional[EmbeddingStore] = None) -> CatalogSnapshot:
+        partitions = build_partitions(df, store)
+        # The partitions hold the embeddings now; pools only need the frame's other columns
+        emb_cols = embedding_columns(df.columns)
+        if emb_cols:
+            df = df.drop(columns=emb_cols)
+            # Hand the freed Arrow buffers back to the OS rather than keeping them pooled
+            pa.default_memory_pool().release_unused()
+        # Recipe x ingredient incidence over interned ids, parsed once per snapshot
+        ingredients = build_ingredient_matrix(df["ingredients"]) if "ingredients" in df.columns else None
+        # Coarse quantizer over the k-means centroids saved next to the catalog
+        ivf = load_or_build_ivf(ivf_path_for(self.data_path), partitions)
+        return self._snapshot(df, partitions, ingredients, ivf, version, start, store)
+
+    def _attached_snapshot(self, attached: AttachedCatalog, version: str, start: float) -> CatalogSnapshot:
+        snapshot = self._snapshot(attached.df, attached.partitions, attached.ingredients, attached.ivf,
+                                  version, start, attached.store)
+        snapshot.memory["shared_catalog"] = str(attached.path)
+        snapshot.memory["shared_catalog_bytes"] = attached.nbytes
+        return snapshot
+
+    def _snapshot(self, df: pd.DataFrame, partitions: Dict[str, MealTypePartition],
+                  ingredients: Optional[sparse.csr_matrix], ivf: Optional[RecipeIVFIndex],
+                  version: str, start: float, store: Optional[EmbeddingStore] = None) -> CatalogSnapshot:
+        memory = memory_report(df, partitions)
+        if ingredients is not None:
+            memory["ingredient_matrix_bytes"] = int(
+                ingredients.data.nbytes + ingredients.indices.nbytes + ingredients.indptr.nbytes
+            )
+        if ivf is not None:
+            memory["ivf_bytes"] = ivf.nbytes()
+        if store is not None:
+            memory["embedding_store"] = str(store.path)
+            memory["embedding_store_bytes"] = store.nbytes()
+        return CatalogSnapshot(
+            df=df,
+            partitions=partitions,
+            ingredients=ingredients,
+            ivf=ivf,
+            memory=memory,
+            version=version,
+            path=str(self.data_path),
+            loaded_at=time.time(),
+            load_seconds=time.perf_counter() - start,
+        )
+
+    def _read_catalog(self, digests: Digests) -> Tuple[pd.DataFrame, Optional[EmbeddingStore]]:
+        # With an embedding store the 128 embedding columns are never read from Parquet
+        store = EmbeddingStore.open(self.data_path, digests)
+        if store is not None:
+            names = pq.read_schema(self.data_path).names
+            skip = set(embedding_columns(names))
+            df_all = standardize_columns(pd.read_parquet(self.data_path, columns=[c for c in names if c not in skip]))
+            if (store.rows_for(df_all["recipe_id"].to_numpy()) >= 0).all():
+                return df_all, store
+            print(f"Warning: embedding store {store.path} doesn't cover the catalog; reading embedding columns")
+        return standardize_columns(pd.read_parquet(self.data_path)), None
+
+    def _load(self, digests: Digests, force: bool = False) -> CatalogSnapshot:
+        start = time.perf_counter()
+        version = digests[0]
+        if self.shared is not None:
+            snapshot = self._load_shared(digests, start, force)
+        else:
+            df_all, store = self._read_catalog(digests)
+            print(f"Loaded {len(df_all)} recipes from {self.data_path}"
+                  + (f" (embeddings mapped from {store.path.name})" if store is not None else ""))
+            snapshot = self._build_snapshot(df_all, version, start, store)
+        print(f"Catalog version {snapshot.version} active ({snapshot.load_seconds:.3f}s)")
+        return snapshot
+
+    def _load_shared(self, digests: Digests, start: float, force: bool) -> CatalogSnapshot:
+        version = digests[0]
+        # Arrays derived from the embeddings depend on the store too
+        published = version if digests[1] is None else f"{version}-{digests[1]}"
+        attached = None if force else self.shared.attach(published, self.data_path, digests)
+        if attached is None:
+            with self.shared.lock():
+                # Another worker may have published this version while we waited
+                attached = None if force else self.shared.attach(published, self.data_path, digests)
+                if attached is None:
+                    df_all, store = self._read_catalog(digests)
+                    snapshot = self._build_snapshot(df_all, version, start, store)
+                    try:
+                        path = self.shared.publish(published, snapshot.df, snapshot.partitions,
+                                                   snapshot.ingredients, snapshot.ivf)
+                    except OSError as e:
+                        print(f"Warning: could not publish shared catalog to {self.shared.root}: {e}")
+                        return snapshot
+                    print(f"Published {len(df_all)} recipes to {path}")
+                    # Swap this worker's private copy for the same mapping the others use
+                    attached = self.shared.attach(published, self.data_path, digests)
+                    if attached is None:
+                        return snapshot
+        print(f"Attached {len(attached.df)} recipes from {attached.path}")
+        return self._attached_snapshot(attached, version, start)
+
+    def get(self) -> CatalogSnapshot:
+        """Return the active snapshot, swapping in a new one first if the file changed."""
+        return self._files.get()
+
+    def reload(self) -> CatalogSnapshot:
+        """Force a reload of the catalog file regardless of its mtime."""
+        return self._files.reload()
+
+    def info(self) -> Dict[str, Any]:
+        active = self._files.active
+        if active is None:
+            return {"loaded": False, "path": str(self.data_path)}
+        return {
+            "loaded": True,
+            "path": active.path,
+            "version": active.version,
+            "recipes": len(active.df),
+            "memory": active.memory,
+            "loaded_at": active.loaded_at,
+            "load_seconds": round(active.load_seconds, 4),
+            "reload_count": self._files.reload_count,
+            "shared_version": self.shared.current_version() if self.shared is not None else None,
+        }
+
+
+def _shared_dir_from_env() -> Optional[Path]:
+    if os.environ.get("CATALOG_SHARED_DIR"):
+        return Path(os.environ["CATALOG_SHARED_DIR"])
+    if os.environ.get("CATALOG_SHARED", "0") not in ("", "0", "false"):
+        return shared_root_for(DEFAULT_CATALOG_PATH)
+    return None
+
+
+# Shared instance used by the candidate builder
+meal_catalog = MealCatalog(shared_dir=_shared_dir_from_env())
@@ -2,18 +2,24 @@ import pandas as pd
 import numpy as np
 import sys
 from pathlib import Path
-from typing import Dict, Tuple, Optional, Union
-
-from sklearn.preprocessing import MinMaxScaler
+from typing import Dict, List, Tuple, Optional, Union
 
 # Add config and utils to path
 config_path = Path(__file__).parent.parent.parent / "config"
 utils_path = Path(__file__).parent.parent.parent / "api"
 sys.path.append(str(config_path))
 sys.path.append(str(utils_path))
+sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from config import SPLITS
 from utils import mealTargets
+from src.models.catalog import CatalogSnapshot, MealCatalog, meal_catalog
+from src.models.exclusion import normalize_terms
+from src.models.meal_partitions import MealTypePartition
+from src.models.quantization import PRECISIONS
+from src.models.scoring import (ScoreArrays, approximate_similarities, diversity_quota, preference_scores,
+                                preference_scores_batch, rescore_preference, score_arrays, similarity_range,
+                                targets_fit, top_k_order)
 
 
 class CandidatePoolBuilder:
@@ -26,6 +32,9 @@ class CandidatePoolBuilder:
     - Nutrition fit scoring
     - Diversity/novelty scoring
     - Allergen and preference filtering
+    - Optional IVF-probed recall
+    - Optional quantized (float16 / int8) preference scoring with exact rescoring
+    - Optional macro-index recall that scores only the recipes nearest the calorie target
     - Final candidate pool generation
     """
     
@@ -37,7 +46,12 @@ class CandidatePoolBuilder:
                  alpha_pref: float = 0.55,
                  beta_fit: float = 0.35, 
                  gamma_nov: float = 0.10,
-                 max_cluster_fraction: float = 0.25):
+                 max_cluster_fraction: float = 0.25,
+                 ivf_probes: Optional[int] = None,
+                 embedding_precision: str = "float32",
+                 rescore_size: int = 800,
+                 macro_recall_size: Optional[int] = None,
+                 catalog: Optional[MealCatalog] = None):
         """
         Initialize the candidate pool builder.
         
@@ -50,6 +64,19 @@ class CandidatePoolBuilder:
             beta_fit: Weight for nutrition fit scoring
             gamma_nov: Weight for novelty/diversity scoring
             max_cluster_fraction: Max fraction of pool from single cluster
+            ivf_probes: Score only the recipes in this many nearest clusters of the
+                catalog IVF index (None = exact scan of every recipe; also used when the
+                probed clusters hold fewer than pool_size kept recipes)
+            embedding_precision: "float32" (exact), or "float16" / "int8" to score preference
+                against a quantized copy of the embeddings
+            rescore_size: Rows leading on the approximate final score whose preference
+                is recomputed in float32 (quantized precisions only)
+            macro_recall_size: Score only this many recipes of each meal type: those in
+                the calorie recall window closest to the meal's calorie target, looked up
+                in the partition's macro index (None = score every recipe). Preference keeps
+                the scaling of every kept recipe. Can't be combined with ivf_probes or a
+                quantized embedding_precision.
+            catalog: Resident meal catalog (defaults to the shared process catalog)
         """
         self.splits = config_splits or SPLITS
         self.pool_size = pool_size
@@ -63,6 +90,25 @@ class CandidatePoolBuilder:
         
         # Diversity controls
         self.max_cluster_fraction = max_cluster_fraction
+
+        # Preference recall over the IVF index instead of the full partition
+        self.ivf_probes = ivf_probes
+
+        # Quantized first-pass preference scoring
+        if embedding_precision not in PRECISIONS:
+            raise ValueError(f"Unknown embedding precision: {embedding_precision}")
+        self.embedding_precision = embedding_precision
+        self.rescore_size = rescore_size
+
+        # Recall through the macro index instead of a mask over every row
+        if macro_recall_size and (ivf_probes or embedding_precision != "float32"):
+            # The recall window is scored exactly in float32; the other options would be ignored
+            raise ValueError("macro_recall_size can't be combined with ivf_probes "
+                             "or a quantized embedding_precision")
+        self.macro_recall_size = macro_recall_size
+
+        # Catalog is loaded once and shared across requests
+        self.catalog = catalog or meal_catalog
         
         # Compute meal limits from splits
         self.meal_limits = self._compute_meal_limits()
@@ -105,253 +151,348 @@ class CandidatePoolBuilder:
             "protein_target": protein_target,
         }
     
-    def _compute_nutrition_fit(self, row: pd.Series, kcal_low: float, kcal_high: float, window_low: float,
-                              window_high: float, protein_target: float, protein_tol: float = 0.20) -> float:
-        
-        cal = row['per_serving_kcal']
-        protein = row['protein_g']
-
-        # Calorie scoring
-        if cal < window_low or cal > window_high:
-            kcal_score = 0.0
-        else:
-            if kcal_low <= cal <= kcal_high:
-                kcal_score = 1.0
-            elif cal < kcal_low:
-                denom = max(1e-6, kcal_low - window_low)
-                kcal_score = 1.0 - (kcal_low - cal) / denom
-            else:  # cal > kcal_high
-                denom = max(1e-6, window_high - kcal_high)
-                kcal_score = 1.0 - (cal - kcal_high) / denom
-            kcal_score = max(0.0, min(1.0, float(kcal_score)))
-        
-        # Protein scoring
-        tol = protein_tol * protein_target
-        max_error = 3.0 * tol
-        error = abs(protein - protein_target)
-
-        if error <= tol:
-            protein_score = 1.0
-        elif error >= max_error:
-            protein_score = 0.0
-        else:
-            protein_score = 1.0 - (error - tol) / (max_error - tol)
-        protein_score = max(0.0, min(1.0, float(protein_score)))
-
-        # Combined fit score
-        fit = 0.7 * kcal_score + 0.3 * protein_score
-        return max(0.0, min(1.0, float(fit)))
-    
-    def _build_cold_start_user_vector(self, emb_matrix: np.ndarray) -> np.ndarray:
-        mean_vec = emb_matrix.mean(axis=0)
-        norm = np.linalg.norm(mean_vec)
-        if norm == 0:
-            return mean_vec
-        return mean_vec / norm
-    
-    def _compute_preference_scores(self, emb_matrix: np.ndarray, user_vec: np.ndarray) -> np.ndarray:
-        user_vec = np.asarray(user_vec, dtype=np.float32).reshape(-1)
-        norm = np.linalg.norm(user_vec)
-        if norm > 0:
-            user_vec = user_vec / norm
-
-        sims = emb_matrix @ user_vec
-        sims_reshaped = sims.reshape(-1, 1)
-        scaler = MinMaxScaler(feature_range=(0.0, 1.0))
-        sims_scaled = scaler.fit_transform(sims_reshaped).flatten()
-        return sims_scaled
-    
-    def _compute_cluster_novelty(self, cluster_ids: np.ndarray) -> np.ndarray:
-        unique, counts = np.unique(cluster_ids, return_counts=True)
-        freq = dict(zip(unique, counts))
-        inv_freq = np.array([1.0 / freq[c] for c in cluster_ids], dtype=np.float32)
-        scaler = MinMaxScaler(feature_range=(0.0, 1.0))
-        novelty_scaled = scaler.fit_transform(inv_freq.reshape(-1, 1)).flatten()
-        return novelty_scaled
-    
-    def _apply_diversity_quota(self, df: pd.DataFrame) -> pd.DataFrame:
-        max_per_cluster = int(self.max_cluster_fraction * self.pool_size)
-        if max_per_cluster < 1:
-            max_per_cluster = 1
-
-        counts = {}
-        selected_rows = []
-
-        for _, row in df.iterrows():
-            cid = int(row["cluster_id"])
-            current = counts.get(cid, 0)
-
-            if current >= max_per_cluster:
-                continue
-
-            selected_rows.append(row)
-            counts[cid] = current + 1
-
-            if len(selected_rows) >= self.pool_size:
-                break
-
-        if not selected_rows:
-            return df.head(self.pool_size).reset_index(drop=True)
+    def _user_vector(self, partition: MealTypePartition, keep: np.ndarray) -> np.ndarray:
+        # Precomputed at catalog load; exclusions only subtract the excluded rows
+        return partition.cold_start_vector(None if keep.all() else keep)
+
+    def _approximate_similarities(self, partition: MealTypePartition, kept_rows: Optional[np.ndarray],
+                                  user_vec: np.ndarray) -> Optional[np.ndarray]:
+        """Quantized similarities for the kept rows (all when None); None = exact scan."""
+        if self.embedding_precision == "float32":
+            return None
+        return approximate_similarities(partition.quantized(self.embedding_precision), user_vec, kept_rows)
+
+    def _score_kept_rows(self, partition: MealTypePartition, kept_rows: Optional[np.ndarray],
+                         arrays: Dict[str, np.ndarray], targets: Dict[str, float], user_vec: np.ndarray,
+                         novelty: np.ndarray, pref: Optional[np.ndarray] = None,
+                         sims: Optional[np.ndarray] = None) -> ScoreArrays:
+        fit = targets_fit(arrays["kcal"], arrays["protein"], targets)
+        if sims is not None:
+            # Exact preference for the rows leading on the approximate final score
+            pref = rescore_preference(sims, partition.embeddings, user_vec, kept_rows, self.rescore_size,
+                                      rest=self.beta_fit * fit + self.gamma_nov * novelty,
+                                      weight=self.alpha_pref)
+        return score_arrays(
+            arrays.get("emb"), arrays["kcal"], arrays["protein"], arrays["cluster_ids"], targets,
+            alpha_pref=self.alpha_pref,
+            beta_fit=self.beta_fit,
+            gamma_nov=self.gamma_nov,
+            user_vec=user_vec,
+            pref=pref,
+            novelty=novelty,
+            fit=fit,
+        )
 
-        return pd.DataFrame(selected_rows).reset_index(drop=True)
+    def _probed_positions(self, partition: MealTypePartition, keep: np.ndarray,
+                          user_vec: np.ndarray) -> Optional[np.ndarray]:
+        """Kept partition positions in the IVF-probed clusters, in row order; None = exact scan."""
+        if not self.ivf_probes:
+            return None
+        ivf = self._load_snapshot().ivf
+        # The lists index the snapshot's own partitions
+        if ivf is None or ivf.partitions.get(partition.meal_type) is not partition:
+            return None
+        positions = ivf.candidates(partition.meal_type, ivf.probe(user_vec, self.ivf_probes))
+        if not keep.all():
+            positions = positions[keep[positions]]
+        if len(positions) < self.pool_size:
+            # Too few recipes in the probed clusters to fill a pool
+            return None
+        return np.sort(positions)
+
+    def _recall_positions(self, partition: MealTypePartition, keep: np.ndarray,
+                          targets: Dict[str, float]) -> np.ndarray:
+        """Kept partition positions in the calorie recall window nearest the target, in row order."""
+        index = partition.macro_index
+        keep = None if keep.all() else keep
+        centre = (targets["kcal_low"] + targets["kcal_high"]) / 2.0
+        positions = index.box((targets["window_low"], targets["window_high"]), target={"kcal": centre},
+                              limit=max(self.macro_recall_size, self.recall_size), keep=keep)
+        if len(positions) < self.recall_size:
+            # Too few in the window: the recall_size closest in calories rather than every row
+            positions = index.nearest_kcal(centre, self.recall_size, keep)
+        return np.sort(positions)
+
+    def _score_positions(self, partition: MealTypePartition, keep: np.ndarray, user_vec: np.ndarray,
+                         targets: Dict[str, float], positions: np.ndarray,
+                         pref_range: Optional[Tuple[float, float]] = None) -> Tuple[Dict[str, np.ndarray], ScoreArrays]:
+        # Only these rows are gathered and scored; novelty keeps the scaling of all kept rows,
+        # and so does preference when `pref_range` is given
+        arrays = {
+            "rows": partition.rows[positions],
+            "recipe_ids": partition.recipe_ids[positions],
+            "kcal": partition.kcal[positions],
+            "protein": partition.protein_g[positions],
+            "cluster_ids": partition.cluster_ids[positions],
+        }
+        scores = score_arrays(
+            None, arrays["kcal"], arrays["protein"], arrays["cluster_ids"], targets,
+            alpha_pref=self.alpha_pref,
+            beta_fit=self.beta_fit,
+            gamma_nov=self.gamma_nov,
+            pref=preference_scores(partition.embeddings[positions], user_vec, pref_range),
+            novelty=partition.novelty(None if keep.all() else keep, positions),
+        )
+        return arrays, scores
+
+    def _preference_range(self, partition: MealTypePartition, keep: np.ndarray,
+                          user_vec: np.ndarray) -> Tuple[float, float]:
+        # Scaling over the whole kept partition, so recall narrows the candidates without
+        # rescaling them; with nothing excluded the vector is the partition's cold start
+        if keep.all():
+            return partition.cold_start_range()
+        return similarity_range(partition.embeddings, user_vec, keep)
+
+    def _score_recall_window(self, partition: MealTypePartition, keep: np.ndarray, user_vec: np.ndarray,
+                             targets: Dict[str, float],
+                             pref_range: Optional[Tuple[float, float]] = None) -> Tuple[Dict[str, np.ndarray], ScoreArrays]:
+        if pref_range is None:
+            pref_range = self._preference_range(partition, keep, user_vec)
+        return self._score_positions(partition, keep, user_vec, targets,
+                                     self._recall_positions(partition, keep, targets), pref_range)
+
+    def _max_per_cluster(self) -> int:
+        return max(1, int(self.max_cluster_fraction * self.pool_size))
     
-    def _apply_user_filtering(self, df_meal: pd.DataFrame, user_data: Dict) -> pd.DataFrame:
+    def _apply_user_filtering(self, partition: MealTypePartition, user_data: Dict) -> np.ndarray:
+        """Boolean mask of partition rows that survive the user's allergy/preference exclusions."""
+        keep = np.ones(len(partition), dtype=bool)
         if not user_data:
-            return df_meal
+            return keep
             
         allergies = user_data.get('allergies', [])
         preferences = user_data.get('preferences', [])
         exclude_terms = allergies + preferences
         
         if not exclude_terms:
-            return df_meal
+            return keep
             
-        pattern = '|'.join([str(term).lower() for term in exclude_terms])
-        name_col = 'name' if 'name' in df_meal.columns else 'food_name'
+        # Terms are matched as literal substrings, not regex
+        keep &= ~partition.name_mask(exclude_terms)
         
-        if name_col in df_meal.columns:
-            original_count = len(df_meal)
-            df_meal = df_meal[~df_meal[name_col].str.lower().str.contains(
-                pattern, case=False, na=False, regex=True)]
-            removed_count = original_count - len(df_meal)
-        
-        if df_meal.empty:
+        if not keep.any():
             raise ValueError(f"No recipes available after filtering")
             
-        return df_meal
+        return keep
     
-    def _standardize_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        df = df.copy()
-        
-        # Calorie column standardization
-        if 'calories' in df.columns and 'per_serving_kcal' not in df.columns:
-            df['per_serving_kcal'] = df['calories']
-        elif 'per_serving_kcal' not in df.columns:
-            raise ValueError("Neither 'calories' nor 'per_serving_kcal' column found")
-        
-        # ID column standardization
-        if 'id' in df.columns and 'recipe_id' not in df.columns:
-            df['recipe_id'] = df['id']
-        elif 'recipe_id' not in df.columns:
-            df['recipe_id'] = range(len(df))
-            
-        # Ensure both formats exist for GetMeals compatibility
-        if 'per_serving_kcal' in df.columns:
-            df['calories'] = df['per_serving_kcal']
-        if 'recipe_id' in df.columns:
-            df['id'] = df['recipe_id']
-            
-        return df
+    def _load_snapshot(self) -> CatalogSnapshot:
+        return self.catalog.get()
     
-    def _load_data(self) -> pd.DataFrame:
-        """Load and preprocess the meal data."""
-        data_path = Path(__file__).parent.parent.parent / "data" / "processed" / "all_meals_with_clusters.parquet"
-        
-        if not data_path.exists():
-            raise FileNotFoundError(f"Processed data file not found: {data_path}")
-        
-        df_all = pd.read_parquet(data_path)
-        print(f"Loaded {len(df_all)} recipes from {data_path}")
-        
-        return self._standardize_columns(df_all)
+    def _exclusion_key(self, user_data: Optional[Dict]) -> Tuple[str, ...]:
+        if not user_data:
+            return ()
+        return normalize_terms(user_data.get('allergies', []) + user_data.get('preferences', []))
+    
+    def _resolve_partition(self, df_all: pd.DataFrame, meal_type: str,
+                           partition: Optional[MealTypePartition]) -> MealTypePartition:
+        # Prebuilt partitions come from the catalog snapshot
+        if partition is None:
+            rows = np.flatnonzero(df_all["meal_type"].to_numpy() == meal_type)
+            partition = MealTypePartition(meal_type, df_all.iloc[rows], rows)
+        if len(partition) == 0:
+            raise ValueError(f"No rows found for meal_type={meal_type}")
+        return partition
+    
+    def _subset_partition(self, partition: MealTypePartition, keep: np.ndarray) -> Dict[str, np.ndarray]:
+        # Partition arrays are used as-is unless the user excluded some rows
+        arrays = {
+            "rows": partition.rows,
+            "recipe_ids": partition.recipe_ids,
+            "kcal": partition.kcal,
+            "protein": partition.protein_g,
+            "cluster_ids": partition.cluster_ids,
+        }
+        if self.embedding_precision == "float32":
+            # Quantized scoring never needs the float32 subset
+            arrays["emb"] = partition.embeddings
+        if keep.all():
+            return arrays
+        return {name: arr[keep] for name, arr in arrays.items()}
+    
+    def _select_pool(self, df_all: pd.DataFrame, meal_type: str, arrays: Dict[str, np.ndarray],
+                     scores: ScoreArrays) -> pd.DataFrame:
+        rows = arrays["rows"]
+
+        # Apply recall window
+        recall_idx = np.flatnonzero(scores.in_window)
+        if len(recall_idx) < self.recall_size:
+            recall_idx = np.arange(len(rows))
+
+        # Top-k on the composite key, then the per-cluster cap, all on row indices
+        order = top_k_order(scores, arrays["recipe_ids"], recall_idx, self.recall_size)
+        selected = diversity_quota(order, arrays["cluster_ids"], self.pool_size, self._max_per_cluster())
+        if len(selected) == 0:
+            selected = order[:self.pool_size]
+
+        # Only the final pool rows are materialized; new columns are added in one concat
+        df_pool = df_all.iloc[rows[selected]].reset_index(drop=True)
+        extra = {
+            "preference_score": scores.preference_score[selected],
+            "nutrition_fit": scores.nutrition_fit[selected],
+            "novelty_bonus": scores.novelty_bonus[selected],
+            "model_score": scores.model_score[selected],
+            "final_model_score": scores.final_model_score[selected],
+            # Required fields for GetMeals
+            "meal_slot": meal_type,
+        }
+        for col in ("primary_protein", "cuisine"):
+            if col not in df_pool.columns:
+                extra[col] = "unknown"
+        ingredient_ids = self._pool_ingredient_ids(df_all, rows[selected])
+        if ingredient_ids is not None:
+            # Interned ingredient ids let the weekly planner skip re-parsing ingredient strings
+            extra["ingredient_ids"] = ingredient_ids
+        df_pool = pd.concat([df_pool, pd.DataFrame(extra, index=df_pool.index)], axis=1)
+
+        return df_pool.reset_index(drop=True)
+    
+    def _pool_ingredient_ids(self, df_all: pd.DataFrame, rows: np.ndarray) -> Optional[List[np.ndarray]]:
+        # Only valid when df_all is the snapshot the matrix was built from
+        snapshot = self._load_snapshot()
+        if snapshot.df is not df_all or snapshot.ingredients is None:
+            return None
+        sub = snapshot.ingredients[rows]
+        return np.split(sub.indices, sub.indptr[1:-1])
     
     def score_meal_candidates(self, df_all: pd.DataFrame, meal_type: str, per_meal_targets: Dict[str, Dict[str, float]], 
-                             user_data: Optional[Dict] = None) -> pd.DataFrame:
+                             user_data: Optional[Dict] = None,
+                             partition: Optional[MealTypePartition] = None) -> pd.DataFrame:
         
         # Filter to meal type
-        df_meal = df_all[df_all["meal_type"] == meal_type].copy()
-        if df_meal.empty:
-            raise ValueError(f"No rows found for meal_type={meal_type}")
+        partition = self._resolve_partition(df_all, meal_type, partition)
         
         # Apply user filtering
-        df_meal = self._apply_user_filtering(df_meal, user_data or {})
-        
-        # Extract embeddings
-        emb_cols = [c for c in df_meal.columns if c.startswith("emb_")]
-        X_emb = df_meal[emb_cols].values.astype(np.float32)
-
-        # Build user vector and preference scores
-        user_vec = self._build_cold_start_user_vector(X_emb)
-        pref_scores = self._compute_preference_scores(X_emb, user_vec)
-        df_meal["preference_score"] = pref_scores
+        keep = self._apply_user_filtering(partition, user_data or {})
 
         # Get scoring targets
         targets = self._get_meal_scoring_targets(meal_type, per_meal_targets)
 
-        # Compute nutrition fit
-        df_meal["nutrition_fit"] = df_meal.apply(
-            lambda row: self._compute_nutrition_fit(
-                row,
-                kcal_low=targets["kcal_low"],
-                kcal_high=targets["kcal_high"], 
-                window_low=targets["window_low"],
-                window_high=targets["window_high"],
-                protein_target=targets["protein_target"],
-            ),
-            axis=1,
+        user_vec = self._user_vector(partition, keep)
+        if self.macro_recall_size:
+            arrays, scores = self._score_recall_window(partition, keep, user_vec, targets)
+            return self._select_pool(df_all, meal_type, arrays, scores)
+        positions = self._probed_positions(partition, keep, user_vec)
+        if positions is not None:
+            arrays, scores = self._score_positions(partition, keep, user_vec, targets, positions)
+            return self._select_pool(df_all, meal_type, arrays, scores)
+        arrays = self._subset_partition(partition, keep)
+        kept_rows = None if keep.all() else np.flatnonzero(keep)
+
+        # Preference, nutrition fit, novelty and final score in one vectorized pass
+        scores = self._score_kept_rows(
+            partition, kept_rows, arrays, targets, user_vec,
+            novelty=partition.novelty(None if keep.all() else keep),
+            sims=self._approximate_similarities(partition, kept_rows, user_vec),
         )
 
-        # Novelty scores
-        cluster_ids = df_meal["cluster_id"].values.astype(np.int32)
-        novelty_scores = self._compute_cluster_novelty(cluster_ids)
-        df_meal["novelty_bonus"] = novelty_scores
+        return self._select_pool(df_all, meal_type, arrays, scores)
+    
+    def score_meal_candidates_batch(self, df_all: pd.DataFrame, meal_type: str,
+                                    per_meal_targets_list: List[Dict[str, Dict[str, float]]],
+                                    user_data_list: List[Optional[Dict]],
+                                    partition: Optional[MealTypePartition] = None) -> List[pd.DataFrame]:
+        """
+        Score one meal type for many users at once.
+
+        Users with the same exclusion terms share the row subset, cold-start
+        vector and novelty scores; preference scores for all distinct subsets
+        come from a single matrix-matrix product. Users left with no recipes
+        get an empty DataFrame, like build_pools does for a single user.
+        """
+        partition = self._resolve_partition(df_all, meal_type, partition)
 
-        # Final scoring
-        df_meal["model_score"] = (
-            self.alpha_pref * df_meal["preference_score"]
-            + self.beta_fit * df_meal["nutrition_fit"] 
-            + self.gamma_nov * df_meal["novelty_bonus"]
+        # One row subset per distinct exclusion term set
+        groups: Dict[str, Dict] = {}
+        for user_data in user_data_list:
+            exclusion_key = self._exclusion_key(user_data)
+            if exclusion_key in groups:
+                continue
+            try:
+                keep = self._apply_user_filtering(partition, user_data or {})
+            except ValueError as e:
+                groups[exclusion_key] = {"error": e}
+                continue
+            if self.macro_recall_size:
+                # Windows depend on each user's targets; only the exclusions are shared
+                user_vec = self._user_vector(partition, keep)
+                groups[exclusion_key] = {"mask": keep, "user_vec": user_vec,
+                                         "pref_range": self._preference_range(partition, keep, user_vec)}
+                continue
+            user_vec = self._user_vector(partition, keep)
+            positions = self._probed_positions(partition, keep, user_vec)
+            if positions is not None:
+                # Probed clusters depend only on the exclusions; scoring is per user
+                groups[exclusion_key] = {"mask": keep, "user_vec": user_vec, "positions": positions}
+                continue
+            arrays = self._subset_partition(partition, keep)
+            kept_rows = None if keep.all() else np.flatnonzero(keep)
+            groups[exclusion_key] = {
+                "keep": None if keep.all() else keep,
+                "kept_rows": kept_rows,
+                "arrays": arrays,
+                "user_vec": user_vec,
+                # Approximate similarities are shared; the rescored rows depend on each user's targets
+                "sims": self._approximate_similarities(partition, kept_rows, user_vec),
+                "pref": None,
+                "novelty": partition.novelty(None if keep.all() else keep),
+            }
+
+        scored = [g for g in groups.values() if "sims" in g and g["sims"] is None]
+        prefs = preference_scores_batch(
+            partition.embeddings, [g["user_vec"] for g in scored], [g["keep"] for g in scored]
         )
-        df_meal["final_model_score"] = df_meal["model_score"].clip(lower=0.0, upper=1.0)
+        for group, pref in zip(scored, prefs):
+            group["pref"] = pref
+
+        pools = []
+        for per_meal_targets, user_data in zip(per_meal_targets_list, user_data_list):
+            group = groups[self._exclusion_key(user_data)]
+            if "error" in group:
+                print(f"Warning: {group['error']}")
+                pools.append(pd.DataFrame())
+                continue
 
-        # Apply recall window
-        window_low = targets["window_low"]
-        window_high = targets["window_high"]
-        
-        df_recall = df_meal[
-            (df_meal["per_serving_kcal"] >= window_low) &
-            (df_meal["per_serving_kcal"] <= window_high)
-        ].copy()
-
-        if len(df_recall) < self.recall_size:
-            df_recall = df_meal.copy()
-
-        # Sort and trim
-        df_recall = df_recall.sort_values(
-            by=["final_model_score", "nutrition_fit", "novelty_bonus", "preference_score", "recipe_id"],
-            ascending=[False, False, False, False, True],
-        ).head(self.recall_size).reset_index(drop=True)
-
-        # Apply diversity
-        df_pool = self._apply_diversity_quota(df_recall)
-
-        # Add required fields for GetMeals
-        df_pool["meal_slot"] = meal_type
-        if "primary_protein" not in df_pool.columns:
-            df_pool["primary_protein"] = "unknown"
-        if "cuisine" not in df_pool.columns:
-            df_pool["cuisine"] = "unknown"
+            targets = self._get_meal_scoring_targets(meal_type, per_meal_targets)
+            if self.macro_recall_size:
+                arrays, scores = self._score_recall_window(partition, group["mask"], group["user_vec"], targets,
+                                                           group["pref_range"])
+                pools.append(self._select_pool(df_all, meal_type, arrays, scores))
+                continue
+            if "positions" in group:
+                arrays, scores = self._score_positions(partition, group["mask"], group["user_vec"], targets,
+                                                       group["positions"])
+                pools.append(self._select_pool(df_all, meal_type, arrays, scores))
+                continue
 
-        return df_pool.reset_index(drop=True)
+            scores = self._score_kept_rows(
+                partition, group["kept_rows"], group["arrays"], targets, group["user_vec"],
+                novelty=group["novelty"], pref=group["pref"], sims=group["sims"],
+            )
+            pools.append(self._select_pool(df_all, meal_type, group["arrays"], scores))
+
+        return pools
     
-    def build_pools(self, 
-                   daily_targets: Union[Dict[str, float], Tuple[float, float, float, float]], 
-                   user_data: Optional[Dict] = None) -> Dict[str, pd.DataFrame]:
-        
+    def _as_targets_dict(self, daily_targets: Union[Dict[str, float], Tuple[float, float, float, float]]) -> Dict[str, float]:
         # Convert tuple to dict if needed
         if isinstance(daily_targets, tuple):
             calories, protein_g, fat_g, carb_g = daily_targets
-            daily_targets_dict = {
+            return {
                 'calories': calories,
                 'protein_g': protein_g, 
                 'fat_g': fat_g,
                 'carb_g': carb_g
             }
-        else:
-            daily_targets_dict = daily_targets
+        return daily_targets
+    
+    def build_pools(self, 
+                   daily_targets: Union[Dict[str, float], Tuple[float, float, float, float]], 
+                   user_data: Optional[Dict] = None) -> Dict[str, pd.DataFrame]:
         
-        # Load data
-        df_all = self._load_data()
+        daily_targets_dict = self._as_targets_dict(daily_targets)
+        
+        # Load data (one snapshot for the whole request)
+        snapshot = self._load_snapshot()
+        df_all = snapshot.df
         
         # Calculate per-meal targets
         per_meal = mealTargets(daily_targets_dict, self.splits)
@@ -366,6 +507,7 @@ class CandidatePoolBuilder:
                     meal_type=meal_type, 
                     per_meal_targets=per_meal,
                     user_data=user_data,
+                    partition=snapshot.partitions.get(meal_type),
                 )
                 
                 outputs[meal_type] = df_candidates
@@ -376,4 +518,33 @@ class CandidatePoolBuilder:
                 # Create empty DataFrame for this meal type
                 outputs[meal_type] = pd.DataFrame()
 
+        return outputs
+    
+    def build_pools_batch(self,
+                          daily_targets_list: List[Union[Dict[str, float], Tuple[float, float, float, float]]],
+                          user_data_list: List[Optional[Dict]]) -> List[Dict[str, pd.DataFrame]]:
+        """Build candidate pools for many users against one catalog snapshot."""
+        snapshot = self._load_snapshot()
+        df_all = snapshot.df
+
+        per_meal_list = [mealTargets(self._as_targets_dict(t), self.splits) for t in daily_targets_list]
+        outputs = [{} for _ in user_data_list]
+
+        for meal_type in self.splits.keys():
+            try:
+                pools = self.score_meal_candidates_batch(
+                    df_all=df_all,
+                    meal_type=meal_type,
+                    per_meal_targets_list=per_meal_list,
+                    user_data_list=user_data_list,
+                    partition=snapshot.partitions.get(meal_type),
+                )
+            except ValueError as e:
+                print(f"Warning: {e}")
+                pools = [pd.DataFrame() for _ in user_data_list]
+
+            for output, pool in zip(outputs, pools):
+                output[meal_type] = pool
+            print(f"Built {meal_type} candidates for {len(user_data_list)} users")
+
         return outputs
\ No newline at end of file
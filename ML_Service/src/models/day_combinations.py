@@ -0,0 +1,145 @@
+"""
+Vectorized daily meal combination search.
+
+The greedy day picks breakfast, lunch and dinner one at a time and then
+patches the remaining calories with a snack, so daily totals often miss the
+targets. With candidate pools of ~40 recipes every breakfast x lunch x
+dinner x (snack or none) total can be scored with NumPy broadcasting in a
+few milliseconds, and the closest combination that doesn't repeat a recipe
+is taken instead.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+SLOTS = ('breakfast', 'lunch', 'dinner', 'snack')
+REQUIRED_SLOTS = ('breakfast', 'lunch', 'dinner')
+
+# Daily target key -> (recipe column, weight of its relative error)
+MACRO_WEIGHTS = {
+    'calories': ('calories', 2.0),
+    'protein_g': ('protein_g', 1.0),
+    'carb_g': ('carbs_g', 0.25),
+    'fat_g': ('fat_g', 0.25),
+}
+
+
+class DailyCombinationSearch:
+    """
+    Picks a whole day's meals at once.
+
+    Handles:
+    - Scoring every breakfast x lunch x dinner x snack combination against the daily targets
+    - Leaving out recipes that are used up or excluded
+    - Rejecting combinations that repeat a recipe within the day
+    """
+
+    def __init__(self, weights: Dict[str, tuple] = MACRO_WEIGHTS, shortlist: int = 64):
+        """
+        Args:
+            weights: Daily target key -> (recipe column, weight of its relative error)
+            shortlist: Lowest-error combinations checked for repeats before widening the search
+        """
+        self.weights = weights
+        self.shortlist = shortlist
+
+    def best(self, pools: Dict[str, pd.DataFrame], nutrition_targets: Dict[str, float],
+             allowed: Optional[Dict[str, np.ndarray]] = None) -> Optional[Dict[str, int]]:
+        """
+        Lowest-error combination for one day.
+
+        Args:
+            pools: Candidate pools keyed 'breakfast', 'lunch', 'dinner', 'snack'
+            nutrition_targets: Daily calories / protein_g / carb_g / fat_g
+            allowed: Optional per-pool boolean masks of selectable rows
+
+        Returns:
+            {slot: row position in its pool} ('snack' left out when the best day has none),
+            or None if a main meal has no selectable rows
+        """
+        allowed = allowed or {}
+        rows = {}
+        for slot in SLOTS:
+            df = pools.get(slot)
+            if df is None or df.empty or 'calories' not in df.columns:
+                rows[slot] = np.zeros(0, dtype=np.int64)
+                continue
+            # Rows without calories can't be placed against a target
+            ok = df['calories'].notna().to_numpy()
+            if allowed.get(slot) is not None:
+                ok = ok & allowed[slot]
+            rows[slot] = np.flatnonzero(ok)
+        if any(len(rows[slot]) == 0 for slot in REQUIRED_SLOTS):
+            return None
+
+        # Snack index 0 means no snack; snack row i is index i + 1. The snack axis
+        # goes first so the inner loops run over the n^3 main-meal triples.
+        main_shape = tuple(len(rows[slot]) for slot in REQUIRED_SLOTS)
+        shape = (len(rows['snack']) + 1, int(np.prod(main_shape)))
+        cost = np.zeros(shape, dtype=np.float32)
+        total = np.empty(shape, dtype=np.float32)
+        for target_key, (column, weight) in self.weights.items():
+            target = float(nutrition_targets.get(target_key) or 0)
+            if target <= 0:
+                continue
+            # Values pre-scaled by weight / target so each term is just |sum - weight|
+            scale = np.float32(weight / target)
+            b, l, d, s = (self._values(pools.get(slot), column, rows[slot]) * scale for slot in SLOTS)
+            main = b[:, None, None] + l[None, :, None] + d[None, None, :] - np.float32(weight)
+            s = np.concatenate([[0.0], s]).astype(np.float32)
+            np.add(s[:, None], main.ravel()[None, :], out=total)
+            np.abs(total, out=total)
+            cost += total
+
+        # Best snack (or none) per breakfast x lunch x dinner, then rank the n^3 days
+        snack = cost.argmin(axis=0)
+        day_cost = cost[snack, np.arange(shape[1])]
+        choice = self._first_without_repeats(pools, rows, main_shape, day_cost, snack)
+        if choice is None:
+            # Every best-snack day repeats a recipe; rank all combinations instead
+            choice = self._first_without_repeats(pools, rows, main_shape, cost)
+        return choice
+
+    def _values(self, df: Optional[pd.DataFrame], column: str, rows: np.ndarray) -> np.ndarray:
+        if df is None or column not in df.columns:
+            return np.zeros(len(rows), dtype=np.float32)
+        return df[column].to_numpy(dtype=np.float32, na_value=0.0)[rows]
+
+    def _first_without_repeats(self, pools: Dict[str, pd.DataFrame], rows: Dict[str, np.ndarray],
+                               main_shape: tuple, cost: np.ndarray,
+                               snack: Optional[np.ndarray] = None) -> Optional[Dict[str, int]]:
+        # `cost` is either (snack, triple) for every combination, or per triple with its best snack in `snack`
+        ids = {slot: pools[slot]['id'].to_numpy() for slot in SLOTS
+               if len(rows[slot]) and 'id' in pools[slot].columns}
+        flat = cost.ravel()
+        checked = 0
+        k = min(self.shortlist, flat.size)
+        while checked < flat.size:
+            # Lowest cost first; equal costs in index order
+            candidates = np.argpartition(flat, k - 1)[:k] if k < flat.size else np.arange(flat.size)
+            for f in candidates[np.lexsort((candidates, flat[candidates]))]:
+                snack_index, triple = divmod(int(f), cost.shape[-1]) if snack is None else (int(snack[f]), int(f))
+                choice = {slot: int(rows[slot][i])
+                          for slot, i in zip(REQUIRED_SLOTS, np.unravel_index(triple, main_shape))}
+                if snack_index > 0:
+                    choice['snack'] = int(rows['snack'][snack_index - 1])
+                if self._distinct(ids, choice):
+                    return choice
+            checked = k
+            k = min(k * 8, flat.size)
+        return None
+
+    def _distinct(self, ids: Dict[str, np.ndarray], choice: Dict[str, int]) -> bool:
+        seen = set()
+        for slot, position in choice.items():
+            if slot not in ids:
+                continue
+            recipe_id = ids[slot][position]
+            if pd.isna(recipe_id):
+                continue
+            if recipe_id in seen:
+                return False
+            seen.add(recipe_id)
+        return True
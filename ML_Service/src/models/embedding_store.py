@@ -0,0 +1,213 @@
+"""
+Memory-mapped recipe embedding store.
+
+buildEmbeddings writes the embeddings as 128 separate Parquet columns, which
+every reader has to reassemble into a float32 matrix. The store keeps the
+same vectors as one contiguous float32 `.npy` file plus a `.npy` of recipe
+ids giving the recipe id -> row mapping. The service maps the matrix
+read-only, so loading it costs no copy and the OS page cache is shared by
+every worker process on the machine.
+
+Rows are grouped by meal type (catalog order within each group) so that each
+meal-type partition is a contiguous slice of the mapped matrix.
+
+Files are written to a temporary name and renamed into place, so a process
+that still maps the previous store keeps reading the old file. A small JSON
+manifest, written last, records the digest of the catalog file the store was
+built for and of both store files; a store whose files don't match it (a
+different catalog, or a write still in progress) is not opened. The manifest
+also holds the float64 embedding sum of each meal-type row range, so
+partitions get their cold-start inputs without reading every mapped page.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.utils.watched_files import file_digest
+
+
+def embedding_store_paths(catalog_path: Union[str, Path]) -> Tuple[Path, Path, Path]:
+    """(matrix, recipe ids, manifest) store files for a catalog Parquet file."""
+    catalog_path = Path(catalog_path)
+    return (catalog_path.with_name(f"{catalog_path.stem}_embeddings.npy"),
+            catalog_path.with_name(f"{catalog_path.stem}_embedding_ids.npy"),
+            catalog_path.with_name(f"{catalog_path.stem}_embeddings.json"))
+
+
+def _row_range(rows: np.ndarray) -> Optional[Tuple[int, int]]:
+    """(start, stop) if `rows` is exactly that contiguous, ascending range."""
+    if len(rows) == 0:
+        return None
+    start = int(rows[0])
+    if rows[-1] == start + len(rows) - 1 and np.array_equal(rows, np.arange(start, start + len(rows))):
+        return start, start + len(rows)
+    return None
+
+
+def _save_atomic(path: Path, array: np.ndarray) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array, allow_pickle=False)
+    os.replace(tmp, path)
+
+
+def write_embedding_store(catalog_path: Union[str, Path], embeddings: np.ndarray,
+                          recipe_ids, meal_types=None) -> Path:
+    """
+    Write the store for a catalog; call it after the catalog file is written.
+
+    Args:
+        catalog_path: Catalog Parquet file the store sits next to (and is tied to)
+        embeddings: (n, d) embeddings, row-aligned with recipe_ids
+        recipe_ids: Recipe id of each row
+        meal_types: Optional meal type of each row; rows are grouped by it
+
+    Returns:
+        Path of the embedding matrix file
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    recipe_ids = np.asarray(recipe_ids).astype(str)
+    sums = []
+    if meal_types is not None:
+        codes, uniques = pd.factorize(pd.Series(meal_types), sort=False)
+        order = np.argsort(codes, kind="stable")
+        embeddings, recipe_ids = embeddings[order], recipe_ids[order]
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        for meal_type, start, stop in zip(uniques, bounds[:-1], bounds[1:]):
+            sums.append({
+                "meal_type": str(meal_type),
+                "start": int(start),
+                "stop": int(stop),
+                "sum": embeddings[start:stop].sum(axis=0, dtype=np.float64).tolist(),
+            })
+
+    matrix_path, ids_path, manifest_path = embedding_store_paths(catalog_path)
+    _save_atomic(ids_path, recipe_ids)
+    _save_atomic(matrix_path, np.ascontiguousarray(embeddings))
+    manifest = {
+        "catalog": file_digest(catalog_path),
+        "embeddings": file_digest(matrix_path),
+        "recipe_ids": file_digest(ids_path),
+        "sums": sums,
+    }
+    tmp = manifest_path.with_name(manifest_path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, manifest_path)
+    return matrix_path
+
+
+class EmbeddingStore:
+    """
+    Read-only, memory-mapped embedding matrix.
+
+    Handles:
+    - Mapping the float32 matrix without reading it into process memory
+    - Refusing a store built for different catalog content
+    - Recipe id -> row lookups
+    - Returning zero-copy slices for contiguous row ranges
+    - Embedding sums of the meal-type row ranges, precomputed when written
+    """
+
+    def __init__(self, matrix: np.ndarray, recipe_ids: np.ndarray, path: Optional[Path] = None,
+                 sums: Optional[Dict[Tuple[int, int], np.ndarray]] = None):
+        self.matrix = matrix
+        self.recipe_ids = recipe_ids
+        self.path = path
+        self.sums = sums or {}
+        self._index = pd.Index(recipe_ids)
+
+    @classmethod
+    def open(cls, catalog_path: Union[str, Path],
+             digests: Optional[Sequence[Optional[str]]] = None) -> Optional["EmbeddingStore"]:
+        """
+        Map the store next to `catalog_path`.
+
+        Args:
+            catalog_path: Catalog Parquet file the store was built for
+            digests: file_digest of the catalog, matrix and recipe id files, if
+                the caller already has them (hashed here otherwise)
+
+        Returns:
+            The store, or None if it isn't there, is malformed, or its manifest
+            doesn't match the catalog and store files on disk
+        """
+        matrix_path, ids_path, manifest_path = embedding_store_paths(catalog_path)
+        if not matrix_path.exists() or not ids_path.exists():
+            return None
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if digests is None:
+                digests = (file_digest(catalog_path), file_digest(matrix_path), file_digest(ids_path))
+            expected = (manifest.get("catalog"), manifest.get("embeddings"), manifest.get("recipe_ids"))
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Warning: ignoring embedding store {matrix_path} without a valid manifest: {e}")
+            return None
+        if tuple(digests[:3]) != expected:
+            print(f"Warning: ignoring embedding store {matrix_path}: built for different catalog content")
+            return None
+        try:
+            matrix = np.load(matrix_path, mmap_mode="r", allow_pickle=False)
+            recipe_ids = np.load(ids_path, allow_pickle=False)
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not open embedding store {matrix_path}: {e}")
+            return None
+        if matrix.ndim != 2 or matrix.dtype != np.float32 or len(matrix) != len(recipe_ids):
+            print(f"Warning: ignoring malformed embedding store {matrix_path}")
+            return None
+        sums = {}
+        try:
+            for entry in manifest.get("sums", []):
+                emb_sum = np.asarray(entry["sum"], dtype=np.float64)
+                if emb_sum.shape == (matrix.shape[1],):
+                    emb_sum.setflags(write=False)
+                    sums[(int(entry["start"]), int(entry["stop"]))] = emb_sum
+        except (KeyError, TypeError, ValueError):
+            # Sums are only a shortcut; partitions fall back to summing the rows
+            sums = {}
+        return cls(matrix, recipe_ids, matrix_path, sums)
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    def rows_for(self, recipe_ids) -> np.ndarray:
+        """Store rows of `recipe_ids` (-1 where an id isn't in the store)."""
+        return self._index.get_indexer(np.asarray(recipe_ids).astype(str))
+
+    def row_of(self, recipe_id) -> Optional[int]:
+        row = int(self.rows_for([recipe_id])[0])
+        return None if row < 0 else row
+
+    def embeddings_for(self, recipe_ids) -> Optional[np.ndarray]:
+        """
+        Embeddings of `recipe_ids` in the given order; None if any id is missing.
+
+        A contiguous, ascending row range comes back as a view of the mapped
+        file, anything else as a copy.
+        """
+        rows = self.rows_for(recipe_ids)
+        if len(rows) and (rows < 0).any():
+            return None
+        if len(rows) == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        span = _row_range(rows)
+        if span is not None:
+            return self.matrix[span[0]:span[1]]
+        return np.ascontiguousarray(self.matrix[rows])
+
+    def embedding_sum_for(self, recipe_ids) -> Optional[np.ndarray]:
+        """Precomputed float64 embedding sum of `recipe_ids`, if they are exactly one meal type's rows."""
+        span = _row_range(self.rows_for(recipe_ids))
+        return None if span is None else self.sums.get(span)
+
+    def nbytes(self) -> int:
+        return int(self.matrix.nbytes)
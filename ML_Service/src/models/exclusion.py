@@ -0,0 +1,107 @@
+"""
+Allergy / preference / ingredient exclusion index.
+
+Exclusion terms are matched as case-insensitive literal substrings (user
+input is never treated as a regex). Texts are interned once, each term is
+scanned once against the distinct texts and kept as a bitmap, and a term
+set's exclusion mask is the OR of its term bitmaps, cached per normalized
+term set.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def normalize_terms(terms: Optional[Iterable]) -> Tuple[str, ...]:
+    """Lower-cased, de-duplicated, sorted exclusion terms; blank terms are dropped."""
+    if not terms:
+        return ()
+    return tuple(sorted({str(t).lower() for t in terms if str(t).strip()}))
+
+
+class _LRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class ExclusionIndex:
+    """
+    Term -> row bitmap index over one text column.
+
+    Handles:
+    - Interning texts so each distinct string is scanned once per term
+    - Caching per-term bitmaps (packed bits over distinct texts)
+    - Caching the combined mask per normalized term set
+    """
+
+    def __init__(self, codes: np.ndarray, uniques: np.ndarray,
+                 term_cache_size: int = 4096, set_cache_size: int = 256):
+        """
+        Args:
+            codes: Per-row index into `uniques` (-1 for missing text)
+            uniques: Distinct lower-cased texts
+        """
+        self.codes = np.asarray(codes)
+        self.uniques = pd.Series(uniques, dtype=object)
+        self._terms = _LRU(term_cache_size)
+        self._sets = _LRU(set_cache_size)
+
+    @classmethod
+    def from_texts(cls, texts: Iterable, **kwargs) -> "ExclusionIndex":
+        lowered = pd.Series(texts, dtype=object).str.lower()
+        codes, uniques = pd.factorize(lowered)
+        return cls(codes, np.asarray(uniques, dtype=object), **kwargs)
+
+    @classmethod
+    def from_categorical(cls, values: pd.Categorical, **kwargs) -> "ExclusionIndex":
+        uniques = pd.Series(values.categories, dtype=object).str.lower().to_numpy()
+        return cls(values.codes, uniques, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _term_hits(self, term: str) -> np.ndarray:
+        packed = self._terms.get(term)
+        if packed is None:
+            hits = self.uniques.str.contains(term, regex=False, na=False).to_numpy(dtype=bool)
+            packed = np.packbits(hits)
+            self._terms.put(term, packed)
+        return np.unpackbits(packed, count=len(self.uniques)).view(bool)
+
+    def mask(self, terms: Optional[Iterable]) -> np.ndarray:
+        """Read-only boolean mask of rows whose text contains any of `terms`."""
+        key = normalize_terms(terms)
+        cached = self._sets.get(key)
+        if cached is not None:
+            return cached
+
+        hits = np.zeros(len(self.uniques), dtype=bool)
+        for term in key:
+            hits |= self._term_hits(term)
+        if len(self.uniques):
+            rows = np.where(self.codes >= 0, hits[self.codes], False)
+        else:
+            rows = np.zeros(len(self.codes), dtype=bool)
+        rows.setflags(write=False)
+        self._sets.put(key, rows)
+        return rows
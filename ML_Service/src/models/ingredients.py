@@ -0,0 +1,257 @@
+"""
+Interned ingredient ids and recipe x ingredient incidence matrices.
+
+Ingredient lists are stored as stringified Python lists
+("['salt', 'butter']"). They are parsed once, each distinct ingredient name
+gets a process-wide integer id, and recipes become rows of a sparse CSR
+matrix over those ids. Weekly overuse tracking then works on integer count
+vectors and sparse mat-vecs instead of re-parsing strings and regexes.
+"""
+
+import threading
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+@lru_cache(maxsize=65536)
+def _parse_text(text: str) -> Tuple[str, ...]:
+    # Remove brackets and quotes, then split
+    cleaned = text.strip("[]").replace("'", "").replace('"', '')
+    return tuple(ing.strip() for ing in cleaned.split(',') if ing.strip())
+
+
+def parse_ingredients(value) -> Tuple[str, ...]:
+    """Ingredient names from a stringified list or a list; anything else (NaN, None) has none."""
+    if isinstance(value, str):
+        return _parse_text(value)
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(value)
+    return ()
+
+
+class IngredientVocabulary:
+    """
+    Append-only interner mapping ingredient names to stable integer ids.
+
+    Ids never change once assigned, so matrices built from different catalog
+    snapshots (and names seen only in plans) share one id space. Term lookups
+    search all names joined into one string, are cached per term, and later
+    only scan names interned since.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._lowered: List[str] = []
+        self._lock = threading.Lock()
+        # All names as one string, so a term lookup is a few str.find calls
+        self._text: Tuple[int, str, List[int]] = (0, "", [0])
+        # term -> (names scanned so far, ids whose name contains the term)
+        self._term_ids: Dict[str, Tuple[int, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def intern(self, name: str) -> int:
+        ingredient_id = self._ids.get(name)
+        if ingredient_id is None:
+            with self._lock:
+                ingredient_id = self._ids.get(name)
+                if ingredient_id is None:
+                    ingredient_id = len(self._names)
+                    self._lowered.append(name.lower())
+                    self._names.append(name)
+                    self._ids[name] = ingredient_id
+        return ingredient_id
+
+    def intern_all(self, names: Iterable[str]) -> List[int]:
+        return [self.intern(name) for name in names]
+
+    def name(self, ingredient_id: int) -> str:
+        return self._names[ingredient_id]
+
+    def _joined(self) -> Tuple[int, str, List[int]]:
+        """(n, lower-cased names joined by NUL, start offset of each), rebuilt after names are added."""
+        joined = self._text
+        n = len(self._lowered)
+        if joined[0] != n:
+            names = self._lowered[:n]
+            starts = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum([len(name) + 1 for name in names], out=starts[1:])
+            joined = (n, "\0".join(names), starts.tolist())
+            self._text = joined
+        return joined
+
+    def _find(self, term: str) -> Tuple[int, np.ndarray]:
+        """(names searched, ids of those containing `term`)."""
+        n, text, starts = self._joined()
+        ids = []
+        # Names never contain NUL, so a match can't span two names
+        pos = text.find(term) if n and "\0" not in term else -1
+        while pos >= 0:
+            ingredient_id = bisect_right(starts, pos) - 1
+            ids.append(ingredient_id)
+            if ingredient_id + 1 >= n:
+                break
+            # str.find skips to the next match in C; resume at the next name
+            pos = text.find(term, starts[ingredient_id + 1])
+        return n, np.array(ids, dtype=np.int64)
+
+    def containing(self, term: str) -> np.ndarray:
+        """Ids of every name containing `term` (case-insensitive, literal)."""
+        term = term.lower()
+        cached = self._term_ids.get(term)
+        n = len(self._lowered)
+        if cached is not None and cached[0] == n:
+            return cached[1]
+        if cached is None:
+            n, ids = self._find(term)
+        else:
+            # Only names interned since this term was last looked up
+            scanned, ids = cached
+            tail = [i for i in range(scanned, n) if term in self._lowered[i]]
+            ids = np.concatenate([ids, np.array(tail, dtype=np.int64)])
+        # Single assignment; a concurrent lookup at worst repeats the search
+        self._term_ids[term] = (n, ids)
+        return ids
+
+
+# Process-wide id space shared by catalog snapshots and planners
+ingredient_vocabulary = IngredientVocabulary()
+
+
+def incidence_matrix(id_lists: List[List[int]], n_ingredients: Optional[int] = None) -> sparse.csr_matrix:
+    """CSR matrix with one row per recipe and a 1 for every ingredient it uses."""
+    lengths = np.fromiter((len(ids) for ids in id_lists), dtype=np.int64, count=len(id_lists))
+    indptr = np.zeros(len(id_lists) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.fromiter((i for ids in id_lists for i in ids), dtype=np.int64, count=int(indptr[-1]))
+    if n_ingredients is None:
+        n_ingredients = len(ingredient_vocabulary)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.float32), indices, indptr),
+        shape=(len(id_lists), n_ingredients),
+    )
+    # Repeated ingredients in one recipe collapse to a single entry
+    matrix.sum_duplicates()
+    matrix.data[:] = 1.0
+    return matrix
+
+
+def build_ingredient_matrix(ingredients: Iterable,
+                            vocabulary: IngredientVocabulary = ingredient_vocabulary) -> sparse.csr_matrix:
+    """Parse an ingredients column once and return its recipe x ingredient CSR matrix."""
+    id_lists = [vocabulary.intern_all(parse_ingredients(value)) for value in ingredients]
+    return incidence_matrix(id_lists, len(vocabulary))
+
+
+def pool_incidence(df) -> Optional[sparse.csr_matrix]:
+    """Incidence matrix for a candidate pool, from interned ids when the pool carries them."""
+    if 'ingredient_ids' in df.columns:
+        # Ids interned when the catalog was loaded
+        return incidence_matrix(list(df['ingredient_ids']))
+    if 'ingredients' in df.columns:
+        return build_ingredient_matrix(df['ingredients'])
+    return None
+
+
+class OveruseTracker:
+    """
+    Weekly ingredient counts with incremental recipe exclusion.
+
+    Handles:
+    - Counting ingredient uses in an integer vector over interned ids
+    - Detecting ingredients that newly reach the usage limit
+    - Blocking pool rows through one sparse mat-vec per newly overused batch,
+      with term -> ingredient ids resolved once by the vocabulary
+    """
+
+    def __init__(self, limit: int, vocabulary: IngredientVocabulary = ingredient_vocabulary):
+        self.limit = limit
+        self.vocabulary = vocabulary
+        self.counts = np.zeros(0, dtype=np.int32)
+        self._order: List[int] = []
+        self._seen: set = set()
+        self._overused: List[int] = []
+        self._applied_terms: set = set()
+        self._pools: Dict[str, Tuple[sparse.csr_matrix, np.ndarray]] = {}
+
+    def _grow(self, size: int) -> None:
+        if size > len(self.counts):
+            self.counts = np.concatenate([self.counts, np.zeros(size - len(self.counts), dtype=np.int32)])
+
+    def add(self, names: Iterable[str]) -> None:
+        """Count one use of each name (repeats count repeatedly, as before)."""
+        ids = self.vocabulary.intern_all(names)
+        if not ids:
+            return
+        self._grow(len(self.vocabulary))
+        for ingredient_id in ids:
+            if ingredient_id not in self._seen:
+                self._seen.add(ingredient_id)
+                self._order.append(ingredient_id)
+        touched = np.unique(ids)
+        before = self.counts[touched]
+        np.add.at(self.counts, ids, 1)
+        after = self.counts[touched]
+        self._overused.extend(int(i) for i in touched[(before < self.limit) & (after >= self.limit)])
+
+    def set_counts(self, counts: Dict[str, int]) -> None:
+        self.counts = np.zeros(0, dtype=np.int32)
+        self._order = []
+        self._seen = set()
+        self._overused = []
+        for name, count in counts.items():
+            ingredient_id = self.vocabulary.intern(name)
+            self._grow(len(self.vocabulary))
+            self._seen.add(ingredient_id)
+            self._order.append(ingredient_id)
+            self.counts[ingredient_id] = count
+            if count >= self.limit:
+                self._overused.append(ingredient_id)
+
+    def id_counts(self) -> Dict[int, int]:
+        """Non-zero counts keyed by interned ingredient id."""
+        return {int(i): int(self.counts[i]) for i in np.flatnonzero(self.counts)}
+
+    def overused(self) -> List[str]:
+        return [self.vocabulary.name(i) for i in self._overused]
+
+    def as_dict(self) -> Dict[str, int]:
+        """Counts keyed by ingredient name, in first-use order."""
+        return {self.vocabulary.name(i): int(self.counts[i]) for i in self._order}
+
+    def register_pool(self, key: str, matrix: sparse.csr_matrix) -> None:
+        """Track a candidate pool; rows using an overused ingredient get blocked."""
+        blocked = np.zeros(matrix.shape[0], dtype=bool)
+        self._pools[key] = (matrix, blocked)
+        if self._applied_terms:
+            self._block(self._pools[key], list(self._applied_terms))
+
+    def _block(self, pool: Tuple[sparse.csr_matrix, np.ndarray], terms: List[str]) -> None:
+        matrix, blocked = pool
+        # An overused ingredient blocks every recipe whose ingredient names contain it
+        hit_ids = np.concatenate([self.vocabulary.containing(term) for term in terms])
+        # Names interned after the pool matrix was built can't appear in it
+        hit_ids = hit_ids[hit_ids < matrix.shape[1]]
+        if len(hit_ids) == 0:
+            return
+        x = np.zeros(matrix.shape[1], dtype=np.float32)
+        x[hit_ids] = 1.0
+        blocked |= (matrix @ x) > 0
+
+    def apply(self, terms: Iterable[str]) -> None:
+        """Block pool rows for terms that haven't been applied yet."""
+        new_terms = [t for t in dict.fromkeys(terms) if t not in self._applied_terms]
+        if not new_terms:
+            return
+        self._applied_terms.update(new_terms)
+        for pool in self._pools.values():
+            self._block(pool, new_terms)
+
+    def blocked(self, key: str) -> np.ndarray:
+        return self._pools[key][1]
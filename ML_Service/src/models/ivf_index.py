@@ -0,0 +1,227 @@
+"""
+IVF (inverted file) index over recipe embeddings.
+
+build_clusters already assigns every recipe a MiniBatchKMeans cluster; its
+centroids double as the coarse quantizer. A query is compared with the
+centroids first and only the recipes in the `n_probe` closest clusters are
+scored exactly, so a lookup touches about n_probe / n_clusters of the
+catalog instead of every row.
+
+Inverted lists are kept per meal-type partition and hold partition row
+positions, so searches read the partition's embedding matrix directly and
+no second copy of the embeddings is made. The centroids and lists are saved
+next to the catalog Parquet file (`<catalog>_ivf.npz`) and validated against
+the catalog's cluster ids when loaded.
+"""
+
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.models.meal_partitions import MealTypePartition
+
+
+def ivf_path_for(catalog_path: Union[str, Path]) -> Path:
+    """Where the IVF index for a catalog Parquet file is stored."""
+    catalog_path = Path(catalog_path)
+    return catalog_path.with_name(f"{catalog_path.stem}_ivf.npz")
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+
+def inverted_lists(cluster_ids: np.ndarray, n_clusters: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (offsets, rows): rows of cluster c are rows[offsets[c]:offsets[c + 1]], in row order.
+
+    Rows with a negative cluster id (e.g. a -1 noise label) are in no list.
+    """
+    clustered = np.flatnonzero(cluster_ids >= 0)
+    rows = clustered[np.argsort(cluster_ids[clustered], kind="stable")].astype(np.int32)
+    counts = np.bincount(cluster_ids[clustered], minlength=n_clusters)
+    offsets = np.zeros(n_clusters + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, rows
+
+
+class SimilarRecipe(NamedTuple):
+    meal_type: str
+    position: int
+    score: float
+
+
+class RecipeIVFIndex:
+    """
+    Cluster-probed nearest-neighbour search over the catalog partitions.
+
+    Handles:
+    - Ranking centroids against a query vector (the coarse quantizer)
+    - Exact cosine scoring of the recipes in the probed inverted lists
+    - Finding recipes similar to a given recipe id
+    - Saving / loading the centroids and lists next to the catalog
+    """
+
+    def __init__(self, centroids: np.ndarray, lists: Dict[str, tuple],
+                 partitions: Dict[str, MealTypePartition]):
+        """
+        Args:
+            centroids: (n_clusters, d) unit-norm cluster centroids
+            lists: meal_type -> (offsets, rows) inverted lists over partition positions
+            partitions: The catalog partitions the lists point into
+        """
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.lists = lists
+        self.partitions = partitions
+
+        # recipe_id -> (partition, position) for similar-recipe lookups
+        meal_types = [mt for mt in lists if mt in partitions]
+        self._meal_types = meal_types
+        self._id_index = pd.Index([str(rid) for mt in meal_types for rid in partitions[mt].recipe_ids])
+        self._id_partition = np.repeat(np.arange(len(meal_types), dtype=np.int16),
+                                       [len(partitions[mt]) for mt in meal_types])
+        self._id_position = np.concatenate([np.arange(len(partitions[mt]), dtype=np.int64)
+                                            for mt in meal_types] or [np.zeros(0, dtype=np.int64)])
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, partitions: Dict[str, MealTypePartition],
+              centroids: Optional[np.ndarray] = None) -> Optional["RecipeIVFIndex"]:
+        """Lists from the partitions' cluster ids; centroids default to the normalized cluster means."""
+        if not partitions or next(iter(partitions.values())).embeddings.shape[1] == 0:
+            return None
+        n_clusters = 1 + max((int(p.cluster_ids.max()) for p in partitions.values() if len(p)), default=0)
+        if centroids is not None and len(centroids) < n_clusters:
+            return None
+        n_lists = n_clusters if centroids is None else len(centroids)
+        lists = {mt: inverted_lists(part.cluster_ids, n_lists) for mt, part in partitions.items()}
+        if centroids is None:
+            dim = next(iter(partitions.values())).embeddings.shape[1]
+            sums = np.zeros((n_clusters, dim), dtype=np.float64)
+            for mt, (offsets, rows) in lists.items():
+                emb = partitions[mt].embeddings
+                for c in range(n_clusters):
+                    if offsets[c + 1] > offsets[c]:
+                        sums[c] += emb[rows[offsets[c]:offsets[c + 1]]].sum(axis=0, dtype=np.float64)
+            centroids = _normalize_rows(sums)
+        return cls(centroids, lists, partitions)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], partitions: Dict[str, MealTypePartition]) -> Optional["RecipeIVFIndex"]:
+        """Load a saved index; None if it's missing or was built for a different catalog."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            centroids = data["centroids"]
+            lists = {}
+            for mt, part in partitions.items():
+                if f"{mt}_offsets" not in data:
+                    return None
+                offsets, rows = data[f"{mt}_offsets"], data[f"{mt}_rows"]
+                if offsets.dtype.kind not in "iu" or rows.dtype.kind not in "iu":
+                    return None
+                if len(offsets) != len(centroids) + 1 or len(rows) != np.count_nonzero(part.cluster_ids >= 0):
+                    return None
+                # Lists must hold each clustered partition position exactly once
+                if len(rows) and (rows.min() < 0 or rows.max() >= len(part)
+                                  or np.bincount(rows, minlength=len(part)).max() != 1):
+                    return None
+                if offsets[0] != 0 or offsets[-1] != len(rows) or np.any(np.diff(offsets) < 0):
+                    return None
+                # Every row must sit in the list of its own cluster
+                labels = np.repeat(np.arange(len(centroids)), np.diff(offsets))
+                if not np.array_equal(part.cluster_ids[rows], labels):
+                    return None
+                lists[mt] = (offsets, rows.astype(np.int32))
+        return cls(centroids, lists, partitions)
+
+    def save(self, path: Union[str, Path]) -> None:
+        arrays = {"centroids": self.centroids}
+        for mt, (offsets, rows) in self.lists.items():
+            arrays[f"{mt}_offsets"] = offsets
+            arrays[f"{mt}_rows"] = rows
+        np.savez(path, **arrays)
+
+    def nbytes(self) -> int:
+        return int(self.centroids.nbytes + sum(o.nbytes + r.nbytes for o, r in self.lists.values()))
+
+    def probe(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        """Ids of the `n_probe` centroids closest to `query`, closest first."""
+        sims = self.centroids @ np.asarray(query, dtype=np.float32).reshape(-1)
+        n_probe = max(1, min(n_probe, len(sims)))
+        top = np.argpartition(-sims, n_probe - 1)[:n_probe]
+        return top[np.argsort(-sims[top], kind="stable")]
+
+    def candidates(self, meal_type: str, clusters: np.ndarray) -> np.ndarray:
+        """Partition positions in the given clusters' inverted lists."""
+        offsets, rows = self.lists[meal_type]
+        if len(clusters) == 0:
+            return rows[:0]
+        return np.concatenate([rows[offsets[c]:offsets[c + 1]] for c in clusters])
+
+    def search(self, query: np.ndarray, k: int = 10, n_probe: int = 4,
+               meal_types: Optional[List[str]] = None) -> List[SimilarRecipe]:
+        """Top-k recipes by cosine similarity among the probed clusters, best first."""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        clusters = self.probe(query, n_probe)
+
+        found: List[SimilarRecipe] = []
+        for mt in meal_types or list(self.lists):
+            if mt not in self.lists:
+                continue
+            positions = self.candidates(mt, clusters)
+            if len(positions) == 0:
+                continue
+            scores = self.partitions[mt].embeddings[positions] @ query
+            top = np.argsort(-scores, kind="stable")[:k]
+            found.extend(SimilarRecipe(mt, int(positions[i]), float(scores[i])) for i in top)
+        found.sort(key=lambda r: -r.score)
+        return found[:k]
+
+    def locate(self, recipe_id) -> Optional[SimilarRecipe]:
+        """(meal_type, position) of a recipe id, or None if it isn't in the catalog."""
+        i = int(self._id_index.get_indexer([str(recipe_id)])[0])
+        if i < 0:
+            return None
+        return SimilarRecipe(self._meal_types[self._id_partition[i]], int(self._id_position[i]), 1.0)
+
+    def similar(self, recipe_id, k: int = 10, n_probe: int = 4,
+                meal_types: Optional[List[str]] = None) -> Optional[List[SimilarRecipe]]:
+        """Recipes most similar to `recipe_id` (itself excluded); None if the id is unknown."""
+        source = self.locate(recipe_id)
+        if source is None:
+            return None
+        query = self.partitions[source.meal_type].embeddings[source.position]
+        results = self.search(query, k + 1, n_probe, meal_types)
+        results = [r for r in results if (r.meal_type, r.position) != (source.meal_type, source.position)]
+        return results[:k]
+
+
+def load_or_build_ivf(path: Union[str, Path], partitions: Dict[str, MealTypePartition]) -> Optional[RecipeIVFIndex]:
+    """
+    The saved index for this catalog if it matches, else one built from the cluster means.
+
+    None if neither works; the catalog still loads and similarity search reports unavailable.
+    """
+    try:
+        index = RecipeIVFIndex.load(path, partitions)
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        print(f"Warning: could not load IVF index from {path}: {e}")
+        index = None
+    if index is None:
+        try:
+            index = RecipeIVFIndex.build(partitions)
+        except Exception as e:
+            print(f"Warning: could not build IVF index: {e}")
+            index = None
+    return index
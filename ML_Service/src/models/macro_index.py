@@ -0,0 +1,141 @@
+"""
+Macro index for candidate recall.
+
+Recall used to be a boolean mask over the calories of every recipe of a
+meal type. The index keeps each partition's row positions sorted by
+calories, so the recipes inside a calorie window are one binary search and
+a contiguous slice away. Protein / carb / fat bounds are then checked on
+that slice only, and results come back nearest-first to a macro target.
+A query costs O(log n + m) for m recipes in the window, or O(log n + k)
+when only the k nearest are asked for, so recall stops growing with the
+number of recipes of the meal type.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+Range = Tuple[float, float]
+
+
+class MacroIndex:
+    """
+    Calorie-sorted view of one meal type's macros.
+
+    Handles:
+    - Calorie range lookups by binary search
+    - Macro box queries (calories, protein, carbs, fat), nearest first
+    - Growing a calorie neighbourhood until enough usable rows are found
+    """
+
+    def __init__(self, kcal: np.ndarray, protein: np.ndarray, carbs: np.ndarray, fat: np.ndarray,
+                 order: Optional[np.ndarray] = None, sorted_kcal: Optional[np.ndarray] = None):
+        """
+        Args:
+            kcal, protein, carbs, fat: Row-aligned float32 macro arrays of a partition
+            order, sorted_kcal: A previously built index's arrays (e.g. a shared
+                catalog's); the sort is skipped when both are given
+        """
+        self.macros = {"kcal": kcal, "protein": protein, "carbs": carbs, "fat": fat}
+        if order is None or sorted_kcal is None:
+            # NaN calories sort last and are never returned
+            n_valid = int(np.count_nonzero(~np.isnan(kcal)))
+            order = np.argsort(kcal, kind="stable")[:n_valid].astype(np.int32)
+            sorted_kcal = np.ascontiguousarray(kcal[order])
+            order.setflags(write=False)
+            sorted_kcal.setflags(write=False)
+        self.order = order
+        self.sorted_kcal = sorted_kcal
+        self.n_valid = len(order)
+
+    def __len__(self) -> int:
+        return self.n_valid
+
+    def nbytes(self) -> int:
+        return int(self.order.nbytes + self.sorted_kcal.nbytes)
+
+    def kcal_range(self, low: float, high: float) -> np.ndarray:
+        """Row positions with low <= kcal <= high, in calorie order."""
+        start = np.searchsorted(self.sorted_kcal, np.float32(low), side="left")
+        stop = np.searchsorted(self.sorted_kcal, np.float32(high), side="right")
+        return self.order[start:stop]
+
+    def box(self, kcal: Range, protein: Optional[Range] = None, carbs: Optional[Range] = None,
+            fat: Optional[Range] = None, target: Optional[Dict[str, float]] = None,
+            limit: Optional[int] = None, keep: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Row positions inside a macro box, nearest to `target` first.
+
+        Args:
+            kcal: Calorie range (required; it selects the sorted slice)
+            protein, carbs, fat: Optional gram ranges; rows missing a bounded macro are left out
+            target: Macro values to rank by (defaults to the centre of the box);
+                distance is measured in box half-widths so each macro counts equally
+            limit: Return at most this many rows. The slice then grows outward from
+                the target's calories only until the nearest `limit` rows are certain,
+                so the cost depends on `limit` rather than on how full the box is.
+            keep: Optional boolean mask of usable rows
+        """
+        ranges = {"kcal": kcal, "protein": protein, "carbs": carbs, "fat": fat}
+        ranges = {name: bounds for name, bounds in ranges.items() if bounds is not None}
+        target = {name: (target or {}).get(name, (bounds[0] + bounds[1]) / 2.0) for name, bounds in ranges.items()}
+        half_width = {name: max((bounds[1] - bounds[0]) / 2.0, 1e-6) for name, bounds in ranges.items()}
+
+        first = int(np.searchsorted(self.sorted_kcal, np.float32(kcal[0]), side="left"))
+        last = int(np.searchsorted(self.sorted_kcal, np.float32(kcal[1]), side="right"))
+        centre = min(max(int(np.searchsorted(self.sorted_kcal, np.float32(target["kcal"]))), first), last)
+        width = max(limit or 0, 1)
+        while True:
+            start, stop = (first, last) if limit is None else (max(centre - width, first), min(centre + width, last))
+            positions = self.order[start:stop]
+            if keep is not None:
+                positions = positions[keep[positions]]
+            for name, bounds in ranges.items():
+                if name != "kcal" and len(positions):
+                    values = self.macros[name][positions]
+                    positions = positions[(values >= bounds[0]) & (values <= bounds[1])]
+            distance = np.zeros(len(positions), dtype=np.float64)
+            for name in ranges:
+                distance += ((self.macros[name][positions] - target[name]) / half_width[name]) ** 2
+            if limit is None or (start == first and stop == last):
+                break
+            if len(positions) >= limit:
+                # Rows outside the slice are at least this far away on calories alone
+                below = target["kcal"] - self.sorted_kcal[start] if start > first else np.inf
+                above = self.sorted_kcal[stop - 1] - target["kcal"] if stop < last else np.inf
+                bound = (max(min(below, above), 0.0) / half_width["kcal"]) ** 2
+                if np.partition(distance, limit - 1)[limit - 1] <= bound:
+                    break
+            width *= 2
+
+        order = np.argsort(distance, kind="stable")
+        return positions[order if limit is None else order[:limit]]
+
+    def nearest_kcal(self, kcal: float, k: int, keep: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        The `k` usable rows closest in calories to `kcal`, nearest first.
+
+        The neighbourhood around `kcal` in the sorted order doubles until it
+        holds k rows that `keep` allows (or covers the whole index).
+        """
+        centre = int(np.searchsorted(self.sorted_kcal, np.float32(kcal)))
+        width = max(k, 1)
+        while True:
+            start, stop = max(centre - width, 0), min(centre + width, self.n_valid)
+            positions = self.order[start:stop]
+            if keep is not None:
+                positions = positions[keep[positions]]
+            if len(positions) >= k or (start == 0 and stop == self.n_valid):
+                break
+            width *= 2
+        if 0 < k < len(positions):
+            # The neighbourhood is symmetric in rows, not calories: any row within the
+            # k-th smallest gap may be closer, so take that whole calorie range
+            # (padded so float32 rounding of the bounds can't drop an edge row)
+            gap = np.abs(self.macros["kcal"][positions].astype(np.float64) - kcal)
+            radius = np.partition(gap, k - 1)[k - 1] * (1 + 1e-6) + 1e-3
+            positions = self.kcal_range(kcal - radius, kcal + radius)
+            if keep is not None:
+                positions = positions[keep[positions]]
+        gap = np.abs(self.macros["kcal"][positions].astype(np.float64) - kcal)
+        return positions[np.argsort(gap, kind="stable")[:k]]
@@ -0,0 +1,300 @@
+"""
+Compact, per-meal-type view of the meal catalog.
+
+Each partition holds the arrays the scorer actually needs, built once per
+catalog snapshot: a contiguous float32 embedding matrix, float32 macro
+arrays, int32 cluster ids and categorical (interned) names. Rows point back
+into the snapshot DataFrame so final pools can still be materialized with
+every original column.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.models.embedding_store import EmbeddingStore
+from src.models.exclusion import ExclusionIndex
+from src.models.macro_index import MacroIndex
+from src.models.quantization import QuantizedEmbeddings
+from src.models.scoring import (cluster_novelty, cluster_novelty_from_counts, minmax_scale, normalized_mean,
+                                similarity_range)
+
+_EMB_NUMBERED = re.compile(r"^emb_?\d+$")
+
+
+def embedding_columns(columns: Iterable[str]) -> List[str]:
+    """Embedding columns in catalog order (`emb_0..` or `emb0..` as written by buildEmbeddings)."""
+    columns = [str(c) for c in columns]
+    cols = [c for c in columns if c.startswith("emb_")]
+    if not cols:
+        cols = [c for c in columns if _EMB_NUMBERED.match(c)]
+    return cols
+
+
+def _readonly(arr: np.ndarray) -> np.ndarray:
+    arr.setflags(write=False)
+    return arr
+
+
+class MealTypePartition:
+    """
+    Immutable arrays for one meal type.
+
+    All arrays are row-aligned; `rows` holds the positional index of each
+    entry in the snapshot DataFrame. `embeddings` may be a read-only view of
+    a memory-mapped EmbeddingStore instead of a copy of the Parquet columns.
+    """
+
+    def __init__(self, meal_type: str, df_meal: pd.DataFrame, rows: np.ndarray,
+                 embeddings: Optional[np.ndarray] = None, embedding_sum: Optional[np.ndarray] = None):
+        self.meal_type = meal_type
+        self.rows = _readonly(np.ascontiguousarray(rows, dtype=np.int64))
+
+        self.recipe_ids = _readonly(df_meal["recipe_id"].to_numpy())
+        self.names = pd.Categorical(df_meal["name"]) if "name" in df_meal.columns else None
+        self.name_index = ExclusionIndex.from_categorical(self.names) if self.names is not None else None
+
+        if embeddings is None:
+            emb_cols = embedding_columns(df_meal.columns)
+            embeddings = np.ascontiguousarray(df_meal[emb_cols].to_numpy(dtype=np.float32))
+        self.embeddings = _readonly(embeddings)
+
+        self.kcal = _readonly(df_meal["per_serving_kcal"].to_numpy(dtype=np.float32))
+        self.protein_g = _readonly(df_meal["protein_g"].to_numpy(dtype=np.float32))
+        self.carbs_g = _readonly(self._macro(df_meal, "carbs_g"))
+        self.fat_g = _readonly(self._macro(df_meal, "fat_g"))
+
+        if "cluster_id" in df_meal.columns:
+            self.cluster_ids = _readonly(df_meal["cluster_id"].to_numpy(dtype=np.int32))
+        else:
+            self.cluster_ids = _readonly(np.zeros(len(df_meal), dtype=np.int32))
+
+        # Calorie-sorted positions for macro-window recall
+        self.macro_index = MacroIndex(self.kcal, self.protein_g, self.carbs_g, self.fat_g)
+
+        # Catalog-only inputs of the cold-start vector and novelty; requests with
+        # exclusions subtract the excluded rows instead of rescanning the partition.
+        # A store passes its precomputed sum so the mapped matrix isn't read in full here.
+        if embedding_sum is None:
+            embedding_sum = self.embeddings.sum(axis=0, dtype=np.float64)
+        self.embedding_sum = _readonly(embedding_sum)
+        if len(self.cluster_ids) and self.cluster_ids.min() >= 0:
+            self.cluster_counts = _readonly(np.bincount(self.cluster_ids))
+            self._novelty = _readonly(cluster_novelty_from_counts(self.cluster_ids, self.cluster_counts))
+        else:
+            self.cluster_counts = None
+            self._novelty = _readonly(cluster_novelty(self.cluster_ids))
+
+        # Reduced-precision copies of the embeddings, built on first use
+        self._quantized: Dict[str, QuantizedEmbeddings] = {}
+        self._cold_start_range: Optional[Tuple[float, float]] = None
+
+    @classmethod
+    def from_arrays(cls, meal_type: str, arrays: Dict[str, np.ndarray], recipe_ids: np.ndarray,
+                    embeddings: np.ndarray, name_categories: Optional[pd.Index] = None) -> "MealTypePartition":
+        """
+        Partition over arrays another process already built (see `shared_arrays`).
+
+        Nothing is recomputed and the arrays are used as given, so read-only
+        memory maps stay shared. Only the names' Categorical and exclusion
+        index, which hold Python strings, are rebuilt in this process.
+        """
+        self = cls.__new__(cls)
+        self.meal_type = meal_type
+        self.rows = arrays["rows"]
+        self.recipe_ids = _readonly(recipe_ids)
+        self.names = None
+        self.name_index = None
+        if name_categories is not None and "name_codes" in arrays:
+            self.names = pd.Categorical.from_codes(arrays["name_codes"], dtype=pd.CategoricalDtype(name_categories))
+            self.name_index = ExclusionIndex.from_categorical(self.names)
+        self.embeddings = embeddings
+        self.kcal = arrays["kcal"]
+        self.protein_g = arrays["protein_g"]
+        self.carbs_g = arrays["carbs_g"]
+        self.fat_g = arrays["fat_g"]
+        self.cluster_ids = arrays["cluster_ids"]
+        self.macro_index = MacroIndex(self.kcal, self.protein_g, self.carbs_g, self.fat_g,
+                                      order=arrays["macro_order"], sorted_kcal=arrays["macro_sorted_kcal"])
+        self.embedding_sum = arrays["embedding_sum"]
+        self.cluster_counts = arrays.get("cluster_counts")
+        self._novelty = arrays["novelty"]
+        self._quantized = {}
+        self._cold_start_range = None
+        return self
+
+    def shared_arrays(self) -> Dict[str, np.ndarray]:
+        """Every array `from_arrays` needs, except the embeddings, by name."""
+        arrays = {
+            "rows": self.rows,
+            "kcal": self.kcal,
+            "protein_g": self.protein_g,
+            "carbs_g": self.carbs_g,
+            "fat_g": self.fat_g,
+            "cluster_ids": self.cluster_ids,
+            "macro_order": self.macro_index.order,
+            "macro_sorted_kcal": self.macro_index.sorted_kcal,
+            "embedding_sum": self.embedding_sum,
+            "novelty": self._novelty,
+        }
+        if self.cluster_counts is not None:
+            arrays["cluster_counts"] = self.cluster_counts
+        if self.names is not None:
+            arrays["name_codes"] = self.names.codes
+        return arrays
+
+    @staticmethod
+    def _macro(df_meal: pd.DataFrame, col: str) -> np.ndarray:
+        if col in df_meal.columns:
+            return df_meal[col].to_numpy(dtype=np.float32)
+        return np.full(len(df_meal), np.nan, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def cold_start_vector(self, keep: Optional[np.ndarray] = None) -> np.ndarray:
+        """Normalized mean embedding of the kept rows (all rows when `keep` is None)."""
+        if keep is None:
+            return normalized_mean(self.embedding_sum, len(self))
+        dropped = np.flatnonzero(~keep)
+        if len(dropped) <= len(self) // 2:
+            emb_sum = self.embedding_sum - self.embeddings[dropped].sum(axis=0, dtype=np.float64)
+        else:
+            emb_sum = self.embeddings[keep].sum(axis=0, dtype=np.float64)
+        return normalized_mean(emb_sum, len(self) - len(dropped))
+
+    def novelty(self, keep: Optional[np.ndarray] = None, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Cluster novelty of the kept rows (all rows when `keep` is None).
+
+        Row-aligned with the kept rows, or with `positions` (kept partition
+        positions) when given; the scaling is always that of the whole kept set.
+        """
+        if self.cluster_counts is None:
+            novelty = cluster_novelty(self.cluster_ids if keep is None else self.cluster_ids[keep])
+            if positions is None:
+                return novelty
+            full = np.zeros(len(self), dtype=np.float32)
+            full[slice(None) if keep is None else keep] = novelty
+            return full[positions]
+
+        if keep is None:
+            if positions is None:
+                return self._novelty
+            counts = self.cluster_counts
+        else:
+            counts = self.cluster_counts - np.bincount(self.cluster_ids[~keep], minlength=len(self.cluster_counts))
+        if positions is None:
+            return cluster_novelty_from_counts(self.cluster_ids[keep], counts)
+        if len(positions) == 0:
+            return np.zeros(0, dtype=np.float32)
+        present = counts[counts > 0]
+        inv_freq = (1.0 / counts[self.cluster_ids[positions]]).astype(np.float32)
+        return minmax_scale(inv_freq, data_min=1.0 / present.max(), data_max=1.0 / present.min())
+
+    @property
+    def embeddings_mapped(self) -> bool:
+        """Whether the embeddings are read from the memory-mapped store rather than held in the heap."""
+        return isinstance(self.embeddings, np.memmap)
+
+    def quantized(self, precision: str) -> QuantizedEmbeddings:
+        """float16 / int8 copy of the embeddings, built once per partition."""
+        quantized = self._quantized.get(precision)
+        if quantized is None:
+            if not self.embeddings_mapped:
+                # Beside a float32 copy in the heap the quantized copy would only add memory
+                raise RuntimeError(f"{precision} scoring needs the memory-mapped embedding store, but the "
+                                   f"{self.meal_type} embeddings were read from the catalog; "
+                                   f"run scripts/build_embedding_store.py")
+            # Two threads may both build it; the last assignment wins and both copies are equal
+            quantized = QuantizedEmbeddings(self.embeddings, precision)
+            self._quantized[precision] = quantized
+        return quantized
+
+    def cold_start_range(self) -> Tuple[float, float]:
+        """(min, max) similarity of every row to the cold-start vector, computed on first use."""
+        if self._cold_start_range is None:
+            # Two threads may both compute it; the results are equal
+            self._cold_start_range = similarity_range(self.embeddings, self.cold_start_vector())
+        return self._cold_start_range
+
+    def name_mask(self, terms: Iterable[str]) -> np.ndarray:
+        """Boolean mask of rows whose name contains any of `terms` (literal, case-insensitive)."""
+        if self.name_index is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.name_index.mask(terms)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Heap bytes held by each array of the partition, and the mapped embedding bytes."""
+        usage = {
+            "rows": self.rows.nbytes,
+            "recipe_ids": int(pd.Series(self.recipe_ids).memory_usage(deep=True, index=False)),
+            "embeddings": 0 if self.embeddings_mapped else self.embeddings.nbytes,
+            "macros": self.kcal.nbytes + self.protein_g.nbytes + self.carbs_g.nbytes + self.fat_g.nbytes,
+            "cluster_ids": self.cluster_ids.nbytes,
+            "names": int(self.names.memory_usage(deep=True)) if self.names is not None else 0,
+            "quantized_embeddings": sum(q.nbytes() for q in list(self._quantized.values())),
+            "macro_index": self.macro_index.nbytes(),
+            "cold_start_tables": self.embedding_sum.nbytes + self._novelty.nbytes
+            + (self.cluster_counts.nbytes if self.cluster_counts is not None else 0),
+        }
+        usage["total"] = sum(usage.values())
+        # Mapped embeddings live in the shared page cache, not in this process's heap
+        usage["mapped_embeddings"] = self.embeddings.nbytes if self.embeddings_mapped else 0
+        return usage
+
+
+def build_partitions(df_all: pd.DataFrame, store: Optional[EmbeddingStore] = None) -> Dict[str, MealTypePartition]:
+    """
+    Split a standardized catalog DataFrame into one partition per meal type.
+
+    With an embedding store the vectors come from the mapped file (a slice per
+    meal type) rather than from the DataFrame's embedding columns, and so do
+    their precomputed sums.
+    """
+    partitions = {}
+    meal_types = df_all["meal_type"].to_numpy()
+    for meal_type in pd.unique(meal_types):
+        if not isinstance(meal_type, str):
+            continue
+        rows = np.flatnonzero(meal_types == meal_type)
+        df_meal = df_all.iloc[rows]
+        embeddings = embedding_sum = None
+        if store is not None:
+            recipe_ids = df_meal["recipe_id"].to_numpy()
+            embeddings = store.embeddings_for(recipe_ids)
+            embedding_sum = store.embedding_sum_for(recipe_ids)
+        partitions[meal_type] = MealTypePartition(meal_type, df_meal, rows, embeddings, embedding_sum)
+    return partitions
+
+
+def memory_report(df_all: pd.DataFrame, partitions: Dict[str, MealTypePartition]) -> Dict[str, Any]:
+    """Heap bytes per recipe of the compact partitions, next to the DataFrame they replace."""
+    report: Dict[str, Any] = {"meal_types": {}}
+    total_bytes = 0
+    total_rows = 0
+    mapped_bytes = 0
+    for meal_type, part in partitions.items():
+        usage = part.memory_usage()
+        n = max(len(part), 1)
+        report["meal_types"][meal_type] = {
+            "recipes": len(part),
+            "bytes": usage["total"],
+            "bytes_per_recipe": round(usage["total"] / n, 1),
+            "embedding_bytes_per_recipe": round(usage["embeddings"] / n, 1),
+        }
+        total_bytes += usage["total"]
+        total_rows += len(part)
+        mapped_bytes += usage["mapped_embeddings"]
+
+    frame_bytes = int(df_all.memory_usage(deep=True).sum())
+    report["embeddings_memory_mapped"] = bool(partitions) and all(p.embeddings_mapped for p in partitions.values())
+    report["mapped_embedding_bytes"] = mapped_bytes
+    report["recipes"] = total_rows
+    report["partition_bytes"] = total_bytes
+    report["partition_bytes_per_recipe"] = round(total_bytes / max(total_rows, 1), 1)
+    report["dataframe_bytes"] = frame_bytes
+    report["dataframe_bytes_per_recipe"] = round(frame_bytes / max(len(df_all), 1), 1)
+    return report
@@ -1,12 +1,45 @@
+import numpy as np
 import pandas as pd
-import re
 import sys
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.models.exclusion import ExclusionIndex
+from src.models.ingredients import OveruseTracker, parse_ingredients, pool_incidence
 from src.models.meal_selector import GetMeals
+from src.models.weekly_optimizer import WeeklyPlanOptimizer
+
+
+class PlanningContext:
+    """
+    Per-request planning state.
+    
+    Handles:
+    - Weekly ingredient counts and overuse blocking
+    - The day-to-day meal selector (and its used recipes)
+    - Per-pool exclusion indexes
+    - The week plan built so far
+    
+    A context belongs to one request; WeeklyMealPlanner itself holds only
+    configuration, so one planner can serve concurrent requests.
+    """
+    
+    def __init__(self, ingredient_limit: int, initial_ingredient_counts: Dict[str, int] = None):
+        self.usage = OveruseTracker(ingredient_limit)
+        if initial_ingredient_counts:
+            self.usage.set_counts(initial_ingredient_counts)
+        self.meal_selector: Optional[GetMeals] = None
+        self.week_plan: Dict[str, Dict[str, Any]] = {}
+        self.pool_indexes: Dict[int, Tuple[pd.DataFrame, ExclusionIndex]] = {}
+        self.pool_frames: Dict[str, pd.DataFrame] = {}
+        self.solver_status: Dict[str, Any] = {}
+    
+    @property
+    def ingredient_counts(self) -> Dict[str, int]:
+        """Ingredient uses so far this week, keyed by name in first-use order."""
+        return self.usage.as_dict()
 
 
 class WeeklyMealPlanner:
@@ -17,51 +50,86 @@ class WeeklyMealPlanner:
     - Daily meal selection with allergen filtering
     - Weekly ingredient tracking and usage limits
     - Recipe variety enforcement across days
-    - State management for meal planners
+    - Optional whole-day combination search (solver="combined")
+    - Optional joint weekly optimization (solver="ilp") with greedy fallback
+    
+    All per-request state lives in a PlanningContext, so the planner is
+    reentrant and safe to share between threads.
     """
     
     def __init__(self, 
                  ingredient_limit: int = 4,
-                 days_of_week: List[str] = None):
+                 days_of_week: List[str] = None,
+                 solver: str = "greedy",
+                 solver_time_limit: float = 2.0):
 
+        if solver not in ("greedy", "combined", "ilp"):
+            raise ValueError(f"Unknown planner solver: {solver}")
         self.ingredient_limit = ingredient_limit
         self.days_of_week = days_of_week or ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+        self.solver = solver
+        self.optimizer = WeeklyPlanOptimizer(ingredient_limit, time_limit=solver_time_limit) if solver == "ilp" else None
+    
+    def new_context(self, initial_ingredient_counts: Dict[str, int] = None) -> PlanningContext:
+        return PlanningContext(self.ingredient_limit, initial_ingredient_counts)
         
-        # Track state across the week
-        self.ingredient_counts = {}
-        self.global_meal_planner = None
-        self.week_plan = {}
-        
-    def _filter_candidate_data(self, data: Dict[str, pd.DataFrame], filter_terms: List[str]) -> Dict[str, pd.DataFrame]:
+    def _filter_candidate_data(self, ctx: PlanningContext, data: Dict[str, pd.DataFrame],
+                               allergies: List[str], overused: List[str]) -> Dict[str, pd.DataFrame]:
 
-        if not filter_terms:
-            return data
-            
+        keep = self._candidate_masks(ctx, data, allergies, overused)
+        return {meal: df if keep.get(meal) is None else df[keep[meal]] for meal, df in data.items()}
+    
+    def _candidate_masks(self, ctx: PlanningContext, data: Dict[str, pd.DataFrame],
+                         allergies: List[str], overused: List[str]) -> Dict[str, Optional[np.ndarray]]:
+        """Rows of each pool still allowed (None keeps the whole pool)."""
+        if not allergies and not overused:
+            return {}
+        
+        # Only ingredients that became overused since the last call cost a mat-vec
+        self._register_pools(ctx, data)
+        ctx.usage.apply(overused)
+        
         return {
-            'breakfast': self._filter_foods(data['breakfast'], filter_terms),
-            'lunch': self._filter_foods(data['lunch'], filter_terms),
-            'dinner': self._filter_foods(data['dinner'], filter_terms),
-            'snack': self._filter_foods(data['snack'], filter_terms)  # Use 'snack' to match config
+            meal: self._keep_mask(ctx, meal, data[meal], allergies)
+            for meal in ['breakfast', 'lunch', 'dinner', 'snack']  # Use 'snack' to match config
         }
     
-    def _filter_foods(self, df: pd.DataFrame, filters: List[str]) -> pd.DataFrame:
-
-        if not filters:
-            return df
+    def _register_pools(self, ctx: PlanningContext, data: Dict[str, pd.DataFrame]):
+        for meal, df in data.items():
+            if ctx.pool_frames.get(meal) is df:
+                continue
+            matrix = pool_incidence(df)
+            if matrix is None:
+                continue
+            ctx.usage.register_pool(meal, matrix)
+            ctx.pool_frames[meal] = df
+    
+    def _keep_mask(self, ctx: PlanningContext, meal: str, df: pd.DataFrame, allergies: List[str]) -> Optional[np.ndarray]:
         
-        # Create single regex pattern for all allergens
-        filters_pattern = '|'.join(filters)
+        keep = np.ones(len(df), dtype=bool)
+        if allergies:
+            index = self._exclusion_index(ctx, df)
+            if index is not None:
+                keep &= ~index.mask(allergies)
+        if ctx.pool_frames.get(meal) is df:
+            keep &= ~ctx.usage.blocked(meal)
+        return None if keep.all() else keep
+    
+    def _exclusion_index(self, ctx: PlanningContext, df: pd.DataFrame) -> Optional[ExclusionIndex]:
+        # Pools are filtered once per day with different terms; index each pool once per week
+        cached = ctx.pool_indexes.get(id(df))
+        if cached is not None and cached[0] is df:
+            return cached[1]
         
-        # Check if this is a recipe DataFrame (has 'ingredients' column) or staples DataFrame (has 'food_name' column)
+        # Recipe DataFrame - filter by ingredients; staples DataFrame - filter by food name
         if 'ingredients' in df.columns:
-            # Recipe DataFrame - filter by ingredients
-            return df[~df['ingredients'].str.contains(filters_pattern, case=False, na=False, regex=True)]
+            index = ExclusionIndex.from_texts(df['ingredients'])
         elif 'food_name' in df.columns:
-            # Staples DataFrame - filter by food name
-            return df[~df['food_name'].str.contains(filters_pattern, case=False, na=False, regex=True)]
+            index = ExclusionIndex.from_texts(df['food_name'])
         else:
-            # Unknown structure, return unchanged
-            return df
+            return None
+        ctx.pool_indexes[id(df)] = (df, index)
+        return index
     
     def _extract_ingredients(self, meal_plan: Dict[str, Any]) -> List[str]:
 
@@ -72,100 +140,104 @@ class WeeklyMealPlanner:
         for meal_type in ['breakfast', 'lunch', 'dinner', 'snacks']:
             meal_data = meals.get(meal_type, {})
             recipe_data = meal_data.get('recipe', {})
-            meal_ingredients = recipe_data.get('ingredients', [])
-            
-            if meal_ingredients and not isinstance(meal_ingredients, float):
-                # Handle both string and list ingredients
-                if isinstance(meal_ingredients, str):
-                    # Parse ingredients string that looks like "['ingredient1', 'ingredient2', ...]"
-                    # Remove brackets and quotes, then split
-                    cleaned = meal_ingredients.strip("[]").replace("'", "").replace('"', '')
-                    ingredients.extend([ing.strip() for ing in cleaned.split(',') if ing.strip()])
-                elif isinstance(meal_ingredients, list):
-                    ingredients.extend(meal_ingredients)
-                # Skip any other data types (float, int, etc.)
+            # Stringified lists are parsed once per distinct string and cached
+            ingredients.extend(parse_ingredients(recipe_data.get('ingredients', [])))
         return ingredients
     
-    def _get_overused_ingredients(self) -> List[str]:
-
-        return [
-            ingredient for ingredient, count in self.ingredient_counts.items() 
-            if count >= self.ingredient_limit
-        ]
-    
-    def _update_ingredient_counts(self, ingredients: List[str]):
-
-        for ingredient in ingredients:
-            if ingredient in self.ingredient_counts:
-                self.ingredient_counts[ingredient] += 1
-            else:
-                self.ingredient_counts[ingredient] = 1
-    
     # single day plans
-    def plan_daily_meals(self, user: Dict[str, Any], candidate_data: Dict[str, pd.DataFrame],
-                        overused_ingredients: List[str] = None) -> Tuple[Dict[str, Any], List[str]]:
+    def plan_daily_meals(self, ctx: PlanningContext, user: Dict[str, Any], candidate_data: Dict[str, pd.DataFrame],
+                        overused_ingredients: List[str] = None,
+                        nutrition_targets: Optional[Dict[str, float]] = None) -> Tuple[Dict[str, Any], List[str]]:
 
-        # Combine allergens and overused ingredients for filtering
+        # Allergens and overused ingredients are filtered out
         allergies = user.get('allergies', [])
-        filter_out = allergies + (overused_ingredients or [])
-        
-        # Filter candidate data
-        filtered_data = self._filter_candidate_data(candidate_data, filter_out)
-        
-        # Create or update meal planner
-        if self.global_meal_planner is None:
-            self.global_meal_planner = GetMeals(
-                breakfast_df=filtered_data['breakfast'],
-                lunch_df=filtered_data['lunch'],
-                dinner_df=filtered_data['dinner'],
-                snacks_df=filtered_data['snack'],
+        
+        # Rows of each pool still allowed today
+        keep = self._candidate_masks(ctx, candidate_data, allergies, overused_ingredients or [])
+        
+        # The request's meal selector keeps its used recipes and per-pool cursors across days
+        if ctx.meal_selector is None:
+            ctx.meal_selector = GetMeals(
+                breakfast_df=candidate_data['breakfast'],
+                lunch_df=candidate_data['lunch'],
+                dinner_df=candidate_data['dinner'],
+                snacks_df=candidate_data['snack'],
+                selection="combined" if self.solver == "combined" else "greedy",
             )
-        else:
-            # Update existing planner with filtered data to maintain state
-            self.global_meal_planner.breakfast_df = filtered_data['breakfast']
-            self.global_meal_planner.lunch_df = filtered_data['lunch']
-            self.global_meal_planner.dinner_df = filtered_data['dinner']
-            self.global_meal_planner.snacks_df = filtered_data['snack']
+        ctx.meal_selector.use_pools(candidate_data, keep, (allergies or []) + (overused_ingredients or []))
         
         # Generate meal plan
-        meal_plan = self.global_meal_planner.create_meal_plan(user)
+        meal_plan = ctx.meal_selector.create_meal_plan(user, nutrition_targets)
         ingredient_list = self._extract_ingredients(meal_plan)
         
         return meal_plan, ingredient_list
     
-    def plan_weekly_meals(self, user: Dict[str, Any], candidate_data: Dict[str, pd.DataFrame],
-                         initial_ingredient_counts: Dict[str, int] = None) -> Tuple[Dict[str, Dict], Dict[str, int]]:
+    def iter_weekly_meals(self, user: Dict[str, Any], candidate_data: Dict[str, pd.DataFrame],
+                          initial_ingredient_counts: Dict[str, int] = None,
+                          nutrition_targets: Optional[Dict[str, float]] = None,
+                          ctx: Optional[PlanningContext] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Plan the week one day at a time, yielding (day, daily_plan) as soon as each day is done.
         
-        # Initialize or reset state
-        self.ingredient_counts = initial_ingredient_counts.copy() if initial_ingredient_counts else {}
-        self.week_plan = {}
-        self.global_meal_planner = None
+        Pass `ctx` (from new_context) to read ingredient counts afterwards.
+        """
+        if ctx is None:
+            ctx = self.new_context(initial_ingredient_counts)
+        
+        if self.optimizer is not None:
+            week = self._optimize_week(ctx, user, candidate_data, nutrition_targets)
+            if week is not None:
+                for day, daily_plan in week.items():
+                    ctx.usage.add(self._extract_ingredients(daily_plan))
+                    ctx.week_plan[day] = daily_plan
+                    yield day, daily_plan
+                return
+            print(f"Weekly optimizer fell back to greedy planning: {ctx.solver_status}")
         
         for day in self.days_of_week:
             print(f"\n=== Planning meals for {day} ===")
             
             # Get currently overused ingredients
-            overused = self._get_overused_ingredients()
+            overused = ctx.usage.overused()
             if overused:
                 print(f"Overused ingredients (≥{self.ingredient_limit} uses): {overused}")
             
             # Plan daily meals
             daily_plan, todays_ingredients = self.plan_daily_meals(
-                user, candidate_data, overused
+                ctx, user, candidate_data, overused, nutrition_targets
             )
             
             # Update ingredient tracking
-            self._update_ingredient_counts(todays_ingredients)
+            ctx.usage.add(todays_ingredients)
             
             # Store the day's plan
-            self.week_plan[day] = daily_plan
+            ctx.week_plan[day] = daily_plan
             
             # Log progress
             print(f"{day} ingredients: {todays_ingredients}")
             
-        return self.week_plan, self.ingredient_counts
+            yield day, daily_plan
+    
+    def _optimize_week(self, ctx: PlanningContext, user: Dict[str, Any], candidate_data: Dict[str, pd.DataFrame],
+                       nutrition_targets: Optional[Dict[str, float]]) -> Optional[Dict[str, Dict[str, Any]]]:
+        if nutrition_targets is None:
+            ctx.solver_status = {"status": "no_targets"}
+            return None
+        
+        # Allergens are removed up front; overuse is a constraint of the program
+        filtered_data = self._filter_candidate_data(ctx, candidate_data, user.get('allergies', []), [])
+        week, ctx.solver_status = self.optimizer.solve(
+            filtered_data, nutrition_targets, self.days_of_week,
+            used_counts=ctx.usage.id_counts(), ingredient_limit=self.ingredient_limit
+        )
+        return week
     
-    def reset_state(self):
-        self.ingredient_counts = {}
-        self.global_meal_planner = None
-        self.week_plan = {}
\ No newline at end of file
+    def plan_weekly_meals(self, user: Dict[str, Any], candidate_data: Dict[str, pd.DataFrame],
+                         initial_ingredient_counts: Dict[str, int] = None,
+                         nutrition_targets: Optional[Dict[str, float]] = None) -> Tuple[Dict[str, Dict], Dict[str, int]]:
+        
+        ctx = self.new_context(initial_ingredient_counts)
+        for _ in self.iter_weekly_meals(user, candidate_data, nutrition_targets=nutrition_targets, ctx=ctx):
+            pass
+            
+        return ctx.week_plan, ctx.ingredient_counts
@@ -1,14 +1,77 @@
+import numpy as np
 import pandas as pd
 import sys
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
 from api.services.ml_models.nutritionRanker import getUserTarget
+from src.models.day_combinations import DailyCombinationSearch
+from src.models.ingredients import parse_ingredients
+from src.models.snack_tables import filter_staples, snack_tables
+
+MAIN_MEALS = {'breakfast': 'breakfast_df', 'lunch': 'lunch_df', 'dinner': 'dinner_df'}
+
+
+def score_candidates(candidates: pd.DataFrame, target_protein: float) -> pd.Series:
+    """Simple scoring: protein efficiency + protein target."""
+    protein_efficiency = candidates['protein_g'] / candidates['calories']
+    protein_target_score = 1 / (1 + abs(candidates['protein_g'] - target_protein))
+    return (protein_efficiency * 0.7) + (protein_target_score * 0.3)
+
+
+class MealCursor:
+    """
+    One pool's in-band candidates, scored and ordered once for fixed meal targets.
+    
+    Within a week the pool and targets stay the same while used recipes and
+    excluded rows only grow, so picking the day's meal is advancing a cursor
+    past entries that are no longer allowed instead of re-scoring and
+    re-sorting the pool.
+    """
+    
+    def __init__(self, pool: pd.DataFrame, target_calories: float, target_protein: float):
+        self.pool = pool
+        self.targets = (target_calories, target_protein)
+        
+        # Same 10% calorie window as get_meal
+        tolerance = target_calories * 0.10
+        calories = pool['calories'].to_numpy(dtype=np.float64)
+        in_band = np.flatnonzero((calories >= target_calories - tolerance) & (calories <= target_calories + tolerance))
+        
+        # Best score first; ties keep pool order and NaN scores go last
+        scores = score_candidates(pool.iloc[in_band], target_protein).to_numpy(dtype=np.float64)
+        order = np.argsort(-scores, kind='stable')
+        self.positions = in_band[order]
+        self.ids = pool['id'].to_numpy()[self.positions] if 'id' in pool.columns else self.positions
+        self.allowed = np.ones(len(self.positions), dtype=bool)
+        self._next = 0
+    
+    def restrict(self, keep: Optional[np.ndarray]) -> None:
+        """Limit selection to pool rows where `keep` is True (None allows all)."""
+        self.allowed = np.ones(len(self.positions), dtype=bool) if keep is None else keep[self.positions]
+    
+    def next(self, used_recipes: set) -> Optional[int]:
+        """Pool position of the best allowed, unused candidate, or None when none is left."""
+        while self._next < len(self.positions):
+            i = self._next
+            if self.allowed[i] and self.ids[i] not in used_recipes:
+                return int(self.positions[i])
+            self._next += 1
+        return None
+
 
 class GetMeals:
-    def __init__(self, breakfast_df=None, lunch_df=None, dinner_df=None, snacks_df=None, staples_df=None):
+    def __init__(self, breakfast_df=None, lunch_df=None, dinner_df=None, snacks_df=None, staples_df=None,
+                 selection: str = "greedy"):
+        # "greedy" picks meal by meal then fills the gap with a snack;
+        # "combined" scores every breakfast x lunch x dinner x snack day at once
+        if selection not in ("greedy", "combined"):
+            raise ValueError(f"Unknown meal selection: {selection}")
+        self.selection = selection
+        self.combination_search = DailyCombinationSearch() if selection == "combined" else None
+        
         # Set up data directory
         script_dir = Path(__file__).parent
         self.data_dir = script_dir.parent.parent / "data" / "raw" / "by_meal_type"
@@ -16,6 +79,13 @@ class GetMeals:
         # Track used recipes to avoid repetition
         self.used_recipes = set()
         
+        # Allergens / overused ingredients the snack tables must avoid (set by use_pools)
+        self.snack_exclusions: List[str] = []
+        
+        # Per-meal-type selection cursors, and the pool + allowed rows behind each current DataFrame
+        self._cursors: Dict[str, MealCursor] = {}
+        self._views: Dict[str, Tuple[pd.DataFrame, pd.DataFrame, Optional[np.ndarray]]] = {}
+        
         # Use provided DataFrames or load default ones
         if breakfast_df is not None and lunch_df is not None and dinner_df is not None and snacks_df is not None:
             # Use pre-filtered DataFrames
@@ -28,11 +98,10 @@ class GetMeals:
             if staples_df is not None:
                 self.filtered_staples = self.filterSnacks(staples_df)
             else:
-                # Try to load staples from default location
-                staples_path = self.data_dir / "staples.csv"
-                if staples_path.exists():
-                    staples_df = pd.read_csv(staples_path)
-                    self.filtered_staples = self.filterSnacks(staples_df)
+                # Default staples are loaded and filtered once per file version
+                staples = snack_tables.get().staples
+                if staples is not None:
+                    self.filtered_staples = staples.df
                 else:
                     print("staples.csv not found")
                     self.filtered_staples = pd.DataFrame()
@@ -50,6 +119,26 @@ class GetMeals:
             'snacks': 0.05
         }
     
+    def use_pools(self, pools: Dict[str, pd.DataFrame], keep: Optional[Dict[str, Optional[np.ndarray]]] = None,
+                  exclude_terms: Optional[List[str]] = None):
+        """
+        Select from `pools` (keyed 'breakfast', 'lunch', 'dinner', 'snack') with the
+        rows where keep[meal] is False left out.
+        
+        The pools should stay the same objects for the whole week so each one is
+        scored and ordered only once. `exclude_terms` (the allergens and overused
+        ingredients behind `keep`) are applied to the snack tables too.
+        """
+        keep = keep or {}
+        self.snack_exclusions = list(exclude_terms or [])
+        for meal, attr in MAIN_MEALS.items():
+            pool, mask = pools[meal], keep.get(meal)
+            view = pool if mask is None else pool[mask]
+            setattr(self, attr, view)
+            self._views[meal] = (view, pool, mask)
+        mask = keep.get('snack')
+        self.snacks_df = pools['snack'] if mask is None else pools['snack'][mask]
+    
     def load_meal_dataframes(self):
         try:
             self.breakfast_df = pd.read_csv(self.data_dir / "breakfast_recipes.csv")
@@ -70,18 +159,19 @@ class GetMeals:
         except Exception as e:
             print(f"Error loading meal data: {e}")
     
-    def create_meal_plan(self, user_data: Dict) -> Dict:
-        """Create complete meal plan from user data."""
-        # Get targets from ML model (returns tuple)
-        nutrition_targets_tuple = getUserTarget(user_data)
-        
-        # Convert tuple to dictionary for easier access
-        nutrition_targets = {
-            'calories': nutrition_targets_tuple[0],
-            'protein_g': nutrition_targets_tuple[1],
-            'fat_g': nutrition_targets_tuple[2],
-            'carb_g': nutrition_targets_tuple[3]
-        }
+    def create_meal_plan(self, user_data: Dict, nutrition_targets: Optional[Dict] = None) -> Dict:
+        """Create complete meal plan from user data (targets are predicted when not supplied)."""
+        if nutrition_targets is None:
+            # Get targets from ML model (returns tuple)
+            nutrition_targets_tuple = getUserTarget(user_data)
+            
+            # Convert tuple to dictionary for easier access
+            nutrition_targets = {
+                'calories': nutrition_targets_tuple[0],
+                'protein_g': nutrition_targets_tuple[1],
+                'fat_g': nutrition_targets_tuple[2],
+                'carb_g': nutrition_targets_tuple[3]
+            }
         
         # Calculate meal targets
         meal_targets = {}
@@ -93,6 +183,11 @@ class GetMeals:
                 'fat_g': int(nutrition_targets['fat_g'] * split)
             }
         
+        if self.combination_search is not None:
+            meal_plan = self._combined_meal_plan(nutrition_targets, meal_targets)
+            if meal_plan is not None:
+                return meal_plan
+        
         # Get main meals first
         meals = {
             'breakfast': self.get_meal(self.breakfast_df, 'breakfast', meal_targets['breakfast']),
@@ -142,6 +237,85 @@ class GetMeals:
     def get_meal(self, meal_df: Optional[pd.DataFrame], meal_type: str, targets: Dict) -> Dict:
         #meal_df = pd.read_csv(self.data_dir / f"{meal_type}_recipes.csv")
         
+        # Best unused in-band recipe from the pool's cursor; rescored only in the fallback cases
+        selected = self._next_from_cursor(meal_df, meal_type, targets)
+        if selected is None:
+            selected = self._select_by_score(meal_df, targets)
+        
+        # Track this recipe as used
+        self.used_recipes.add(selected['id'])
+        
+        print(f"{meal_type.title()}: {selected['name']} ({selected['calories']} cal, {selected['protein_g']:.1f}g protein)")
+        
+        return self._meal_entry(selected, meal_type, targets)
+    
+    def _meal_entry(self, selected: pd.Series, meal_type: str, targets: Dict) -> Dict:
+        recipe = {
+            'id': selected['id'],
+            'name': selected['name'],
+            'calories': selected['calories'],
+            'protein_g': selected['protein_g'],
+            'carbs_g': selected['carbs_g'],
+            'fat_g': selected['fat_g'],
+            'ingredients': selected.get('ingredients'),
+            'steps': selected.get('steps')
+        }
+        if meal_type == 'snacks':
+            # Combined days take their snack from the recipe pool
+            recipe['source'] = 'recipe'
+        return {
+            'recipe': recipe,
+            'targets': targets,
+            'meal_type': meal_type
+        }
+    
+    def _combined_meal_plan(self, nutrition_targets: Dict, meal_targets: Dict) -> Optional[Dict]:
+        # None (e.g. every recipe of a meal type used up) falls back to greedy selection
+        pools = {'breakfast': self.breakfast_df, 'lunch': self.lunch_df,
+                 'dinner': self.dinner_df, 'snack': self.snacks_df}
+        allowed = {
+            slot: ~df['id'].isin(self.used_recipes).to_numpy()
+            for slot, df in pools.items() if df is not None and 'id' in df.columns
+        }
+        choice = self.combination_search.best(pools, nutrition_targets, allowed)
+        if choice is None:
+            return None
+        
+        meals = {}
+        for slot, position in choice.items():
+            meal_type = 'snacks' if slot == 'snack' else slot
+            selected = pools[slot].iloc[position]
+            self.used_recipes.add(selected['id'])
+            print(f"{meal_type.title()}: {selected['name']} ({selected['calories']} cal, {selected['protein_g']:.1f}g protein)")
+            meals[meal_type] = self._meal_entry(selected, meal_type, meal_targets[meal_type])
+        
+        return {
+            'nutrition_targets': nutrition_targets,
+            'meals': meals,
+            'total_nutrition': {
+                macro: sum(meal['recipe'][macro] for meal in meals.values())
+                for macro in ('calories', 'protein_g', 'carbs_g', 'fat_g')
+            }
+        }
+    
+    def _next_from_cursor(self, meal_df: pd.DataFrame, meal_type: str, targets: Dict) -> Optional[pd.Series]:
+        view = self._views.get(meal_type)
+        if view is not None and view[0] is meal_df:
+            _, pool, keep = view
+        else:
+            pool, keep = meal_df, None
+        
+        cursor = self._cursors.get(meal_type)
+        if cursor is None or cursor.pool is not pool or cursor.targets != (targets['calories'], targets['protein_g']):
+            cursor = MealCursor(pool, targets['calories'], targets['protein_g'])
+            self._cursors[meal_type] = cursor
+        cursor.restrict(keep)
+        
+        position = cursor.next(self.used_recipes)
+        return None if position is None else pool.iloc[position]
+    
+    def _select_by_score(self, meal_df: pd.DataFrame, targets: Dict) -> pd.Series:
+        # Used when no in-band recipe is left unused: widen the calorie window or reuse a recipe
         target_calories = targets['calories']
         target_protein = targets['protein_g']
         
@@ -161,10 +335,7 @@ class GetMeals:
             candidates['calorie_diff'] = abs(candidates['calories'] - target_calories)
             candidates = candidates.nsmallest(50, 'calorie_diff')
         
-        # Simple scoring: protein efficiency + protein target
-        candidates['protein_efficiency'] = candidates['protein_g'] / candidates['calories']
-        candidates['protein_target_score'] = 1 / (1 + abs(candidates['protein_g'] - target_protein))
-        candidates['meal_score'] = (candidates['protein_efficiency'] * 0.7) + (candidates['protein_target_score'] * 0.3)
+        candidates['meal_score'] = score_candidates(candidates, target_protein)
         
         # Filter out previously used recipes for variety
         available_candidates = candidates[~candidates['id'].isin(self.used_recipes)]
@@ -173,97 +344,44 @@ class GetMeals:
         if available_candidates.empty:
             available_candidates = candidates
         
-        # Sort by score and pick from top options to introduce variety
-        available_candidates = available_candidates.sort_values('meal_score', ascending=False)
-        
-        # Select from top 5 options to add variety while maintaining quality
-        top_candidates = available_candidates.head(5)
-        
-        # Pick the first available option (best score among unused)
-        selected = top_candidates.iloc[0]
-        
-        # Track this recipe as used
-        self.used_recipes.add(selected['id'])
-        
-        print(f"{meal_type.title()}: {selected['name']} ({selected['calories']} cal, {selected['protein_g']:.1f}g protein)")
-        
-        return {
-            'recipe': {
-                'id': selected['id'],
-                'name': selected['name'],
-                'calories': selected['calories'],
-                'protein_g': selected['protein_g'],
-                'carbs_g': selected['carbs_g'],
-                'fat_g': selected['fat_g'],
-                'ingredients': selected.get('ingredients'),
-                'steps': selected.get('steps')
-            },
-            'targets': targets,
-            'meal_type': meal_type
-        }
+        # Best score among unused (ties keep pool order, like MealCursor)
+        available_candidates = available_candidates.sort_values('meal_score', ascending=False, kind='stable')
+        return available_candidates.iloc[0]
     
     def get_Snack(self, targets: Dict) -> Dict:
-        meal_df = pd.read_csv(self.data_dir / "snacks_recipes.csv")
-        foods_df = pd.read_csv(self.data_dir / "staples.csv")
-        
-        # Filter out supplements and problematic items
-        foods_df_filtered = self.filterSnacks(foods_df)
+        # Resident tables, reloaded only when the CSVs change
+        tables = snack_tables.get()
+        if tables.recipes is None:
+            raise FileNotFoundError(f"Snack recipes not found: {snack_tables.recipes_path}")
+        if tables.staples is None:
+            raise FileNotFoundError(f"Staples not found: {snack_tables.staples_path}")
         
         target_calories = targets['calories']
         target_protein = targets['protein_g']
         
-        # Filter by calorie range
-        tolerance = target_calories * 0.15  # Increase tolerance for snacks
-        min_calories = target_calories - tolerance
-        max_calories = target_calories + tolerance
-        
-        # Get candidates from recipes
-        recipe_candidates = meal_df[
-            (meal_df['calories'] >= min_calories) & 
-            (meal_df['calories'] <= max_calories)
-        ].copy()
-        recipe_candidates['source'] = 'recipe'
-        
-        # Get candidates from filtered staples
-        food_candidates = foods_df_filtered[
-            (foods_df_filtered['calories'] >= min_calories) & 
-            (foods_df_filtered['calories'] <= max_calories)
-        ].copy()
-        food_candidates['source'] = 'staple'
-        
-        # Combine candidates using concat instead of +=
-        candidates_list = []
-        if not recipe_candidates.empty:
-            candidates_list.append(recipe_candidates)
-        if not food_candidates.empty:
-            candidates_list.append(food_candidates)
+        # Allergens, overused ingredients and recipes already used this week are left out
+        recipes_out = tables.recipes.excluded(self.snack_exclusions, self.used_recipes)
+        staples_out = tables.staples.excluded(self.snack_exclusions)
         
-        if candidates_list:
-            candidates = pd.concat(candidates_list, ignore_index=True)
-        else:
-            candidates = pd.DataFrame()
+        # One to three recipes / staples covering the remaining calories and protein
+        items = tables.filler.fill(target_calories, target_protein, np.concatenate([recipes_out, staples_out]))
         
-        # Fallback if no candidates
-        if candidates.empty:
-            # Try with just recipes
-            candidates = meal_df.copy()
+        # Fallback if nothing fits: the best-scoring of the 50 allowed recipes nearest in calories
+        if not items:
+            candidates = tables.recipes.df if recipes_out.all() else tables.recipes.df[~recipes_out]
+            candidates = candidates.copy()
             candidates['calorie_diff'] = abs(candidates['calories'] - target_calories)
             candidates = candidates.nsmallest(50, 'calorie_diff')
             candidates['source'] = 'recipe'
-        
-        # Simple scoring
-        candidates['protein_efficiency'] = candidates['protein_g'] / candidates['calories']
-        candidates['protein_target_score'] = 1 / (1 + abs(candidates['protein_g'] - target_protein))
-        candidates['meal_score'] = (candidates['protein_efficiency'] * 0.7) + (candidates['protein_target_score'] * 0.3)
-        
-        # Select best option
-        selected = candidates.loc[candidates['meal_score'].idxmax()]
-        
-        source_info = f" [{selected['source']}]"
-        print(f"Snacks: {selected['name']}{source_info} ({selected['calories']} cal, {selected['protein_g']:.1f}g protein)")
-        
-        return {
-            'recipe': {
+            candidates['meal_score'] = score_candidates(candidates, target_protein)
+            items = [candidates.loc[candidates['meal_score'].idxmax()]]
+        
+        snack_items = []
+        for selected in items:
+            if selected['source'] == 'recipe':
+                self.used_recipes.add(selected['id'])
+            print(f"Snacks: {selected['name']} [{selected['source']}] ({selected['calories']} cal, {selected['protein_g']:.1f}g protein)")
+            snack_items.append({
                 'id': selected.get('id', 'unknown'),
                 'name': selected['name'],
                 'calories': selected['calories'],
@@ -271,42 +389,40 @@ class GetMeals:
                 'carbs_g': selected['carbs_g'],
                 'fat_g': selected['fat_g'],
                 'source': selected['source'],
-                'ingredients': selected.get('ingredients'),  # Add this
-                'steps': selected.get('steps')               # Add this
-            },
+                'ingredients': selected.get('ingredients'),
+                'steps': selected.get('steps')
+            })
+        
+        if len(snack_items) == 1:
+            return {
+                'recipe': snack_items[0],
+                'targets': targets,
+                'meal_type': 'snacks'
+            }
+        return {
+            'recipe': self._combined_snack(snack_items),
+            'items': snack_items,
             'targets': targets,
             'meal_type': 'snacks'
         }
+    
+    def _combined_snack(self, snack_items: List[Dict]) -> Dict:
+        # Daily totals and ingredient tracking read the combined entry like a single recipe;
+        # it isn't one recipe, so its id is None and the item ids are only under 'items'
+        ingredients = [ing for item in snack_items for ing in parse_ingredients(item['ingredients'])]
+        return {
+            'id': None,
+            'name': ' + '.join(str(item['name']) for item in snack_items),
+            'calories': sum(item['calories'] for item in snack_items),
+            'protein_g': sum(item['protein_g'] for item in snack_items),
+            'carbs_g': sum(item['carbs_g'] for item in snack_items),
+            'fat_g': sum(item['fat_g'] for item in snack_items),
+            'source': 'combined',
+            'ingredients': ingredients or None,
+            'steps': None
+        }
 
     def filterSnacks(self, foods_df: pd.DataFrame) -> pd.DataFrame:
         
-        # Create a copy and standardize the name column
-        filtered_df = foods_df.copy()
-
-        filtered_df['name'] = filtered_df['food_name']
-        
-        # Convert to lowercase for filtering
-        filtered_df['name_lower'] = filtered_df['name'].str.lower().fillna('')
-        
-        exclude_keywords = [
-            'supplement', 'powder', 'pill', 'tablet', 'capsule', 
-            'vitamin', 'mineral', 'creatine', 'bcaa', 'whey',
-            'protein powder', 'mass gainer', 'pre-workout',
-            'oil', 'extract', 'syrup', 'herb'
-        ]
-        
-        # Filter out items
-        for keyword in exclude_keywords:
-            filtered_df = filtered_df[~filtered_df['name_lower'].str.contains(keyword, na=False)]
-        
-        # Filter by reasonable nutrition ranges for snacks
-        filtered_df = filtered_df[
-            (filtered_df['calories'] >= 30) &      # Minimum meaningful calories
-            (filtered_df['calories'] <= 500) &     # Maximum reasonable snack size
-            (filtered_df['protein_g'] >= 0) &      # No negative protein
-            (filtered_df['protein_g'] <= 100) &    # No crazy high protein (likely powder)
-            (filtered_df['carbs_g'] >= 0) &        # No negative carbs
-            (filtered_df['fat_g'] >= 0)            # No negative fat
-        ]
-        
-        return filtered_df.drop(['name_lower'], axis=1)
\ No newline at end of file
+        # Single keyword pass plus nutrition ranges; see snack_tables.filter_staples
+        return filter_staples(foods_df)
@@ -0,0 +1,81 @@
+"""
+Quantized copies of the recipe embedding matrix.
+
+Embeddings are the bulk of each worker's catalog memory. A float16 copy
+takes half of the float32 bytes and an int8 copy (one float32 scale per
+dimension) a quarter. Scores from a quantized copy are used for a first,
+approximate pass; the top rows are then rescored exactly against the float32
+matrix. That matrix must be the memory-mapped embedding store: next to a
+float32 copy in the heap a quantized copy would only add memory, while a
+mapped matrix only has the rescored rows paged in.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+
+# Rows converted to float32 at a time when scoring; small enough that the
+# float32 scratch block stays in cache between the conversion and the dot
+_BLOCK_ROWS = 1024
+
+
+class QuantizedEmbeddings:
+    """
+    Reduced-precision embedding matrix.
+
+    Handles:
+    - float16 or per-dimension scaled int8 storage
+    - Approximate dot products with a float32 query, in row blocks
+    """
+
+    def __init__(self, embeddings: np.ndarray, precision: str = "int8"):
+        """
+        Args:
+            embeddings: (n, d) float32 embeddings
+            precision: "float16" or "int8"
+        """
+        if precision not in ("float16", "int8"):
+            raise ValueError(f"Unknown embedding precision: {precision}")
+        self.precision = precision
+        n, dim = embeddings.shape
+
+        # Converted in row blocks so no full-size float32 temporary is allocated
+        if precision == "float16":
+            self.scale = np.ones(dim, dtype=np.float32)
+            self.values = np.empty((n, dim), dtype=np.float16)
+        else:
+            # Symmetric per-dimension scale so each column uses the full int8 range
+            max_abs = np.zeros(dim, dtype=np.float32)
+            for start in range(0, n, _BLOCK_ROWS):
+                np.maximum(max_abs, np.abs(embeddings[start:start + _BLOCK_ROWS]).max(axis=0), out=max_abs)
+            self.scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            self.values = np.empty((n, dim), dtype=np.int8)
+        for start in range(0, n, _BLOCK_ROWS):
+            block = np.asarray(embeddings[start:start + _BLOCK_ROWS], dtype=np.float32)
+            if precision == "int8":
+                block = np.clip(np.rint(block / self.scale), -127, 127)
+            self.values[start:start + _BLOCK_ROWS] = block
+        self.values.setflags(write=False)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def nbytes(self) -> int:
+        return int(self.values.nbytes + self.scale.nbytes)
+
+    def dot(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate `embeddings[rows] @ query` as float32 (all rows when `rows` is None)."""
+        # The per-dimension scale is folded into the query once
+        query = np.asarray(query, dtype=np.float32).reshape(-1) * self.scale
+        n = len(self.values) if rows is None else len(rows)
+        out = np.empty(n, dtype=np.float32)
+        scratch = np.empty((min(n, _BLOCK_ROWS), self.values.shape[1]), dtype=np.float32)
+        for start in range(0, n, _BLOCK_ROWS):
+            stop = min(start + _BLOCK_ROWS, n)
+            block = scratch[:stop - start]
+            np.copyto(block, self.values[start:stop] if rows is None else self.values[rows[start:stop]],
+                      casting="unsafe")
+            np.dot(block, query, out=out[start:stop])
+        return out
@@ -0,0 +1,313 @@
+"""
+Vectorized candidate scoring kernel.
+
+Computes preference, nutrition fit, novelty, final score and the recall
+window mask for a whole meal-type partition in one pass over NumPy arrays.
+Every step mirrors the original per-row / MinMaxScaler logic in
+CandidatePoolBuilder so pools come out the same.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.models.quantization import QuantizedEmbeddings
+
+
+class ScoreArrays(NamedTuple):
+    """Row-aligned scores for one meal type."""
+    preference_score: np.ndarray
+    nutrition_fit: np.ndarray
+    novelty_bonus: np.ndarray
+    model_score: np.ndarray
+    final_model_score: np.ndarray
+    in_window: np.ndarray
+
+
+def minmax_scale(x: np.ndarray, data_min=None, data_max=None) -> np.ndarray:
+    """
+    Scale a 1-D array to [0, 1] the same way sklearn's MinMaxScaler does (dtype preserved).
+
+    `data_min` / `data_max` fit the scaler to a larger set than `x` (e.g. a
+    whole partition when only some of its rows are scored).
+    """
+    x = np.asarray(x)
+    if x.size == 0:
+        return x.copy()
+    data_min = np.nanmin(x) if data_min is None else x.dtype.type(data_min)
+    data_max = np.nanmax(x) if data_max is None else x.dtype.type(data_max)
+    data_range = data_max - data_min
+    # MinMaxScaler treats (near-)constant features as range 1
+    if data_range < 10 * np.finfo(data_range.dtype).eps:
+        data_range = data_range.dtype.type(1.0)
+    scale = 1.0 / data_range
+    offset = 0.0 - data_min * scale
+    return x * scale + offset
+
+
+def _clip01(x: np.ndarray) -> np.ndarray:
+    # max(0.0, min(1.0, v)) in Python maps NaN to 1.0; keep that behaviour
+    return np.where(np.isnan(x), 1.0, np.clip(x, 0.0, 1.0))
+
+
+def nutrition_fit(kcal: np.ndarray, protein: np.ndarray, kcal_low: float, kcal_high: float,
+                  window_low: float, window_high: float, protein_target: float,
+                  protein_tol: float = 0.20) -> np.ndarray:
+    """Piecewise kcal/protein fit in [0, 1] (0.7 kcal + 0.3 protein)."""
+    cal = np.asarray(kcal, dtype=np.float64)
+    protein = np.asarray(protein, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Calorie scoring
+        below = 1.0 - (kcal_low - cal) / max(1e-6, kcal_low - window_low)
+        above = 1.0 - (cal - kcal_high) / max(1e-6, window_high - kcal_high)
+        kcal_score = np.where(cal < kcal_low, below, above)
+        kcal_score = np.where((kcal_low <= cal) & (cal <= kcal_high), 1.0, kcal_score)
+        kcal_score = _clip01(kcal_score)
+        kcal_score = np.where((cal < window_low) | (cal > window_high), 0.0, kcal_score)
+
+        # Protein scoring
+        tol = protein_tol * protein_target
+        max_error = 3.0 * tol
+        error = np.abs(protein - protein_target)
+        protein_score = 1.0 - (error - tol) / (max_error - tol)
+        protein_score = np.where(error >= max_error, 0.0, protein_score)
+        protein_score = np.where(error <= tol, 1.0, protein_score)
+        protein_score = _clip01(protein_score)
+
+    fit = 0.7 * kcal_score + 0.3 * protein_score
+    return np.clip(fit, 0.0, 1.0)
+
+
+def targets_fit(kcal: np.ndarray, protein: np.ndarray, targets: Dict[str, float]) -> np.ndarray:
+    """nutrition_fit against the output of CandidatePoolBuilder._get_meal_scoring_targets."""
+    return nutrition_fit(
+        kcal, protein,
+        kcal_low=targets["kcal_low"],
+        kcal_high=targets["kcal_high"],
+        window_low=targets["window_low"],
+        window_high=targets["window_high"],
+        protein_target=targets["protein_target"],
+    )
+
+
+def cold_start_user_vector(emb_matrix: np.ndarray) -> np.ndarray:
+    """Normalized mean embedding, used when we have no history for the user."""
+    return normalized_mean(emb_matrix.sum(axis=0, dtype=np.float64), len(emb_matrix))
+
+
+def normalized_mean(emb_sum: np.ndarray, n: int) -> np.ndarray:
+    """cold_start_user_vector from a precomputed (float64) embedding sum over `n` rows."""
+    mean_vec = (emb_sum / max(n, 1)).astype(np.float32)
+    norm = np.linalg.norm(mean_vec)
+    if norm == 0:
+        return mean_vec
+    return mean_vec / norm
+
+
+def _unit_vector(user_vec: np.ndarray) -> np.ndarray:
+    user_vec = np.asarray(user_vec, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(user_vec)
+    if norm > 0:
+        user_vec = user_vec / norm
+    return user_vec
+
+
+def preference_scores(emb_matrix: np.ndarray, user_vec: np.ndarray,
+                      data_range: Optional[Tuple[float, float]] = None) -> np.ndarray:
+    """
+    Cosine similarity to the user vector, min-max scaled to [0, 1].
+
+    `data_range` (see similarity_range) scales a subset of rows like the set it came from.
+    """
+    sims = emb_matrix @ _unit_vector(user_vec)
+    if data_range is None:
+        return minmax_scale(sims)
+    return minmax_scale(sims, *data_range)
+
+
+def similarity_range(embeddings: np.ndarray, user_vec: np.ndarray,
+                     keep: Optional[np.ndarray] = None) -> Tuple[float, float]:
+    """(min, max) cosine similarity to the user vector over the rows where `keep` is True (all when None)."""
+    sims = embeddings @ _unit_vector(user_vec)
+    if keep is not None:
+        sims = sims[keep]
+    return float(np.nanmin(sims)), float(np.nanmax(sims))
+
+
+def approximate_similarities(quantized: QuantizedEmbeddings, user_vec: np.ndarray,
+                             rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Unscaled cosine similarities of `rows` (all rows when None) from a quantized embedding matrix."""
+    return quantized.dot(_unit_vector(user_vec), rows)
+
+
+def rescore_preference(sims: np.ndarray, embeddings: np.ndarray, user_vec: np.ndarray,
+                       rows: Optional[np.ndarray] = None, rescore_size: int = 800,
+                       rest: Optional[np.ndarray] = None, weight: float = 1.0) -> np.ndarray:
+    """
+    preference_scores from approximate similarities, with exact rescoring.
+
+    The `rescore_size` rows leading on the approximate final score
+    (`weight` * scaled similarity + `rest`, where `rest` holds the other
+    score terms; similarity alone when None) are recomputed against the
+    float32 `embeddings`, so the recipes that can make the pool carry exact
+    scores. The scaling is fitted to the approximate and exact values
+    together, so rows that weren't rescored keep the same scale whichever
+    rows were. `sims` is not modified.
+    """
+    if rescore_size <= 0 or len(sims) == 0:
+        return minmax_scale(sims)
+    k = min(rescore_size, len(sims))
+    key = sims if rest is None else weight * minmax_scale(sims) + rest
+    top = np.sort(np.argpartition(-key, k - 1)[:k])
+    exact = embeddings[top if rows is None else rows[top]] @ _unit_vector(user_vec)
+    data_min, data_max = min(sims.min(), exact.min()), max(sims.max(), exact.max())
+    sims = sims.copy()
+    sims[top] = exact
+    return minmax_scale(sims, data_min, data_max)
+
+
+def rescored_preference_scores(quantized: QuantizedEmbeddings, embeddings: np.ndarray,
+                               user_vec: np.ndarray, rows: Optional[np.ndarray] = None,
+                               rescore_size: int = 800) -> np.ndarray:
+    """preference_scores from a quantized matrix, rescoring the best approximate preference scores."""
+    return rescore_preference(approximate_similarities(quantized, user_vec, rows), embeddings,
+                              user_vec, rows, rescore_size)
+
+
+def cluster_novelty(cluster_ids: np.ndarray) -> np.ndarray:
+    """Inverse cluster frequency, min-max scaled to [0, 1]."""
+    if len(cluster_ids) == 0:
+        return np.zeros(0, dtype=np.float32)
+    _, inverse, counts = np.unique(cluster_ids, return_inverse=True, return_counts=True)
+    inv_freq = (1.0 / counts)[inverse].astype(np.float32)
+    return minmax_scale(inv_freq)
+
+
+def cluster_novelty_from_counts(cluster_ids: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """cluster_novelty with precomputed counts per cluster id (`counts[c]` rows in cluster c)."""
+    if len(cluster_ids) == 0:
+        return np.zeros(0, dtype=np.float32)
+    inv_freq = (1.0 / counts[cluster_ids]).astype(np.float32)
+    return minmax_scale(inv_freq)
+
+
+def score_arrays(emb_matrix: np.ndarray, kcal: np.ndarray, protein: np.ndarray,
+                 cluster_ids: np.ndarray, targets: Dict[str, float],
+                 alpha_pref: float, beta_fit: float, gamma_nov: float,
+                 user_vec: Optional[np.ndarray] = None,
+                 pref: Optional[np.ndarray] = None,
+                 novelty: Optional[np.ndarray] = None,
+                 fit: Optional[np.ndarray] = None) -> ScoreArrays:
+    """
+    Score every row of a meal-type partition.
+
+    Args:
+        emb_matrix: (n, d) float32 recipe embeddings
+        kcal, protein: per-serving macros, row-aligned with emb_matrix
+        cluster_ids: int cluster id per row
+        targets: output of CandidatePoolBuilder._get_meal_scoring_targets
+        alpha_pref, beta_fit, gamma_nov: score weights
+        user_vec: preference vector (cold-start mean embedding when None)
+        pref, novelty: precomputed preference / novelty scores shared across users
+        fit: precomputed nutrition_fit for these targets
+    """
+    if pref is None:
+        if user_vec is None:
+            user_vec = cold_start_user_vector(emb_matrix)
+        pref = preference_scores(emb_matrix, user_vec)
+
+    if fit is None:
+        fit = targets_fit(kcal, protein, targets)
+    if novelty is None:
+        novelty = cluster_novelty(cluster_ids)
+
+    model_score = alpha_pref * pref + beta_fit * fit + gamma_nov * novelty
+    final_score = np.clip(model_score, 0.0, 1.0)
+
+    in_window = (kcal >= targets["window_low"]) & (kcal <= targets["window_high"])
+
+    return ScoreArrays(
+        preference_score=pref,
+        nutrition_fit=fit,
+        novelty_bonus=novelty,
+        model_score=model_score,
+        final_model_score=final_score,
+        in_window=in_window,
+    )
+
+
+def top_k_order(scores: ScoreArrays, recipe_ids: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the best `k` candidates, ordered by
+    (final_model_score, nutrition_fit, novelty_bonus, preference_score) descending
+    then recipe_id ascending.
+
+    Uses argpartition on the primary key so only the boundary ties and the
+    top-k block are fully sorted.
+    """
+    candidates = np.asarray(candidates)
+    if len(candidates) == 0 or k <= 0:
+        return candidates[:0]
+
+    primary = scores.final_model_score[candidates]
+    if len(candidates) > k:
+        # k-th largest primary score; keep everything at or above it so ties are resolved by the full key
+        kth = np.argpartition(-primary, k - 1)[k - 1]
+        threshold = primary[kth]
+        if not np.isnan(threshold):
+            candidates = candidates[primary >= threshold]
+
+    id_rank = pd.factorize(recipe_ids[candidates], sort=True)[0]
+    order = np.lexsort((
+        id_rank,
+        -scores.preference_score[candidates],
+        -scores.novelty_bonus[candidates],
+        -scores.nutrition_fit[candidates],
+        -scores.final_model_score[candidates],
+    ))
+    return candidates[order[:k]]
+
+
+def diversity_quota(order: np.ndarray, cluster_ids: np.ndarray, pool_size: int,
+                    max_per_cluster: int) -> np.ndarray:
+    """
+    Walk `order` keeping at most `max_per_cluster` entries per cluster, up to `pool_size`.
+
+    Rank-within-cluster comes from a stable sort on cluster id, so the result is
+    the same as the greedy loop without touching rows one by one.
+    """
+    order = np.asarray(order)
+    if len(order) == 0:
+        return order
+
+    clusters = cluster_ids[order]
+    by_cluster = np.argsort(clusters, kind="stable")
+    sorted_clusters = clusters[by_cluster]
+
+    # Position of each entry within its cluster run
+    run_start = np.r_[True, sorted_clusters[1:] != sorted_clusters[:-1]]
+    starts = np.maximum.accumulate(np.where(run_start, np.arange(len(order)), 0))
+    rank_in_cluster = np.empty(len(order), dtype=np.int64)
+    rank_in_cluster[by_cluster] = np.arange(len(order)) - starts
+
+    return order[rank_in_cluster < max_per_cluster][:pool_size]
+
+
+def preference_scores_batch(emb_matrix: np.ndarray, user_vecs: List[np.ndarray],
+                            keeps: List[Optional[np.ndarray]]) -> List[np.ndarray]:
+    """
+    Preference scores for several users with one matrix-matrix product.
+
+    `keeps[j]` restricts user j to a subset of rows (None = all rows); scaling is
+    done per user over that subset, as in preference_scores.
+    """
+    if not user_vecs:
+        return []
+    U = np.stack([np.asarray(v, dtype=np.float32).reshape(-1) for v in user_vecs])
+    norms = np.linalg.norm(U, axis=1, keepdims=True)
+    U = np.where(norms > 0, U / np.where(norms > 0, norms, 1), U).astype(np.float32)
+
+    sims = U @ emb_matrix.T  # (users, rows)
+    return [minmax_scale(sims[j] if keep is None else sims[j][keep]) for j, keep in enumerate(keeps)]
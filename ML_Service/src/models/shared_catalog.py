@@ -0,0 +1,281 @@
+"""
+Catalog shared by every worker process on a machine.
+
+Each uvicorn/gunicorn worker used to read the Parquet catalog and build its
+own copy of the frame, partitions, indexes and ingredient matrix. With a
+shared catalog the first worker to see a catalog version builds it once and
+publishes it into a versioned directory:
+
+    <root>/<version>/frame.arrow            standardized DataFrame without embeddings, Arrow IPC, uncompressed
+    <root>/<version>/p<i>/<array>.npy       partition arrays (macros, cluster ids, indexes, ...)
+    <root>/<version>/ingredients/...        recipe x ingredient CSR arrays + vocabulary
+    <root>/<version>/manifest.json          written last; a version without it is incomplete
+    <root>/CURRENT                          name of the newest published version
+
+Every other worker maps those files read-only, so they share one copy in the
+page cache. Embeddings that already come from the embedding store stay
+there and are mapped from it. Pointing `root` at /dev/shm keeps the whole
+catalog in shared memory.
+
+A version is built in a temporary directory and renamed into place, and
+CURRENT is replaced atomically, so a worker never attaches to a partial
+version. Workers holding an older version keep their mappings after it is
+pruned. Small per-process objects (recipe id arrays, name categories for
+exclusion matching, the ingredient vocabulary) are still rebuilt on attach.
+"""
+
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from scipy import sparse
+
+try:
+    import fcntl
+except ImportError:  # Windows: publishers aren't serialized, the rename still keeps one copy
+    fcntl = None
+
+from src.models.embedding_store import EmbeddingStore
+from src.models.ingredients import IngredientVocabulary, ingredient_vocabulary
+from src.models.ivf_index import RecipeIVFIndex
+from src.models.meal_partitions import MealTypePartition, embedding_columns
+
+# Bump when the published layout changes so old directories are never attached
+# (2: frame.arrow no longer carries the emb_* columns)
+SHARED_LAYOUT = 2
+
+
+def shared_root_for(catalog_path: Union[str, Path]) -> Path:
+    """Default shared catalog directory for a catalog Parquet file."""
+    catalog_path = Path(catalog_path)
+    return catalog_path.with_name(f"{catalog_path.stem}_shared")
+
+
+def _write_strings(path: Path, values) -> None:
+    table = pa.table({"value": pa.array(values, type=pa.large_string())})
+    with pa.OSFile(str(path), "wb") as f:
+        with pa.ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_table(path: Path) -> pa.Table:
+    # Buffers point into the mapped file; nothing is copied
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+def _load(path: Path) -> np.ndarray:
+    return np.load(path, mmap_mode="r", allow_pickle=False)
+
+
+class AttachedCatalog(NamedTuple):
+    df: pd.DataFrame
+    partitions: Dict[str, MealTypePartition]
+    ingredients: Optional[sparse.csr_matrix]
+    ivf: Optional[RecipeIVFIndex]
+    store: Optional[EmbeddingStore]
+    path: Path
+    nbytes: int
+
+
+class SharedCatalog:
+    """
+    Versioned, memory-mapped catalog directory.
+
+    Handles:
+    - Publishing a built catalog's frame and arrays under its version
+    - Attaching to a published version with read-only memory maps
+    - A file lock so concurrent workers build each version once
+    - Pointing CURRENT at the newest version and pruning old versions
+    """
+
+    def __init__(self, root: Union[str, Path], keep_versions: int = 2):
+        """
+        Args:
+            root: Directory holding the published versions (e.g. under /dev/shm)
+            keep_versions: Published versions kept on disk, newest first
+        """
+        self.root = Path(root)
+        self.keep_versions = max(1, keep_versions)
+
+    def version_dir(self, version: str) -> Path:
+        return self.root / version
+
+    def current_version(self) -> Optional[str]:
+        """Version named by CURRENT, if any has been published."""
+        try:
+            return (self.root / "CURRENT").read_text().strip() or None
+        except OSError:
+            return None
+
+    @contextmanager
+    def lock(self):
+        """Exclusive lock across processes while a version is built and published."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def publish(self, version: str, df: pd.DataFrame, partitions: Dict[str, MealTypePartition],
+                ingredients: Optional[sparse.csr_matrix], ivf: Optional[RecipeIVFIndex],
+                vocabulary: IngredientVocabulary = ingredient_vocabulary) -> Path:
+        """
+        Write a built catalog under `version` and make it CURRENT.
+
+        Embeddings are published only per partition: mapped ones from the
+        embedding store are not copied, and the manifest records that
+        attaching workers should map the store too. The frame never holds them.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f".{version}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+
+        emb_cols = embedding_columns(df.columns)
+        table = pa.Table.from_pandas(df.drop(columns=emb_cols) if emb_cols else df)
+        with pa.OSFile(str(tmp / "frame.arrow"), "wb") as f:
+            with pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+
+        from_store = bool(partitions) and all(isinstance(p.embeddings, np.memmap) for p in partitions.values())
+        manifest: Dict[str, Any] = {
+            "layout": SHARED_LAYOUT,
+            "version": version,
+            "recipes": len(df),
+            "embedding_store": from_store,
+            "partitions": [],
+            "ingredients": None,
+            "ivf": ivf is not None,
+            "published_at": time.time(),
+            "pid": os.getpid(),
+        }
+        if ivf is not None:
+            np.save(tmp / "ivf_centroids.npy", ivf.centroids)
+
+        for i, (meal_type, part) in enumerate(partitions.items()):
+            part_dir = tmp / f"p{i}"
+            part_dir.mkdir()
+            arrays = part.shared_arrays()
+            if not from_store:
+                arrays["embeddings"] = part.embeddings
+            if ivf is not None:
+                arrays["ivf_offsets"], arrays["ivf_rows"] = ivf.lists[meal_type]
+            for name, array in arrays.items():
+                np.save(part_dir / f"{name}.npy", np.ascontiguousarray(array), allow_pickle=False)
+            if part.names is not None:
+                _write_strings(part_dir / "name_categories.arrow", part.names.categories)
+            manifest["partitions"].append({"meal_type": meal_type, "dir": part_dir.name, "arrays": sorted(arrays)})
+
+        if ingredients is not None:
+            ing_dir = tmp / "ingredients"
+            ing_dir.mkdir()
+            for name in ("data", "indices", "indptr"):
+                np.save(ing_dir / f"{name}.npy", getattr(ingredients, name), allow_pickle=False)
+            # Names in id order so attaching workers can map ids into their own vocabulary
+            _write_strings(ing_dir / "vocabulary.arrow",
+                           [vocabulary.name(i) for i in range(ingredients.shape[1])])
+            manifest["ingredients"] = {"shape": list(ingredients.shape)}
+
+        with open(tmp / "manifest.json", "w") as f:
+            json.dump(manifest, f)
+
+        target = self.version_dir(version)
+        if target.exists():
+            # A forced reload republishes the same version; mapped files survive the delete
+            stale = self.root / f".{version}.stale-{os.getpid()}"
+            os.replace(target, stale)
+            shutil.rmtree(stale, ignore_errors=True)
+        os.replace(tmp, target)
+
+        current = self.root / f".CURRENT.tmp-{os.getpid()}"
+        current.write_text(version)
+        os.replace(current, self.root / "CURRENT")
+        self._prune(version)
+        return target
+
+    def _prune(self, newest: str) -> None:
+        published = [d for d in self.root.iterdir()
+                     if d.is_dir() and not d.name.startswith(".") and (d / "manifest.json").exists()]
+        published.sort(key=lambda d: (d.name != newest, -d.stat().st_mtime))
+        for old in published[self.keep_versions:]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def attach(self, version: str, catalog_path: Union[str, Path],
+               store_digests: Optional[Sequence[Optional[str]]] = None,
+               vocabulary: IngredientVocabulary = ingredient_vocabulary) -> Optional[AttachedCatalog]:
+        """
+        Map a published version; None if it isn't published (or can't be used here).
+
+        `store_digests` are passed to EmbeddingStore.open when the version maps
+        its embeddings from the catalog's store.
+        """
+        path = self.version_dir(version)
+        try:
+            with open(path / "manifest.json") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("layout") != SHARED_LAYOUT or manifest.get("version") != version:
+            return None
+
+        try:
+            df = _read_table(path / "frame.arrow").to_pandas(split_blocks=True)
+            store = EmbeddingStore.open(catalog_path, store_digests) if manifest["embedding_store"] else None
+            if manifest["embedding_store"] and store is None:
+                return None
+
+            recipe_ids = df["recipe_id"].to_numpy()
+            partitions: Dict[str, MealTypePartition] = {}
+            ivf_lists = {}
+            for entry in manifest["partitions"]:
+                part_dir = path / entry["dir"]
+                arrays = {name: _load(part_dir / f"{name}.npy") for name in entry["arrays"]}
+                ids = recipe_ids[arrays["rows"]]
+                embeddings = arrays.pop("embeddings", None)
+                if embeddings is None:
+                    embeddings = store.embeddings_for(ids)
+                    if embeddings is None:
+                        return None
+                categories = None
+                if (part_dir / "name_categories.arrow").exists():
+                    categories = pd.Index(_read_table(part_dir / "name_categories.arrow").column(0).to_pandas())
+                if "ivf_offsets" in arrays:
+                    ivf_lists[entry["meal_type"]] = (arrays.pop("ivf_offsets"), arrays.pop("ivf_rows"))
+                partitions[entry["meal_type"]] = MealTypePartition.from_arrays(
+                    entry["meal_type"], arrays, ids, embeddings, categories)
+
+            ivf = None
+            if manifest["ivf"]:
+                ivf = RecipeIVFIndex(_load(path / "ivf_centroids.npy"), ivf_lists, partitions)
+
+            ingredients = None
+            if manifest["ingredients"] is not None:
+                ingredients = self._attach_ingredients(path / "ingredients", manifest["ingredients"], vocabulary)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: could not attach shared catalog {path}: {e}")
+            return None
+
+        nbytes = sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+        return AttachedCatalog(df, partitions, ingredients, ivf, store, path, nbytes)
+
+    @staticmethod
+    def _attach_ingredients(ing_dir: Path, meta: Dict[str, Any],
+                            vocabulary: IngredientVocabulary) -> sparse.csr_matrix:
+        names = _read_table(ing_dir / "vocabulary.arrow").column(0).to_pylist()
+        ids = np.asarray(vocabulary.intern_all(names), dtype=np.int64)
+        data, indices, indptr = (_load(ing_dir / f"{name}.npy") for name in ("data", "indices", "indptr"))
+        if not np.array_equal(ids, np.arange(len(ids))):
+            # This process interned other names first; translate to its ids (a private copy)
+            indices = ids[indices].astype(indices.dtype)
+        return sparse.csr_matrix((data, indices, indptr), shape=(meta["shape"][0], len(vocabulary)))
@@ -0,0 +1,314 @@
+"""
+Resident snack recipe and staple food tables.
+
+GetMeals.get_Snack used to read `snacks_recipes.csv` and `staples.csv` and
+re-run the staples keyword filter on every call. Both tables are now loaded
+and filtered once per file version and kept with a calorie-sorted index, so
+the tolerance-window lookup is two binary searches.
+
+SnackFiller searches the same calorie-sorted items for 1-3 item snacks that
+cover the day's remaining calories and protein, skipping excluded rows.
+"""
+
+import copy
+import re
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.models.exclusion import ExclusionIndex
+from src.utils.watched_files import Digests, WatchedFiles
+
+DEFAULT_DATA_DIR = Path(__file__).parent.parent.parent / "data" / "raw" / "by_meal_type"
+
+# Supplements and cooking ingredients that aren't snacks on their own
+EXCLUDE_KEYWORDS = [
+    'supplement', 'powder', 'pill', 'tablet', 'capsule',
+    'vitamin', 'mineral', 'creatine', 'bcaa', 'whey',
+    'protein powder', 'mass gainer', 'pre-workout',
+    'oil', 'extract', 'syrup', 'herb'
+]
+_EXCLUDE_PATTERN = re.compile('|'.join(re.escape(keyword) for keyword in EXCLUDE_KEYWORDS))
+
+
+def filter_staples(foods_df: pd.DataFrame) -> pd.DataFrame:
+    """Drop supplements / non-snack staples and implausible nutrition rows; adds a 'name' column."""
+    filtered_df = foods_df.copy()
+    filtered_df['name'] = filtered_df['food_name']
+
+    # One pass over the lower-cased names for all keywords
+    name_lower = filtered_df['name'].str.lower().fillna('')
+    filtered_df = filtered_df[~name_lower.str.contains(_EXCLUDE_PATTERN, na=False)]
+
+    # Filter by reasonable nutrition ranges for snacks
+    return filtered_df[
+        (filtered_df['calories'] >= 30) &      # Minimum meaningful calories
+        (filtered_df['calories'] <= 500) &     # Maximum reasonable snack size
+        (filtered_df['protein_g'] >= 0) &      # No negative protein
+        (filtered_df['protein_g'] <= 100) &    # No crazy high protein (likely powder)
+        (filtered_df['carbs_g'] >= 0) &        # No negative carbs
+        (filtered_df['fat_g'] >= 0)            # No negative fat
+    ]
+
+
+class SnackTable:
+    """
+    One snack source in file order (plus a 'source' column).
+
+    Rows are matched against exclusion terms like the planner's pools:
+    recipes by their ingredients, staples by their food name.
+    """
+
+    def __init__(self, df: pd.DataFrame, source: str):
+        self.df = df.copy()
+        self.df['source'] = source
+        text = 'ingredients' if 'ingredients' in self.df.columns else 'food_name'
+        self.index = ExclusionIndex.from_texts(self.df[text]) if text in self.df.columns else None
+        # Staples have no recipe id, so only recipes can repeat across days
+        self.ids = self.df['id'].to_numpy() if 'id' in self.df.columns else None
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def excluded(self, terms: Optional[Iterable] = None, used_ids: Optional[set] = None) -> np.ndarray:
+        """Rows containing any of `terms`, or whose id is in `used_ids`."""
+        excluded = np.zeros(len(self), dtype=bool)
+        if terms and self.index is not None:
+            excluded |= self.index.mask(terms)
+        if used_ids and self.ids is not None:
+            excluded |= np.isin(self.ids, list(used_ids))
+        return excluded
+
+
+class SnackFiller:
+    """
+    Fills a calorie / protein gap with one to three snack items.
+
+    Handles:
+    - One calorie-sorted array over every recipe and staple
+    - Leaving out excluded rows (allergens, overused ingredients, used recipes)
+    - Exact scoring of single items inside the calorie window
+    - Exact best pairs by meet-in-the-middle: a binary-searched partner window
+      per first item, an upper bound from its highest-protein (sparse table
+      range max) and calorie-closest partners, then scoring every partner
+      inside the narrower calorie band that bound leaves
+    - Triples as a fixed high-protein item plus the best pair for the rest
+    - Skipping pair / triple search when it can't beat the best so far
+
+    A combination costs its relative calorie error, plus its relative protein
+    shortfall (overshooting protein isn't penalized), plus `item_penalty` per
+    extra item.
+    """
+
+    def __init__(self, tables: Sequence[SnackTable], tolerance: float = 0.15,
+                 combo_tolerance: float = 0.05, item_penalty: float = 0.02, triple_starts: int = 8):
+        """
+        Args:
+            tables: Snack tables to draw from (recipes, staples)
+            tolerance: Calorie window for single items, as a fraction of the gap
+            combo_tolerance: Tighter calorie window for 2-3 item combinations
+            item_penalty: Cost added per item beyond the first
+            triple_starts: High-protein items tried as the fixed member of a triple
+        """
+        self.tables = list(tables)
+        self.tolerance = tolerance
+        self.combo_tolerance = combo_tolerance
+        self.item_penalty = item_penalty
+        self.triple_starts = triple_starts
+
+        kcal = np.concatenate([t.df['calories'].to_numpy(dtype=np.float64) for t in self.tables])
+        protein = np.concatenate([t.df['protein_g'].to_numpy(dtype=np.float64, na_value=0.0)
+                                  for t in self.tables])
+        table = np.concatenate([np.full(len(t), i, dtype=np.int32) for i, t in enumerate(self.tables)])
+        row = np.concatenate([np.arange(len(t), dtype=np.int64) for t in self.tables])
+
+        # Only items with positive calories can fill a gap; ties keep table then file order
+        usable = np.flatnonzero(np.isfinite(kcal) & (kcal > 0))
+        order = usable[np.argsort(kcal[usable], kind='stable')]
+        self._order = order
+        self.kcal = kcal[order]
+        self.protein = np.nan_to_num(protein[order])
+        self.table = table[order]
+        self.row = row[order]
+        self._argmax = self._sparse_table(self.protein)
+
+    def __len__(self) -> int:
+        return len(self.kcal)
+
+    @staticmethod
+    def _sparse_table(values: np.ndarray) -> np.ndarray:
+        # levels[k][i] = position of the max over values[i : i + 2**k] (first one on ties)
+        n = len(values)
+        levels = [np.arange(n, dtype=np.int64)]
+        width = 1
+        while 2 * width <= n:
+            prev = levels[-1]
+            left, right = prev[:n - 2 * width + 1], prev[width:n - width + 1]
+            best = np.where(values[right] > values[left], right, left)
+            levels.append(np.concatenate([best, np.zeros(n - len(best), dtype=np.int64)]))
+            width *= 2
+        return np.stack(levels)
+
+    def _without(self, excluded: np.ndarray) -> "SnackFiller":
+        # Same tables, fewer items; the sparse table is rebuilt over what's left
+        keep = ~excluded[self._order]
+        filler = copy.copy(self)
+        filler._order = self._order[keep]
+        filler.kcal, filler.protein = self.kcal[keep], self.protein[keep]
+        filler.table, filler.row = self.table[keep], self.row[keep]
+        filler._argmax = self._sparse_table(filler.protein)
+        return filler
+
+    def _range_argmax(self, start: np.ndarray, stop: np.ndarray) -> np.ndarray:
+        """Position of the highest-protein item in each non-empty [start, stop)."""
+        level = np.log2(stop - start).astype(np.int64)
+        left = self._argmax[level, start]
+        right = self._argmax[level, stop - (1 << level)]
+        return np.where(self.protein[right] > self.protein[left], right, left)
+
+    def _cost(self, kcal: np.ndarray, protein: np.ndarray, target_calories: float,
+              target_protein: float, items: int) -> np.ndarray:
+        cost = np.abs(kcal - target_calories) / target_calories + self.item_penalty * (items - 1)
+        if target_protein > 0:
+            cost += np.maximum(target_protein - protein, 0) / target_protein
+        return cost
+
+    def _best_pair(self, low: float, high: float, target_calories: float, target_protein: float,
+                   base_kcal: float = 0.0, base_protein: float = 0.0, exclude: int = -1,
+                   items: int = 2) -> Tuple[float, Optional[List[int]]]:
+        # The first item is the lower-calorie one, so it sits below high / 2. Walking
+        # first items from the top keeps the partner bounds ascending, which
+        # searchsorted handles much faster than unordered keys.
+        first = np.arange(np.searchsorted(self.kcal, high / 2, side='right'))[::-1]
+        start = np.maximum(np.searchsorted(self.kcal, low - self.kcal[first], side='left'), first + 1)
+        stop = np.searchsorted(self.kcal, high - self.kcal[first], side='right')
+        ok = (stop > start) & (first != exclude)
+        if not ok.any():
+            return np.inf, None
+        first, start, stop = first[ok], start[ok], stop[ok]
+
+        # Upper bound: each first item with its highest-protein partner and with
+        # the partners either side of the calories it leaves
+        rest = target_calories - base_kcal - self.kcal[first]
+        richest = self._range_argmax(start, stop)
+        near = np.clip(np.searchsorted(self.kcal, rest, side='left'), start, stop - 1)
+        bound_first = np.tile(first, 3)
+        bound_partner = np.concatenate([richest, near, np.maximum(near - 1, start)])
+        bound = self._cost(base_kcal + self.kcal[bound_first] + self.kcal[bound_partner],
+                           base_protein + self.protein[bound_first] + self.protein[bound_partner],
+                           target_calories, target_protein, items)
+        bound = np.where(bound_partner != exclude, bound, np.inf).min()
+
+        # No partner beats the highest-protein one on shortfall, so a cheaper pair
+        # misses the calories by less than what the bound leaves after it; only
+        # partners inside that band need exact scoring
+        floor = self._cost(target_calories, base_protein + self.protein[first] + self.protein[richest],
+                           target_calories, target_protein, items)
+        slack = (bound - floor) * target_calories
+        lo = np.maximum(start, np.searchsorted(self.kcal, rest - slack, side='left'))
+        hi = np.minimum(stop, np.searchsorted(self.kcal, rest + slack, side='right'))
+        counts = np.maximum(hi - lo, 0)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        first = np.concatenate([np.repeat(first, counts), bound_first])
+        partner = np.concatenate([np.repeat(lo, counts) + offsets, bound_partner])
+        keep = partner != exclude
+        if not keep.any():
+            return np.inf, None
+        first, partner = first[keep], partner[keep]
+        cost = self._cost(base_kcal + self.kcal[first] + self.kcal[partner],
+                          base_protein + self.protein[first] + self.protein[partner],
+                          target_calories, target_protein, items)
+        i = int(np.argmin(cost))
+        return float(cost[i]), [int(first[i]), int(partner[i])]
+
+    def fill(self, target_calories: float, target_protein: float,
+             excluded: Optional[np.ndarray] = None) -> List[pd.Series]:
+        """
+        Rows (from their snack tables) of the cheapest 1-3 item snack, or [] if nothing fits.
+
+        `excluded` flags rows never to use: one entry per row of each table,
+        tables in order (see SnackTable.excluded).
+        """
+        if excluded is not None and excluded.any():
+            return self._without(excluded).fill(target_calories, target_protein)
+        if target_calories <= 0 or len(self) == 0:
+            return []
+        best_cost, best = np.inf, None
+
+        # Single items: score the whole window
+        start = np.searchsorted(self.kcal, target_calories * (1 - self.tolerance), side='left')
+        stop = np.searchsorted(self.kcal, target_calories * (1 + self.tolerance), side='right')
+        if stop > start:
+            cost = self._cost(self.kcal[start:stop], self.protein[start:stop], target_calories, target_protein, 1)
+            i = int(np.argmin(cost))
+            best_cost, best = float(cost[i]), [start + i]
+
+        low = target_calories * (1 - self.combo_tolerance)
+        high = target_calories * (1 + self.combo_tolerance)
+        if best_cost > self.item_penalty:
+            cost, pair = self._best_pair(low, high, target_calories, target_protein)
+            if cost < best_cost:
+                best_cost, best = cost, pair
+
+        if best_cost > 2 * self.item_penalty:
+            # Fix one of the highest-protein small items, then pair up the rest of the gap
+            small = np.searchsorted(self.kcal, high / 3, side='right')
+            starts = np.arange(small)
+            if small > self.triple_starts:
+                starts = np.argpartition(-self.protein[:small], self.triple_starts)[:self.triple_starts]
+            for t in np.sort(starts):
+                cost, pair = self._best_pair(low - self.kcal[t], high - self.kcal[t], target_calories,
+                                             target_protein, self.kcal[t], self.protein[t], int(t), 3)
+                if cost < best_cost:
+                    best_cost, best = cost, [int(t)] + pair
+
+        if best is None:
+            return []
+        return [self.tables[self.table[i]].df.iloc[self.row[i]] for i in best]
+
+
+class SnackSnapshot(NamedTuple):
+    recipes: Optional[SnackTable]
+    staples: Optional[SnackTable]
+    filler: Optional[SnackFiller]
+    version: Tuple
+
+
+class SnackTables:
+    """
+    Keeps the snack recipes and filtered staples resident in memory.
+
+    Handles:
+    - Loading both CSVs once and filtering staples once
+    - Reloading when either file changes (mtime/size, then content hash)
+    - Atomic snapshot swaps that keep the last good tables if a reload fails
+    """
+
+    def __init__(self, data_dir: Union[str, Path] = DEFAULT_DATA_DIR, check_interval: float = 5.0):
+        self.data_dir = Path(data_dir)
+        self.recipes_path = self.data_dir / "snacks_recipes.csv"
+        self.staples_path = self.data_dir / "staples.csv"
+        self.check_interval = check_interval
+
+        # Either file may be absent; its table is then None
+        self._files: WatchedFiles[SnackSnapshot] = WatchedFiles(
+            [], self._load, "snack tables", check_interval,
+            optional_paths=[self.recipes_path, self.staples_path])
+
+    def _load(self, digests: Digests, force: bool = False) -> SnackSnapshot:
+        recipes = SnackTable(pd.read_csv(self.recipes_path), 'recipe') if digests[0] else None
+        staples = SnackTable(filter_staples(pd.read_csv(self.staples_path)), 'staple') if digests[1] else None
+        tables = [table for table in (recipes, staples) if table is not None]
+        filler = SnackFiller(tables) if tables else None
+        print(f"Loaded snack tables: {len(recipes) if recipes else 0} recipes, "
+              f"{len(staples) if staples else 0} staples")
+        return SnackSnapshot(recipes=recipes, staples=staples, filler=filler, version=digests)
+
+    def get(self) -> SnackSnapshot:
+        return self._files.get()
+
+
+# Shared instance used by GetMeals
+snack_tables = SnackTables()
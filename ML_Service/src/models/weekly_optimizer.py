@@ -0,0 +1,255 @@
+"""
+Joint weekly meal plan optimizer.
+
+Instead of picking meals day by day, the whole week is solved as one integer
+program over the candidate pools, under a wall-clock cap:
+
+- each day gets one breakfast, lunch and dinner plus at most one snack
+- no recipe is used twice in the week
+- no ingredient is used more than `ingredient_limit` times in the week
+- each day's calories / protein stay within a tolerance band of the targets
+
+A slot-per-day formulation (days x slots x recipes binaries) leaves CBC
+searching symmetric day orderings for seconds, so days are expressed as
+combinations instead: every breakfast x lunch x dinner x snack total is
+enumerated with NumPy, the in-band combinations closest to target are kept,
+and the program picks `len(days)` compatible ones (a set packing).
+
+`solve` returns None when no proven-optimal plan is found within the
+budget, so callers fall back to the greedy planner. The optimizer holds no
+per-request state and can be shared between threads.
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pulp
+from scipy import sparse
+
+from src.models.ingredients import pool_incidence
+
+# Pool key -> meal key used in daily plans (GetMeals names the snack slot 'snacks')
+MEAL_SLOTS = {'breakfast': 'breakfast', 'lunch': 'lunch', 'dinner': 'dinner', 'snack': 'snacks'}
+REQUIRED_SLOTS = ('breakfast', 'lunch', 'dinner')
+
+# Same per-meal split GetMeals reports as meal targets
+MEAL_SPLITS = {'breakfast': 0.25, 'lunch': 0.35, 'dinner': 0.35, 'snacks': 0.05}
+
+# Plan macro -> (pool column, target key, tolerance); the greedy planner also targets only these
+MACROS = {
+    'calories': ('calories', 'calories', 0.03),
+    'protein_g': ('protein_g', 'protein_g', 0.05),
+}
+
+
+class WeeklyPlanOptimizer:
+    """
+    Solves the week's meal selection as a single integer program.
+
+    Handles:
+    - Enumerating in-band daily meal combinations from the candidate pools
+    - Enforcing recipe uniqueness and the weekly ingredient limit
+    - Capping solver time and reporting why a solve was rejected
+    - Formatting the solution like GetMeals.create_meal_plan output
+    """
+
+    def __init__(self, ingredient_limit: int = 4, time_limit: float = 2.0,
+                 max_combinations: int = 500, gap: float = 1e-3):
+        """
+        Args:
+            ingredient_limit: Max uses of one ingredient across the week
+            time_limit: Wall-clock seconds allowed for enumeration + solving
+            max_combinations: In-band daily combinations handed to the solver
+            gap: Absolute gap on the weekly objective accepted as optimal
+        """
+        self.ingredient_limit = ingredient_limit
+        self.time_limit = time_limit
+        self.max_combinations = max_combinations
+        self.gap = gap
+
+    def _slot_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Rows without calories can't be placed against a target
+        if df is None or df.empty or 'calories' not in df.columns:
+            return pd.DataFrame()
+        return df[df['calories'].notna()]
+
+    def _combinations(self, frames: Dict[str, pd.DataFrame],
+                      nutrition_targets: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """In-band (breakfast, lunch, dinner, snack) index tuples and their costs, best first.
+
+        Snack index 0 means no snack; snack row i is index i + 1.
+        """
+        shape = tuple(len(frames[slot]) for slot in REQUIRED_SLOTS) + (len(frames['snack']) + 1,)
+        in_band = np.ones(shape, dtype=bool)
+        cost = np.zeros(shape, dtype=np.float32)
+        for macro, (column, target_key, tolerance) in MACROS.items():
+            target = float(nutrition_targets.get(target_key) or 0)
+            if target <= 0:
+                continue
+            per_slot = [
+                frames[slot][column].fillna(0).to_numpy(dtype=np.float32) if column in frames[slot].columns
+                else np.zeros(len(frames[slot]), dtype=np.float32)
+                for slot in MEAL_SLOTS
+            ]
+            per_slot[3] = np.concatenate([[0.0], per_slot[3]]).astype(np.float32)
+            total = (per_slot[0][:, None, None, None] + per_slot[1][None, :, None, None]
+                     + per_slot[2][None, None, :, None] + per_slot[3][None, None, None, :])
+            deviation = np.abs(total - target) / target
+            in_band &= deviation <= tolerance
+            cost += deviation
+
+        flat = np.flatnonzero(in_band)
+        flat_cost = cost.ravel()[flat]
+        if len(flat) > self.max_combinations:
+            keep = np.argpartition(flat_cost, self.max_combinations)[:self.max_combinations]
+            flat, flat_cost = flat[keep], flat_cost[keep]
+        order = np.argsort(flat_cost, kind="stable")
+        return np.stack(np.unravel_index(flat[order], shape), axis=1), flat_cost[order]
+
+    def solve(self, pools: Dict[str, pd.DataFrame], nutrition_targets: Dict[str, float],
+              days: List[str], used_counts: Optional[Dict[int, int]] = None,
+              ingredient_limit: Optional[int] = None) -> Tuple[Optional[Dict[str, Dict[str, Any]]], Dict[str, Any]]:
+        """
+        Plan every day at once.
+
+        Args:
+            pools: Candidate pools keyed 'breakfast', 'lunch', 'dinner', 'snack' (already allergen-filtered)
+            nutrition_targets: Daily calories / protein_g / fat_g / carb_g
+            days: Day names, in order
+            used_counts: Uses already spent per interned ingredient id (counts toward the limit)
+            ingredient_limit: Overrides the optimizer's default limit
+
+        Returns:
+            ({day: daily_plan}, status); the plan is None if no proven-optimal plan
+            was found within the time limit
+        """
+        limit = self.ingredient_limit if ingredient_limit is None else ingredient_limit
+        started = time.perf_counter()
+        frames = {slot: self._slot_frame(pools.get(slot)) for slot in MEAL_SLOTS}
+        if any(frames[slot].empty for slot in REQUIRED_SLOTS):
+            return None, {"status": "no_candidates"}
+
+        combos, costs = self._combinations(frames, nutrition_targets)
+        if len(combos) < len(days):
+            return None, {"status": "too_few_combinations", "combinations": int(len(combos))}
+
+        prob = pulp.LpProblem("weekly_meal_plan", pulp.LpMinimize)
+        z = [pulp.LpVariable(f"z_{c}", cat="Binary") for c in range(len(combos))]
+        prob += pulp.LpAffineExpression(zip(z, costs.astype(float)))
+        prob += pulp.LpAffineExpression((v, 1) for v in z) == len(days)
+
+        # Each recipe at most once per week
+        members: Dict[Any, List[int]] = {}
+        for s, slot in enumerate(MEAL_SLOTS):
+            df = frames[slot]
+            ids = df['id'].to_numpy() if 'id' in df.columns else np.arange(len(df))
+            offset = 1 if slot == 'snack' else 0
+            for c, i in enumerate(combos[:, s]):
+                if slot == 'snack' and i == 0:
+                    continue
+                recipe_id = ids[i - offset]
+                members.setdefault((slot, i) if pd.isna(recipe_id) else recipe_id, []).append(c)
+        for combo_ids in members.values():
+            if len(combo_ids) > 1:
+                prob += pulp.LpAffineExpression((z[c], 1) for c in combo_ids) <= 1
+
+        # Weekly ingredient limit: combination x ingredient use counts
+        slot_rows = []
+        for s, slot in enumerate(MEAL_SLOTS):
+            matrix = pool_incidence(frames[slot])
+            if matrix is None:
+                continue
+            if slot == 'snack':
+                # Row 0 is "no snack"
+                matrix = sparse.vstack([sparse.csr_matrix((1, matrix.shape[1]), dtype=matrix.dtype), matrix]).tocsr()
+            slot_rows.append(matrix[combos[:, s]])
+        uses = None
+        if slot_rows:
+            width = max(rows.shape[1] for rows in slot_rows)
+            for rows in slot_rows:
+                rows.resize((len(combos), width))
+            uses = sum(slot_rows[1:], slot_rows[0])
+        if uses is not None:
+            uses = uses.tocsc()
+            used_counts = used_counts or {}
+            for j in np.flatnonzero(np.diff(uses.indptr)):
+                allowed = limit - used_counts.get(int(j), 0)
+                column = slice(uses.indptr[j], uses.indptr[j + 1])
+                counts = uses.data[column]
+                # Only binding if the week could exceed the allowance
+                if np.sort(counts)[::-1][:len(days)].sum() > allowed:
+                    prob += pulp.LpAffineExpression(
+                        (z[c], float(n)) for c, n in zip(uses.indices[column], counts)
+                    ) <= max(allowed, 0)
+
+        remaining = self.time_limit - (time.perf_counter() - started)
+        if remaining <= 0:
+            return None, {"status": "time_limit", "seconds": round(time.perf_counter() - started, 4)}
+        solver = pulp.PULP_CBC_CMD(msg=False, timeLimit=remaining, gapAbs=self.gap)
+        prob.solve(solver)
+        elapsed = time.perf_counter() - started
+
+        # Time-capped solves come back "integer feasible" (or not solved); only proven plans are used
+        if prob.sol_status != pulp.LpSolutionOptimal or elapsed > self.time_limit:
+            return None, {"status": pulp.LpSolution[prob.sol_status], "seconds": round(elapsed, 4),
+                          "combinations": int(len(combos))}
+        status = {
+            "status": "optimal",
+            "objective": float(pulp.value(prob.objective)),
+            "seconds": round(elapsed, 4),
+            "combinations": int(len(combos)),
+        }
+
+        # Chosen combinations in cost order, one per day
+        chosen = [c for c in range(len(combos)) if z[c].varValue is not None and z[c].varValue > 0.5]
+        week = {}
+        for day, c in zip(days, chosen):
+            b, l, d, s = combos[c]
+            selected = {
+                'breakfast': frames['breakfast'].iloc[b],
+                'lunch': frames['lunch'].iloc[l],
+                'dinner': frames['dinner'].iloc[d],
+            }
+            if s > 0:
+                selected['snack'] = frames['snack'].iloc[s - 1]
+            week[day] = self._daily_plan(selected, nutrition_targets)
+        return week, status
+
+    def _daily_plan(self, selected: Dict[str, pd.Series], nutrition_targets: Dict[str, float]) -> Dict[str, Any]:
+        meal_targets = {}
+        for meal, split in MEAL_SPLITS.items():
+            meal_targets[meal] = {
+                'calories': int(nutrition_targets['calories'] * split),
+                'protein_g': int(nutrition_targets['protein_g'] * split),
+                'carbs_g': int(nutrition_targets['carb_g'] * split),
+                'fat_g': int(nutrition_targets['fat_g'] * split)
+            }
+
+        meals = {}
+        for slot, row in selected.items():
+            meal = MEAL_SLOTS[slot]
+            recipe = {
+                'id': row.get('id'),
+                'name': row.get('name'),
+                'calories': row.get('calories'),
+                'protein_g': row.get('protein_g'),
+                'carbs_g': row.get('carbs_g'),
+                'fat_g': row.get('fat_g'),
+                'ingredients': row.get('ingredients'),
+                'steps': row.get('steps')
+            }
+            if meal == 'snacks':
+                recipe['source'] = 'recipe'
+            meals[meal] = {'recipe': recipe, 'targets': meal_targets[meal], 'meal_type': meal}
+
+        total_nutrition = {
+            macro: sum(meal['recipe'][macro] for meal in meals.values())
+            for macro in ('calories', 'protein_g', 'carbs_g', 'fat_g')
+        }
+        return {
+            'nutrition_targets': nutrition_targets,
+            'meals': meals,
+            'total_nutrition': total_nutrition
+        }
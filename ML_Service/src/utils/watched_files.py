@@ -0,0 +1,131 @@
+"""
+Values loaded from files on disk and hot-swapped when the files change.
+
+The calorie model, the meal catalog and the snack tables are each loaded
+once per process and reloaded when their files are replaced. WatchedFiles
+holds that shared logic: a throttled stat() check, a content hash so a
+touched-but-identical file isn't reloaded, a single-assignment swap, and
+keeping the last good value when a file is missing or fails to load.
+"""
+
+import hashlib
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Generic, Optional, Sequence, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+
+Digests = Tuple[Optional[str], ...]
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    """Short sha256 of a file, used as an artifact version id."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:12]
+
+
+class WatchedFiles(Generic[T]):
+    """
+    A value built from one or more files, rebuilt when they change.
+
+    Handles:
+    - Throttled stat() checks (mtime/size) of every watched file
+    - Re-hashing changed files and skipping the reload when the content is the same
+    - Building the next value off to the side and swapping it in with one assignment
+    - Keeping the last good value while a file is missing or fails to load
+    """
+
+    def __init__(self, paths: Sequence[Union[str, Path]], load: Callable[[Digests, bool], T],
+                 name: str, check_interval: float = 5.0,
+                 optional_paths: Sequence[Union[str, Path]] = ()):
+        """
+        Args:
+            paths: Files that must exist
+            load: Builds the value from the files' digests (None for a missing
+                optional file) and whether the reload was forced
+            name: What the files hold, for messages
+            check_interval: Minimum seconds between stat() checks
+            optional_paths: Files that may be absent; adding, replacing or
+                removing one also triggers a reload
+        """
+        self.paths = [Path(p) for p in paths]
+        self.optional_paths = [Path(p) for p in optional_paths]
+        self.name = name
+        self.check_interval = check_interval
+        self._load = load
+
+        self._active: Optional[T] = None
+        self._stamp: Optional[Tuple] = None
+        self._digests: Optional[Digests] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reload_count = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def active(self) -> Optional[T]:
+        return self._active
+
+    def _stat(self) -> Tuple:
+        def stamp(path: Path):
+            try:
+                st = path.stat()
+            except OSError:
+                return None
+            return (st.st_mtime_ns, st.st_size)
+        return tuple(stamp(p) for p in self.paths + self.optional_paths)
+
+    def _refresh(self, force: bool = False) -> T:
+        with self._lock:
+            active = self._active
+            self._last_check = time.monotonic()
+            stamp = self._stat()
+            missing = [p for p, st in zip(self.paths, stamp) if st is None]
+            if missing:
+                if active is not None:
+                    # Keep serving the last good version while a file is mid-replace
+                    return active
+                raise FileNotFoundError(f"{self.name} not found: {missing[0]}")
+
+            if not force and active is not None and stamp == self._stamp:
+                return active
+
+            digests = tuple(file_digest(p) if st is not None else None
+                            for p, st in zip(self.paths + self.optional_paths, stamp))
+            if not force and active is not None and digests == self._digests:
+                # Touched but unchanged: remember the new stamp and skip the reload
+                self._stamp = stamp
+                return active
+
+            try:
+                value = self._load(digests, force)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                if active is None:
+                    raise
+                # The stamp isn't recorded, so the next check tries again
+                print(f"Warning: failed to reload {self.name}: {e}")
+                return active
+
+            # Single reference assignment: readers see either the old or the new value
+            self._active = value
+            self._stamp = stamp
+            self._digests = digests
+            self.reload_count += 1
+            self.last_error = None
+            return value
+
+    def get(self) -> T:
+        """Return the active value, reloading it first if a file changed."""
+        active = self._active
+        if active is None or time.monotonic() - self._last_check >= self.check_interval:
+            return self._refresh()
+        return active
+
+    def reload(self) -> T:
+        """Force a reload regardless of mtimes and digests."""
+        return self._refresh(force=True)